@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque en frío del CLI `sica`
+Ejecuta cada comando N veces en un proceso nuevo y reporta p50/p90; con --importtime
+lista los módulos que más tardan en importarse (python -X importtime)
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# (nombre, argumentos de python); las dos primeras son las referencias
+COMANDOS = (
+    ('python vacío', ['-c', 'pass']),
+    ('import sica_bot', ['-c', 'import sica_bot']),
+    ('sica --help', ['sica', '--help']),
+    ('sica lookup --help', ['sica', 'lookup', '--help']),
+    ('sica daemon --help', ['sica', 'daemon', '--help']),
+)
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else None
+
+
+def medir(argumentos, repeticiones):
+    """Segundos de pared de cada ejecución de `python <argumentos>` en un proceso nuevo"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable] + argumentos, cwd=DIRECTORIO, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def importaciones(argumentos, top):
+    """Módulos de mayor tiempo acumulado de importación (µs) para un comando"""
+    proceso = subprocess.run([sys.executable, '-X', 'importtime'] + argumentos, cwd=DIRECTORIO,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False)
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        # import time:  <propio> | <acumulado> | <módulo con sangría>
+        campos = linea[len('import time:'):].split('|')
+        filas.append((int(campos[1]), campos[2].strip()))
+    return sorted(filas, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir el arranque en frío del CLI sica")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--importtime', action='store_true', help="Listar los imports más lentos de `sica --help`")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--limite-ms', type=float, default=None,
+                        help="Fallar (código 1) si el p50 de `sica --help` supera este valor")
+    args = parser.parse_args()
+
+    print(f"🚀 Arranque en frío, {args.repeticiones} ejecuciones por comando ({sys.executable})")
+    resultados = {}
+    for nombre, argumentos in COMANDOS:
+        medir(argumentos, 1)  # calentar la caché de bytecode y del sistema de archivos
+        tiempos = medir(argumentos, args.repeticiones)
+        resultados[nombre] = _percentil(tiempos, 0.50)
+        print(f"📊 {nombre:20s} p50={_percentil(tiempos, 0.50) * 1000:7.1f}ms  "
+              f"p90={_percentil(tiempos, 0.90) * 1000:7.1f}ms")
+
+    extra = resultados['sica --help'] - resultados['python vacío']
+    print(f"   `sica --help` suma {extra * 1000:.1f}ms al intérprete; "
+          f"importar sica_bot sumaría {(resultados['import sica_bot'] - resultados['python vacío']) * 1000:.1f}ms")
+
+    if args.importtime:
+        print("\n🔬 Imports más lentos de `sica --help` (acumulado):")
+        for acumulado, modulo in importaciones(['sica', '--help'], args.top):
+            print(f"   {acumulado / 1000:7.1f}ms  {modulo}")
+
+    if args.limite_ms is not None and resultados['sica --help'] * 1000 > args.limite_ms:
+        print(f"❌ p50 de `sica --help` por encima de {args.limite_ms:.0f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
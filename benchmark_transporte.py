@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark de transporte: HTTP/1.1 (requests) vs HTTP/2 (AdaptadorTransporte)
+Lanza N requests concurrentes desde una sola sesión y compara conexiones abiertas
+y latencias p50/p99. Sin --url usa un servidor local HTTP/1.1 (prueba el fallback)
+"""
+
+import argparse
+import gzip
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sica_transporte import AdaptadorTransporte, accept_encoding
+
+
+class _ServidorLocal(ThreadingHTTPServer):
+    """Servidor HTTP/1.1 keep-alive que cuenta las conexiones aceptadas"""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, demora):
+        super().__init__(direccion, _Manejador)
+        self.demora = demora
+        self.conexiones = 0
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.conexiones += 1
+        super().process_request(request, client_address)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.demora)
+        cuerpo = b'{"effects":{},"serverMemo":{"data":{}}}' * 200
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            cuerpo = gzip.compress(cuerpo)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    do_GET = do_POST
+
+    def log_message(self, *args):
+        pass
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else None
+
+
+def medir(adaptador, url, metodo, total, concurrencia, codecs):
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = accept_encoding(codecs)
+    session.mount('http://', adaptador)
+    session.mount('https://', adaptador)
+
+    def uno(_):
+        inicio = time.monotonic()
+        response = session.request(metodo, url, json={'updates': []} if metodo == 'POST' else None, timeout=30)
+        return time.monotonic() - inicio, response.status_code
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        resultados = list(executor.map(uno, range(total)))
+    duracion = time.monotonic() - inicio
+    latencias = [r[0] for r in resultados]
+    return {
+        'duracion': duracion,
+        'p50': _percentil(latencias, 0.50),
+        'p99': _percentil(latencias, 0.99),
+        'errores': sum(1 for r in resultados if r[1] >= 400),
+        'session': session,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar HTTP/1.1 y HTTP/2 con requests concurrentes")
+    parser.add_argument('--url', help="URL a consultar (por defecto, un servidor local HTTP/1.1)")
+    parser.add_argument('--metodo', default=None, help="GET o POST (por defecto POST local, GET remoto)")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrencia', type=int, default=20)
+    parser.add_argument('--demora', type=float, default=0.02, help="Demora del servidor local por request (s)")
+    parser.add_argument('--codecs', default='auto', help="Política de Accept-Encoding (auto, gzip, ninguna o lista)")
+    args = parser.parse_args()
+
+    servidor = None
+    url = args.url
+    if url is None:
+        servidor = _ServidorLocal(('127.0.0.1', 0), args.demora)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{servidor.server_address[1]}/api/app/bench"
+    metodo = args.metodo or ('POST' if servidor else 'GET')
+
+    print(f"🚀 {args.requests} requests {metodo} a {url} con concurrencia {args.concurrencia}")
+    for nombre, adaptador in (('HTTP/1.1', HTTPAdapter(pool_maxsize=args.concurrencia)),
+                              ('HTTP/2', AdaptadorTransporte(http2=True, max_conexiones=args.concurrencia,
+                                                     pool_maxsize=args.concurrencia))):
+        antes = servidor.conexiones if servidor else 0
+        r = medir(adaptador, url, metodo, args.requests, args.concurrencia, args.codecs)
+        transporte = isinstance(adaptador, AdaptadorTransporte)
+        if servidor:
+            conexiones = servidor.conexiones - antes
+        elif transporte and adaptador.http2:
+            conexiones = adaptador.conexiones_abiertas()
+        else:
+            conexiones = sum(pool.num_connections for pool in adaptador.poolmanager.pools._container.values())
+        print(f"📊 {nombre:8s} conexiones={conexiones:3d}  p50={r['p50'] * 1000:7.1f}ms  "
+              f"p99={r['p99'] * 1000:7.1f}ms  total={r['duracion']:.2f}s  errores={r['errores']}")
+        if transporte:
+            metricas = adaptador.metricas()
+            print(f"   versiones={metricas['versiones']}  codecs={metricas['por_codec']}")
+        r['session'].close()
+
+    if servidor:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
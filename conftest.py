@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Fixtures compartidas de las pruebas: SICABot aislado sin red y respuestas Livewire falsas
+"""
+
+import json
+
+import pytest
+from requests.models import Response
+
+from sica_apagado import Apagado
+from sica_artefactos import AlmacenArtefactos
+from sica_bot import SICABot
+from sica_concurrencia import LimitadorAdaptativo
+from sica_resiliencia import GrupoCircuitos, TimeoutsAdaptativos
+
+
+def respuesta_livewire(status=200, payload=None):
+    """requests.Response con un cuerpo JSON, como las de /api/app/{component}"""
+    response = Response()
+    response.status_code = status
+    response._content = json.dumps(payload or {}).encode('utf-8')
+    response.headers['Content-Type'] = 'application/json'
+    response.url = 'https://sica.test/api/app/registro'
+    return response
+
+
+def componente_registro(numero=1):
+    """component_data mínimo de /despachos/registrar"""
+    return {
+        'fingerprint': {'id': f'comp{numero}', 'name': f'registro{numero}'},
+        'serverMemo': {'htmlHash': 'h1', 'checksum': f'checksum{numero}', 'data': {'data': {}}},
+    }
+
+
+@pytest.fixture
+def crear_bot(tmp_path):
+    """Fábrica de SICABot aislados: limitador, circuitos, timeouts, apagado y artefactos propios"""
+    bots = []
+
+    def crear(**opciones):
+        opciones.setdefault('conservar_html', False)
+        opciones.setdefault('precargar_registrar', False)
+        opciones.setdefault('apagado', Apagado(plazo=1))
+        opciones.setdefault('limitador', LimitadorAdaptativo())
+        opciones.setdefault('circuitos', GrupoCircuitos())
+        opciones.setdefault('timeouts', TimeoutsAdaptativos())
+        if 'artefactos' not in opciones:
+            opciones['artefactos'] = AlmacenArtefactos(str(tmp_path / 'artefactos'))
+        bot = SICABot(**opciones)
+        bots.append(bot)
+        return bot
+
+    yield crear
+    for bot in bots:
+        bot.artefactos.cerrar()
+
+
+@pytest.fixture
+def sesion_falsa():
+    """Reemplazar session.request de un bot por respuestas o excepciones en orden; retorna lo enviado"""
+
+    def instalar(bot, respuestas):
+        pendientes = list(respuestas)
+        enviados = []
+
+        def request(method, url, **kwargs):
+            enviados.append({'method': method, 'url': url, **kwargs})
+            siguiente = pendientes.pop(0)
+            if isinstance(siguiente, Exception):
+                raise siguiente
+            return siguiente
+
+        bot.session.request = request
+        return enviados
+
+    return instalar
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+SICA Apagado - Apagado ordenado ante SIGINT/SIGTERM y checkpoint de lotes
+La primera señal deja de aceptar trabajo y da un plazo a los despachos en curso; vencido
+el plazo, el bot rechaza requests nuevos y los despachos cortados quedan INTERRUMPIDOS.
+Los trabajos sin terminar se guardan con su último serverMemo para reanudar el lote
+"""
+
+import hashlib
+import json
+import os
+import signal
+import threading
+import time
+
+# Estados de un despacho que no tiene sentido reintentar (ni reanudar)
+ESTADOS_DEFINITIVOS = ('COMPLETADO', 'EMPRESA_NO_ENCONTRADA', 'CONDUCTOR_NO_ENCONTRADO', 'VEHICULO_NO_ENCONTRADO')
+
+
+class DrenajeVencido(Exception):
+    """Request rechazado porque venció el plazo de drenaje del apagado"""
+
+
+class Apagado:
+    """Estado de apagado del proceso: solicitado, plazo de drenaje y forzado (segunda señal)"""
+
+    def __init__(self, plazo=60.0):
+        self.plazo = plazo
+        self.evento = threading.Event()
+        self.forzado = False
+        self.solicitado_en = None
+        self._callbacks = []
+        self._anteriores = {}
+        self._lock = threading.Lock()
+
+    @property
+    def solicitado(self):
+        return self.evento.is_set()
+
+    def vencido(self):
+        """True si ya no se debe iniciar ningún request (plazo cumplido o apagado forzado)"""
+        if self.forzado:
+            return True
+        return self.solicitado_en is not None and time.monotonic() - self.solicitado_en > self.plazo
+
+    def restante(self):
+        """Segundos que quedan del plazo de drenaje (None si no se solicitó el apagado)"""
+        if self.solicitado_en is None:
+            return None
+        if self.forzado:
+            return 0.0
+        return max(0.0, self.plazo - (time.monotonic() - self.solicitado_en))
+
+    def al_solicitar(self, callback):
+        """Ejecutar callback (en un hilo aparte) cuando se solicite el apagado"""
+        with self._lock:
+            self._callbacks.append(callback)
+            ya_solicitado = self.solicitado
+        if ya_solicitado:
+            threading.Thread(target=callback, daemon=True).start()
+
+    def solicitar(self, motivo='solicitud'):
+        """Iniciar el drenaje: los llamadores dejan de tomar trabajo nuevo"""
+        with self._lock:
+            if self.solicitado:
+                return False
+            self.solicitado_en = time.monotonic()
+            self.evento.set()
+            callbacks = list(self._callbacks)
+        print(f"\n🛑 Apagado solicitado ({motivo}): sin trabajo nuevo, {self.plazo:g}s para terminar el que está en curso")
+        for callback in callbacks:
+            # Fuera del manejador de señales: el callback puede bloquear (p. ej. server.shutdown)
+            threading.Thread(target=callback, daemon=True).start()
+        return True
+
+    def _manejar(self, numero, frame):
+        nombre = signal.Signals(numero).name
+        if self.solicitar(nombre):
+            return
+        # Segunda señal: apagado inmediato, sin esperar el plazo
+        self.forzado = True
+        self.desinstalar()
+        print(f"\n⚠️ {nombre} otra vez: apagado forzado")
+        raise KeyboardInterrupt
+
+    def instalar(self, senales=(signal.SIGINT, signal.SIGTERM)):
+        """Atender las señales con drenaje ordenado (solo desde el hilo principal)"""
+        if threading.current_thread() is not threading.main_thread():
+            print("⚠️ Las señales solo se pueden atender desde el hilo principal")
+            return False
+        for numero in senales:
+            self._anteriores.setdefault(numero, signal.getsignal(numero))
+            signal.signal(numero, self._manejar)
+        return True
+
+    def desinstalar(self):
+        for numero, anterior in self._anteriores.items():
+            signal.signal(numero, anterior)
+        self._anteriores.clear()
+
+
+def clave_despacho(despacho, repeticion=0):
+    """Clave estable de un despacho por su contenido (repeticion distingue duplicados del lote)"""
+    contenido = json.dumps([str(despacho.get(c)) for c in ('codigo_empresa', 'cedula', 'placa')])
+    return hashlib.sha256(f"{contenido}#{repeticion}".encode('utf-8')).hexdigest()[:16]
+
+
+def claves_lote(despachos):
+    """Claves de todos los despachos de un lote, en orden"""
+    vistas = {}
+    claves = []
+    for despacho in despachos:
+        base = clave_despacho(despacho)
+        claves.append(clave_despacho(despacho, vistas.get(base, 0)))
+        vistas[base] = vistas.get(base, 0) + 1
+    return claves
+
+
+class CheckpointLote:
+    """Resultado de cada despacho de un lote en un registro JSON por líneas, de solo agregado.
+
+    Cada cambio agrega una línea {clave, trabajo} (costo constante por despacho, sin reescribir
+    el lote); al abrir se reproduce el registro, gana la última línea de cada clave, y se
+    compacta. Los despachos terminados en un estado definitivo no se repiten al reanudar; los
+    demás guardan su component_data (fingerprint + último serverMemo) para retomarlos.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.trabajos = {}
+        self._lock = threading.Lock()
+        if os.path.exists(ruta):
+            lineas, invalidas = self._reproducir()
+            if invalidas or lineas != len(self.trabajos):
+                self._compactar()
+            terminados = sum(1 for t in self.trabajos.values() if t['estado'] in ESTADOS_DEFINITIVOS)
+            print(f"📂 Checkpoint '{ruta}': {terminados} despachos terminados, "
+                  f"{len(self.trabajos) - terminados} por reanudar")
+
+    def _reproducir(self):
+        lineas = invalidas = 0
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    # Línea truncada por un corte a mitad de escritura: se pierde solo ese cambio
+                    invalidas += 1
+                    continue
+                lineas += 1
+                if entrada.get('descartado'):
+                    self.trabajos.pop(entrada['clave'], None)
+                else:
+                    self.trabajos[entrada['clave']] = entrada['trabajo']
+        return lineas, invalidas
+
+    def previo(self, clave):
+        with self._lock:
+            trabajo = self.trabajos.get(clave)
+            return dict(trabajo) if trabajo else None
+
+    def registrar(self, clave, despacho, resultado):
+        """Guardar el estado de un despacho; solo los no definitivos conservan su component_data"""
+        resultado = dict(resultado)
+        component_data = resultado.pop('component_data', None)
+        trabajo = {'despacho': despacho, 'estado': resultado.get('estado'), 'resultado': resultado,
+                   'actualizado': time.time()}
+        if component_data and trabajo['estado'] not in ESTADOS_DEFINITIVOS:
+            trabajo['component_data'] = component_data
+        with self._lock:
+            self.trabajos[clave] = trabajo
+            self._agregar({'clave': clave, 'trabajo': trabajo})
+
+    def descartar(self, clave):
+        """Quitar un despacho del checkpoint (p. ej. el daemon, al terminarlo en un estado definitivo)"""
+        with self._lock:
+            if self.trabajos.pop(clave, None) is not None:
+                self._agregar({'clave': clave, 'descartado': True})
+
+    def pendientes(self):
+        with self._lock:
+            return [clave for clave, t in self.trabajos.items() if t['estado'] not in ESTADOS_DEFINITIVOS]
+
+    def _agregar(self, entrada):
+        linea = json.dumps(entrada, ensure_ascii=False, default=str) + '\n'
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write(linea)
+
+    def _compactar(self):
+        """Reescribir el registro con una línea por despacho, de forma atómica"""
+        temporal = self.ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for clave, trabajo in self.trabajos.items():
+                f.write(json.dumps({'clave': clave, 'trabajo': trabajo}, ensure_ascii=False, default=str) + '\n')
+        os.replace(temporal, self.ruta)
+
+    def eliminar(self):
+        with self._lock:
+            self.trabajos = {}
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+
+
+_apagado_compartido = None
+_apagado_lock = threading.Lock()
+
+
+def apagado_compartido():
+    """Apagado único del proceso; el plazo de drenaje sale de SICA_PLAZO_DRENAJE (60 s)"""
+    global _apagado_compartido
+    with _apagado_lock:
+        if _apagado_compartido is None:
+            _apagado_compartido = Apagado(float(os.environ.get('SICA_PLAZO_DRENAJE', 60)))
+        return _apagado_compartido
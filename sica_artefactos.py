@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+SICA Artefactos - Almacén acotado y comprimido para los volcados de depuración del bot
+Reemplaza los archivos JSON/HTML fijos en el directorio de trabajo: escribe en segundo plano,
+comprime (zstd si está instalado, si no gzip), deduplica por hash y poda por tamaño y edad
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+def _zstd_disponible():
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AlmacenArtefactos:
+    """Artefactos por clave (trabajo/componente) y nombre, escritos fuera del camino crítico"""
+
+    def __init__(self, directorio='artefactos', compresion=None, max_bytes=200 * 1024 * 1024,
+                 max_edad=7 * 24 * 3600, max_pendientes=1000, podar_cada=100):
+        self.directorio = directorio
+        if compresion is None:
+            compresion = 'zstd' if _zstd_disponible() else 'gzip'
+        if compresion not in ('zstd', 'gzip', 'ninguna'):
+            raise ValueError(f"Compresión no soportada: {compresion}")
+        self.compresion = compresion
+        self.max_bytes = max_bytes
+        self.max_edad = max_edad
+        self.podar_cada = podar_cada
+
+        os.makedirs(os.path.join(directorio, 'blobs'), exist_ok=True)
+        self._ruta_indice = os.path.join(directorio, 'indice.db')
+        # Esquema creado antes de aceptar lecturas: leer() puede llegar antes del primer guardar()
+        self._crear_esquema()
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._escritos = 0
+        # Los llamadores (descartados) y el escritor actualizan las estadísticas a la vez
+        self._stats_lock = threading.Lock()
+        self.stats = {'guardados': 0, 'deduplicados': 0, 'descartados': 0, 'bytes_escritos': 0, 'podados': 0}
+
+        self._hilo = threading.Thread(target=self._escritor, daemon=True)
+        self._hilo.start()
+
+    # --- API usada desde el camino crítico ---
+
+    def _contar(self, clave, cantidad=1):
+        with self._stats_lock:
+            self.stats[clave] += cantidad
+
+    def guardar(self, nombre, contenido, clave=None):
+        """Encolar un artefacto (dict/list → JSON compacto, str o bytes) sin bloquear al llamador.
+
+        El contenido se serializa aquí y no en el escritor: el llamador puede seguir
+        modificando el dict (p. ej. un component_data) después de guardarlo.
+        """
+        try:
+            datos, tipo = self._serializar(contenido)
+            self._cola.put_nowait((time.time(), clave or 'general', nombre, datos, tipo))
+        except queue.Full:
+            # Nunca frenar un despacho por un volcado de depuración
+            self._contar('descartados')
+        except (TypeError, ValueError) as e:
+            print(f"⚠️ Artefacto '{nombre}' no serializable: {e}")
+            self._contar('descartados')
+
+    def leer(self, nombre, clave=None):
+        """Último artefacto guardado con ese nombre (y clave, si se indica); None si no existe"""
+        conexion = sqlite3.connect(self._ruta_indice, timeout=30)
+        try:
+            consulta = ("SELECT b.ruta, b.compresion, a.tipo FROM artefactos a JOIN blobs b ON a.hash = b.hash "
+                        "WHERE a.nombre = ?")
+            parametros = [nombre]
+            if clave is not None:
+                consulta += " AND a.clave = ?"
+                parametros.append(clave)
+            fila = conexion.execute(consulta + " ORDER BY a.creado DESC LIMIT 1", parametros).fetchone()
+        finally:
+            conexion.close()
+        if fila is None:
+            return None
+        ruta, compresion, tipo = fila
+        with open(ruta, 'rb') as f:
+            datos = self._descomprimir(f.read(), compresion)
+        if tipo == 'json':
+            return json.loads(datos)
+        if tipo == 'texto':
+            return datos.decode('utf-8')
+        return datos
+
+    def vaciar(self, timeout=None):
+        """Esperar a que se escriban los artefactos pendientes"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self._cola.unfinished_tasks:
+            if limite is not None and time.monotonic() > limite:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def cerrar(self):
+        self.vaciar(timeout=10)
+        self._cola.put(None)
+        self._hilo.join(timeout=10)
+
+    # --- Escritor en segundo plano ---
+
+    def _crear_esquema(self):
+        conexion = sqlite3.connect(self._ruta_indice, timeout=30)
+        try:
+            conexion.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    ruta TEXT NOT NULL,
+                    compresion TEXT NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    bytes_originales INTEGER NOT NULL,
+                    ultimo_uso REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS artefactos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    clave TEXT NOT NULL,
+                    nombre TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    creado REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_artefactos_nombre ON artefactos (nombre, clave, creado);
+                CREATE INDEX IF NOT EXISTS idx_artefactos_hash ON artefactos (hash);
+            """)
+        finally:
+            conexion.close()
+
+    def _escritor(self):
+        conexion = sqlite3.connect(self._ruta_indice, timeout=30)
+        while True:
+            item = self._cola.get()
+            try:
+                if item is None:
+                    self._podar(conexion)
+                    return
+                self._escribir(conexion, *item)
+                self._escritos += 1
+                if self._escritos % self.podar_cada == 0:
+                    self._podar(conexion)
+            except Exception as e:
+                print(f"⚠️ Error guardando artefacto: {e}")
+            finally:
+                self._cola.task_done()
+
+    def _serializar(self, contenido):
+        if isinstance(contenido, bytes):
+            return contenido, 'bytes'
+        if isinstance(contenido, str):
+            return contenido.encode('utf-8'), 'texto'
+        return json.dumps(contenido, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8'), 'json'
+
+    def _comprimir(self, datos):
+        if self.compresion == 'zstd':
+            import zstandard
+            return zstandard.ZstdCompressor(level=3).compress(datos), '.zst'
+        if self.compresion == 'gzip':
+            return gzip.compress(datos, compresslevel=6), '.gz'
+        return datos, ''
+
+    def _descomprimir(self, datos, compresion):
+        if compresion == 'zstd':
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(datos)
+        if compresion == 'gzip':
+            return gzip.decompress(datos)
+        return datos
+
+    def _escribir(self, conexion, creado, clave, nombre, datos, tipo):
+        digest = hashlib.sha256(datos).hexdigest()
+
+        existente = conexion.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if existente:
+            self._contar('deduplicados')
+            conexion.execute("UPDATE blobs SET ultimo_uso = ? WHERE hash = ?", (creado, digest))
+        else:
+            comprimido, extension = self._comprimir(datos)
+            carpeta = os.path.join(self.directorio, 'blobs', digest[:2])
+            os.makedirs(carpeta, exist_ok=True)
+            ruta = os.path.join(carpeta, digest + extension)
+            temporal = ruta + '.tmp'
+            with open(temporal, 'wb') as f:
+                f.write(comprimido)
+            os.replace(temporal, ruta)
+            conexion.execute(
+                "INSERT INTO blobs (hash, ruta, compresion, bytes, bytes_originales, ultimo_uso) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, ruta, self.compresion, len(comprimido), len(datos), creado),
+            )
+            self._contar('bytes_escritos', len(comprimido))
+
+        conexion.execute(
+            "INSERT INTO artefactos (clave, nombre, tipo, hash, creado) VALUES (?, ?, ?, ?, ?)",
+            (clave, nombre, tipo, digest, creado),
+        )
+        conexion.commit()
+        self._contar('guardados')
+
+    def _podar(self, conexion):
+        """Eliminar blobs más viejos que max_edad y, si se supera max_bytes, los menos usados"""
+        limite_edad = time.time() - self.max_edad
+        viejos = conexion.execute("SELECT hash, ruta FROM blobs WHERE ultimo_uso < ?", (limite_edad,)).fetchall()
+
+        total = conexion.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs WHERE ultimo_uso >= ?",
+                                 (limite_edad,)).fetchone()[0]
+        excedentes = []
+        if total > self.max_bytes:
+            for digest, ruta, tamano in conexion.execute(
+                    "SELECT hash, ruta, bytes FROM blobs WHERE ultimo_uso >= ? ORDER BY ultimo_uso", (limite_edad,)):
+                if total <= self.max_bytes:
+                    break
+                excedentes.append((digest, ruta))
+                total -= tamano
+
+        for digest, ruta in viejos + excedentes:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            conexion.execute("DELETE FROM artefactos WHERE hash = ?", (digest,))
+            conexion.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+            self._contar('podados')
+        conexion.commit()
+
+    def estadisticas(self):
+        conexion = sqlite3.connect(self._ruta_indice, timeout=30)
+        try:
+            blobs, comprimidos, originales = conexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(SUM(bytes_originales), 0) FROM blobs"
+            ).fetchone()
+        finally:
+            conexion.close()
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, blobs=blobs, bytes_en_disco=comprimidos, bytes_originales=originales,
+                    pendientes=self._cola.qsize(), compresion=self.compresion)
+
+
+_almacen_compartido = None
+_almacen_lock = threading.Lock()
+
+
+def almacen_compartido():
+    """Almacén de artefactos único del proceso (directorio SICA_ARTEFACTOS o 'artefactos')"""
+    global _almacen_compartido
+    with _almacen_lock:
+        if _almacen_compartido is None:
+            _almacen_compartido = AlmacenArtefactos(os.environ.get('SICA_ARTEFACTOS', 'artefactos'))
+        return _almacen_compartido
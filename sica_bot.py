@@ -6,36 +6,286 @@ Sistema para automatizar el proceso de login, verificación de dispositivo y req
 
 import requests
 import re
-from bs4 import BeautifulSoup
 import json
 import time
 import atexit
+import copy
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from urllib.parse import urljoin
 
+from sica_apagado import ESTADOS_DEFINITIVOS, DrenajeVencido, apagado_compartido, claves_lote
+from sica_artefactos import almacen_compartido
+from sica_concurrencia import hedge_compartido, limitador_compartido
+from sica_cuentas import PoolCuentas
+from sica_cassette import grabar, reproducir
+from sica_catalogo import CLAVES_CATALOGO, CatalogoRubros
+from sica_livewire import LivewireResponse
+from sica_perfil import perfilado, perfilador_compartido
+from sica_resiliencia import CircuitoAbierto, circuitos_compartidos, timeouts_compartidos
+from sica_transporte import montar_transporte
+
+# Clase de endpoint (circuit breaker) de cada operación; el resto son RPC Livewire
+CLASES_ENDPOINT = {
+    'login_page': 'login',
+    'login': 'login',
+    'vincular_dispositivo': 'login',
+    'despachos': 'registrar',
+    'registrar': 'registrar',
+    'logout': None,  # el logout nunca se estaciona
+}
+
+# Lecturas idempotentes que se pueden duplicar tal cual (hedging) sin efectos en SICA: el GET
+# del listado y el POST de su tabla, que viaja con un serverMemo fijo que nunca se fusiona
+OPERACIONES_HEDGE = ('despachos', 'despachos_tabla')
+
+# Fallos del request (transporte, servidor, circuito, drenaje): el despacho queda reintentable,
+# nunca "no encontrado"; las búsquedas y selecciones los propagan en lugar de retornar None
+FALLOS_TRANSITORIOS = (requests.RequestException, CircuitoAbierto, TimeoutError, DrenajeVencido)
+
+# Campos (wire:model) del componente de registro de despachos
+CAMPOS_REGISTRO = {
+    'codigo_empresa': 'data.cWFjL1BPYjFSMHBuMWkxbi9PZ0dxdz09',
+    'cedula': 'data.dFZpVGlDZU1rK2xmOE5GYTB2UTF2dz09',
+    'placa': 'data.bTBZOW5WRVUrRGdVZ1JlM05EQ1lsQT09',
+    'facturas': 'data.QjVzNkJoc216QUxDNVM0MzJVNDlRdz09',
+    'observacion': 'data.SklYOFdOY082VFRjamE0TFJuNC9YZz09',
+}
+
+# Select de rubros del paso 4 y método del botón "Agregar" (un rubro por vez)
+CAMPO_RUBRO = 'data.WHlvWDNuaFpuQ2lpN1lLOXV4OVgxUT09'
+METODO_AGREGAR_RUBRO = 'd2F0NU5NSWl6UzZDRlJRUmtlUlJRZz09'
+
+# Selects de mes y año CUSPAL: sus nombres codificados no aparecen en el tráfico capturado
+# (docs/); hasta completarlos aquí se pasan por despacho en 'campos_cuspal'
+CAMPOS_CUSPAL = {'mes_cuspal': None, 'anio_cuspal': None}
+
+# Campos de data que guardan el ID seleccionado de empresa y conductor
+CAMPO_EMPRESA_SELECCIONADA = 'THd2VHJ1QzNOWDVoUjlBRGZaSzIrZz09'
+CAMPO_CONDUCTOR_SELECCIONADO = 'MkNMdzRrM0JqeUUxUm1lWUJoNmFZQT09'
+
+# Métodos codificados que se invocan con $wire.__method(...) al elegir un resultado
+METODOS_SELECCION = {
+    'empresa': 'LzN6OGVJbzFJNjBlSW5PRk9XOWVaQkMzNVZ0bGVrWmVzc3FlTmVnQzloVT0%3D',
+    'conductor': 'YTJnWEJUbmZ4UVR1NWtydHdXZWtGM1hxVGIwQ2xlTXVzNTlZcllCL0xVYz0%3D',
+    'vehiculo': 'WEJETUxiUG5Samhpa0loM09WSW1ONDhHZGxDNVdkR1FhVXNpNjFDZVJVYz0%3D',
+}
+
+# Un componente precargado en el login más viejo que esto se descarta (serverMemo/CSRF vencidos)
+EDAD_MAXIMA_PRECARGA = 600.0
+
+
+def normalizar_cedula(cedula):
+    """Formatear una cédula venezolana como V-12345678; None si el formato es inválido.
+
+    Acepta V-12345678, V12345678 o 12345678 (sin letra se asume V).
+    """
+    cedula = str(cedula or '').strip()
+    cedula_clean = cedula.upper().replace('-', '').replace(' ', '')
+    if not cedula_clean:
+        return None
+    if cedula_clean.isdigit():
+        return f"V-{cedula_clean}"
+    if cedula_clean.startswith(('V', 'E', 'J', 'G', 'P')):
+        # Formatear con guión si no lo tiene
+        if '-' not in cedula:
+            return f"{cedula_clean[0]}-{cedula_clean[1:]}"
+        return cedula.upper()
+    return None
+
+
+def normalizar_placa(placa):
+    """Placa en mayúsculas si es alfanumérica de 6-9 caracteres; None si es inválida"""
+    placa = str(placa or '').strip().upper()
+    if re.match(r'^[A-Z0-9]{6,9}$', placa):
+        return placa
+    return None
+
 class SICABot:
-    def __init__(self):
+    def __init__(self, conservar_html=True, singleflight=None, limitador=None, circuitos=None, artefactos=None,
+                 http2=None, codecs=None, timeouts=None, hedge=None, perfilador=None, precargar_registrar=True,
+                 apagado=None):
         self.session = requests.Session()
         self.base_url = "https://sica.sunagro.gob.ve"
         self.csrf_token = None
         self.verification_code = None
         self.logged_in = False
+        # Sesión prestada por el broker: el logout lo decide el broker, no este proceso
+        self.sesion_prestada = False
         self.last_search_result = None
+        # Si es False, las respuestas Livewire descartan effects.html al decodificar
+        self.conservar_html = conservar_html
+        # SingleFlight compartido entre bots para coalescer búsquedas idénticas concurrentes
+        self.singleflight = singleflight
+        # Limitador AIMD de concurrencia por operación (por defecto, el compartido del proceso)
+        self.limitador = limitador or limitador_compartido()
+        # Circuit breakers por clase de endpoint (por defecto, los compartidos del proceso)
+        self.circuitos = circuitos or circuitos_compartidos()
+        # Timeouts por operación según su p99 observado (por defecto, los compartidos del proceso)
+        self.timeouts = timeouts or timeouts_compartidos()
+        # Hedging opcional de lecturas idempotentes (SICA_HEDGE=1 usa la política compartida)
+        if hedge is None and os.environ.get('SICA_HEDGE', '') not in ('', '0'):
+            hedge = hedge_compartido()
+        self.hedge = hedge or None
+        # Callable sin argumentos que entrega un componente de registro precargado de esta misma
+        # sesión (o None): sobre él van los duplicados de las búsquedas. Lo asigna ReservaSesiones
+        self.componente_repuesto = None
+        # Perfilado de CPU/memoria por operación (SICA_PERFIL; None = desactivado, sin costo)
+        self.perfilador = perfilador or perfilador_compartido()
+        # Adaptador de grabación/reproducción de tráfico (ver sica_cassette.py)
+        self.cassette = None
+        # Almacén de volcados de depuración (por defecto, el compartido del proceso)
+        self.artefactos = artefactos or almacen_compartido()
+        # Cuenta del pool con la que se logueó este bot (ver sica_cuentas.py)
+        self.cuenta = None
+        # Rubros y años/meses CUSPAL de esta sesión (ver sica_catalogo.py)
+        self.catalogo = CatalogoRubros()
+        # Medición de tráfico por hilo (ver medir_trafico)
+        self._medicion_local = threading.local()
+        # Cargar /despachos/registrar en paralelo con los tokens del paso 5 (ver full_login_process)
+        self.precargar_registrar = precargar_registrar
+        self._precarga = None
+        self._precarga_lock = threading.Lock()
+        # Duración de las fases del último login, hasta tener un componente de registro listo
+        self.calentamiento = {}
+        # Apagado ordenado del proceso (SIGINT/SIGTERM) y despachos en curso a drenar antes del logout
+        self.apagado = apagado or apagado_compartido()
+        self._en_curso = 0
+        self._en_curso_cond = threading.Condition()
         
         # Headers comunes para simular navegador
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'es-US,es;q=0.9,es-419;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         })
         
-        # Registrar función de limpieza para logout automático
+        # Transporte: Accept-Encoding solo con codecs instalados (SICA_CODECS: auto, gzip, ninguna
+        # o lista como 'br,gzip') y HTTP/2 opcional (SICA_HTTP2=1) para multiplexar la sesión
+        if http2 is None:
+            http2 = os.environ.get('SICA_HTTP2', '') not in ('', '0')
+        self.transporte = montar_transporte(self.session, http2=http2,
+                                            codecs=codecs or os.environ.get('SICA_CODECS', 'auto'))
+        
+        # Al salir: drenar los despachos en curso, luego logout (ver cleanup)
         atexit.register(self.cleanup)
     
+    def _request(self, method, operacion, url, degradado=None, **kwargs):
+        """Request HTTP de una operación; las lecturas idempotentes pueden ir con hedging.
+
+        Con self.hedge, si una operación de OPERACIONES_HEDGE no respondió en su p95
+        observado se envía un duplicado y se usa la primera respuesta. Las búsquedas no se
+        duplican aquí (ver _hedge_busqueda): irían sobre el mismo serverMemo del componente.
+        """
+        if self.hedge is not None and operacion in OPERACIONES_HEDGE:
+            response = self.hedge.ejecutar(lambda: self._enviar(method, operacion, url, degradado, **kwargs),
+                                           self.timeouts.percentil(operacion, 0.95))
+        else:
+            response = self._enviar(method, operacion, url, degradado, **kwargs)
+        self._contar_trafico(response)
+        return response
+    
+    def _enviar(self, method, operacion, url, degradado=None, **kwargs):
+        """Request HTTP pasando por el circuit breaker y el limitador adaptativo de la operación.
+
+        Sin timeout explícito se usa el adaptativo de la operación; al expirar se propaga
+        requests.Timeout para que decidan los reintentos del llamador (o de la cola).
+
+        degradado: función opcional que recibe la respuesta y retorna True si es una
+        respuesta degradada del servidor (p. ej. página de loading) aunque sea 200.
+        """
+        # Vencido el plazo de drenaje solo sale el logout; lo demás se corta aquí
+        if operacion != 'logout' and self.apagado.vencido():
+            raise DrenajeVencido(f"Apagado en curso: {operacion} cancelada")
+        clase = CLASES_ENDPOINT.get(operacion, 'livewire')
+        circuito = self.circuitos.circuito(clase) if clase else None
+        # Con el circuito abierto el request se estaciona aquí, sin ocupar cupo del limitador
+        sondeo = circuito.antes_de_request() if circuito else False
+        # Mantener la cuenta dentro de su presupuesto de requests
+        if self.cuenta is not None:
+            self.cuenta.consumir()
+        
+        permiso = self.limitador.adquirir(operacion)
+        # Timeout adaptativo de la operación, salvo que el llamador fije uno
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = self.timeouts.timeout(operacion, clase)
+        inicio = time.monotonic()
+        fallo = 'conexion'
+        try:
+            response = self.session.request(method, url, **kwargs)
+            fallo = None
+            if response.status_code >= 500:
+                fallo = 'http_5xx'
+            elif degradado is not None and degradado(response):
+                fallo = 'loading'
+            return response
+        except requests.Timeout:
+            fallo = 'timeout'
+            raise
+        finally:
+            latencia = time.monotonic() - inicio
+            permiso.liberar(latencia, fallo=fallo)
+            if fallo is None or fallo == 'timeout':
+                timeout = kwargs['timeout']
+                self.timeouts.registrar(operacion, latencia, expirado=fallo == 'timeout',
+                                        timeout=timeout[1] if isinstance(timeout, tuple) else timeout)
+            if fallo and self.cuenta is not None:
+                self.cuenta.registrar_error(fallo, operacion)
+            if circuito:
+                if fallo:
+                    circuito.registrar_fallo(sondeo)
+                else:
+                    circuito.registrar_exito(sondeo)
+    
+    def _contar_trafico(self, response):
+        medicion = getattr(self._medicion_local, 'actual', None)
+        if medicion is None:
+            return
+        body = response.request.body if response.request is not None else None
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        medicion['requests'] += 1
+        medicion['bytes_enviados'] += len(body or b'')
+        medicion['bytes_recibidos'] += len(response.content)
+        # Bytes que viajaron por la red (comprimidos), si el transporte los midió
+        medicion['bytes_red'] += getattr(response, 'bytes_comprimidos', len(response.content))
+    
+    @contextmanager
+    def medir_trafico(self):
+        """Contar requests y bytes (cuerpo enviado y recibido) hechos por este hilo dentro del bloque"""
+        medicion = {'requests': 0, 'bytes_enviados': 0, 'bytes_recibidos': 0, 'bytes_red': 0}
+        anterior = getattr(self._medicion_local, 'actual', None)
+        self._medicion_local.actual = medicion
+        try:
+            yield medicion
+        finally:
+            self._medicion_local.actual = anterior
+            if anterior is not None:
+                for clave, valor in medicion.items():
+                    anterior[clave] += valor
+    
+    def _guardar_artefacto(self, nombre, contenido, component_data=None):
+        """Guardar un volcado de depuración en el almacén, con el ID del componente como clave"""
+        clave = (component_data or {}).get('fingerprint', {}).get('id')
+        self.artefactos.guardar(nombre, contenido, clave=clave)
+    
+    def _leer_artefacto(self, nombre, component_data=None):
+        """Último volcado guardado para el componente; None si no existe"""
+        clave = (component_data or {}).get('fingerprint', {}).get('id')
+        try:
+            return self.artefactos.leer(nombre, clave=clave)
+        except Exception as e:
+            print(f"⚠️ No se pudo leer el artefacto '{nombre}': {e}")
+            return None
+    
     def get_csrf_token(self, html_content):
         """Extrae el token CSRF del HTML"""
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html_content, 'html.parser')
         csrf_input = soup.find('input', {'name': '_token'})
         if csrf_input:
@@ -55,7 +305,7 @@ class SICABot:
         print("🔄 Paso 1: Obteniendo página de login...")
         
         try:
-            response = self.session.get(f"{self.base_url}/login")
+            response = self._request('GET', 'login_page', f"{self.base_url}/login")
             response.raise_for_status()
             
             self.csrf_token = self.get_csrf_token(response.text)
@@ -80,7 +330,8 @@ class SICABot:
                 'password': password
             }
             
-            response = self.session.post(
+            response = self._request(
+                'POST', 'login',
                 f"{self.base_url}/login",
                 data=login_data,
                 allow_redirects=True
@@ -131,7 +382,8 @@ class SICABot:
                 'codigo': self.verification_code
             }
             
-            response = self.session.post(
+            response = self._request(
+                'POST', 'vincular_dispositivo',
                 f"{self.base_url}/vincular_dispositivo",
                 data=verify_data,
                 allow_redirects=True
@@ -156,13 +408,14 @@ class SICABot:
         
         try:
             # Ir a la página de despachos
-            response = self.session.get(f"{self.base_url}/despachos")
+            response = self._request('GET', 'despachos', f"{self.base_url}/despachos")
             response.raise_for_status()
             
             # Extraer CSRF token actualizado
             self.csrf_token = self.get_csrf_token(response.text)
             
             # Buscar el token X-CSRF-TOKEN en meta tags
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(response.text, 'html.parser')
             csrf_meta = soup.find('meta', {'name': 'csrf-token'})
             x_csrf_token = csrf_meta.get('content') if csrf_meta else self.csrf_token
@@ -179,8 +432,22 @@ class SICABot:
             print(f"❌ Error en paso 5: {e}")
             return None
     
+    @perfilado
     def navigate_to_despachos_registrar(self):
-        """Navegar a la página de registro de despachos y extraer datos del componente"""
+        """Navegar a la página de registro de despachos y extraer datos del componente.
+
+        El primer llamado tras el login usa el componente que full_login_process ya cargó.
+        """
+        with self._precarga_lock:
+            precarga, self._precarga = self._precarga, None
+        if precarga is not None:
+            component_data, cargado = precarga
+            if time.monotonic() - cargado < EDAD_MAXIMA_PRECARGA:
+                print("♻️ Usando el componente de registro precargado en el login")
+                return component_data
+        return self._cargar_registrar()
+    
+    def _cargar_registrar(self):
         print("🔄 Navegando a página de registro de despachos...")
         
         max_retries = 3
@@ -190,7 +457,10 @@ class SICABot:
             try:
                 print(f"🔄 Intento {attempt + 1}/{max_retries}")
                 
-                response = self.session.get(f"{self.base_url}/despachos/registrar")
+                response = self._request(
+                    'GET', 'registrar', f"{self.base_url}/despachos/registrar",
+                    degradado=lambda r: 'loading-top' in r.text and 'wire:id' not in r.text
+                )
                 response.raise_for_status()
                 
                 print(f"📊 Status Code: {response.status_code}")
@@ -214,22 +484,22 @@ class SICABot:
                 else:
                     print("⚠️ No se detectaron scripts de Livewire")
                 
-                # Actualizar CSRF token
-                self.csrf_token = self.get_csrf_token(response.text)
+                # El token CSRF lo fija solo el paso 5 (o el broker): durante el login esta página
+                # se carga en paralelo con /despachos y no debe pisarlo
                 
                 # Extraer datos del componente Livewire
                 component_data = self.extract_livewire_component_data(response.text)
                 
                 if component_data:
                     print("✅ Página de registro cargada exitosamente")
+                    self.catalogo.actualizar(component_data.get('serverMemo', {}).get('data', {}))
                     return component_data
                 else:
                     print("⚠️ No se pudieron extraer datos completos del componente")
                     if attempt == max_retries - 1:
                         # Guardar HTML para debug solo en el último intento
-                        with open('debug_registro_page.html', 'w', encoding='utf-8') as f:
-                            f.write(response.text)
-                        print("📄 HTML guardado en 'debug_registro_page.html' para análisis")
+                        self._guardar_artefacto('debug_registro_page.html', response.text)
+                        print("📄 HTML guardado como artefacto 'debug_registro_page.html' para análisis")
                     else:
                         time.sleep(retry_delay)
                         continue
@@ -244,9 +514,11 @@ class SICABot:
         
         return None
     
+    @perfilado
     def extract_livewire_component_data(self, html_content):
         """Extraer datos del componente Livewire del HTML"""
         try:
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(html_content, 'html.parser')
             
             # Buscar específicamente el componente de registro de despachos
@@ -325,8 +597,59 @@ class SICABot:
             print(f"❌ Error extrayendo datos del componente: {e}")
             return None
     
-    def search_empresa_by_codigo(self, codigo_empresa, component_data):
-        """Buscar empresa por código usando Livewire"""
+    def _coalescer(self, tipo, clave, solo_lectura, fn, *args):
+        """Pasar una búsqueda por el SingleFlight compartido, si está configurado.
+
+        Solo se coalescen las consultas de solo lectura (p. ej. el escaneo de flota): el
+        llamador coalescido recibe el registro del líder, pero su componente nunca vio la
+        búsqueda y no puede recibir el serverMemo del líder (el checksum es de otro
+        componente). Una búsqueda seguida de una selección sobre el mismo componente
+        necesita su propio round trip.
+        """
+        if self.singleflight is None or not solo_lectura:
+            return fn(*args)
+        resultado, compartido = self.singleflight.do((tipo, clave), fn, *args)
+        if compartido:
+            print(f"🔗 Resultado de {tipo} '{clave}' compartido con una búsqueda en curso")
+        return resultado
+    
+    def _hedge_busqueda(self, operacion, fn, valor, component_data):
+        """Búsqueda Livewire con hedging sobre un componente de repuesto de la misma sesión.
+
+        Dos POST en vuelo sobre el mismo componente desincronizarían su serverMemo, así que
+        el duplicado va sobre un componente precargado (componente_repuesto) y cada intento
+        trabaja sobre su propia copia. El componente del llamador adopta el estado del
+        intento que gana; el otro se descarta. Sin hedge o sin reserva, búsqueda directa.
+        """
+        if self.hedge is None or self.componente_repuesto is None:
+            return fn(valor, component_data)
+
+        def intento(datos):
+            propio = copy.deepcopy(datos)
+            return fn(valor, propio), propio
+
+        def duplicado():
+            repuesto = self.componente_repuesto()
+            if repuesto is None:
+                return None
+            print(f"🪞 {operacion} lenta: duplicando sobre un componente de repuesto")
+            return lambda: intento(repuesto)
+
+        resultado, ganador = self.hedge.ejecutar(lambda: intento(component_data),
+                                                 self.timeouts.percentil(operacion, 0.95), duplicado)
+        component_data.clear()
+        component_data.update(ganador)
+        if isinstance(resultado, dict) and resultado.get('component_data') is ganador:
+            resultado['component_data'] = component_data
+        return resultado
+
+    @perfilado
+    def search_empresa_by_codigo(self, codigo_empresa, component_data, solo_lectura=False):
+        """Buscar empresa por código usando Livewire (solo_lectura: coalescible, ver _coalescer)"""
+        return self._coalescer('empresa', str(codigo_empresa).strip(), solo_lectura, self._hedge_busqueda,
+                               'searchEmpresaCodigo', self._search_empresa_by_codigo, codigo_empresa, component_data)
+    
+    def _search_empresa_by_codigo(self, codigo_empresa, component_data):
         print(f"🔍 Buscando empresa con código: {codigo_empresa}")
         
         try:
@@ -378,25 +701,25 @@ class SICABot:
             print(f"🌐 Enviando request a: {url}")
             print(f"📦 Payload: {json.dumps(payload, indent=2)}")
             
-            response = self.session.post(url, json=payload, headers=headers)
+            response = self._request('POST', 'searchEmpresaCodigo', url, json=payload, headers=headers)
             
             print(f"📊 Status Code: {response.status_code}")
             print(f"📄 Response Headers: {dict(response.headers)}")
             
             if response.status_code != 200:
                 print(f"❌ Error HTTP {response.status_code}: {response.text}")
-                return None
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
             
             try:
-                result = response.json()
-                print(f"✅ Response JSON recibido: {json.dumps(result, indent=2)[:500]}...")
+                result = LivewireResponse(response, conservar_html=self.conservar_html)
+                print(f"✅ Response JSON recibido: {result.resumen()}")
             except json.JSONDecodeError as e:
                 print(f"❌ Error decodificando JSON: {e}")
                 print(f"📄 Response text: {response.text[:500]}...")
                 return None
             
             # Extraer datos de la empresa de la respuesta
-            empresas = result.get('serverMemo', {}).get('data', {}).get('empresas', [])
+            empresas = result.data.get('empresas', [])
             
             if empresas:
                 empresa = empresas[0]  # Tomar la primera empresa encontrada
@@ -410,20 +733,63 @@ class SICABot:
                 # Guardar la información de búsqueda
                 self.last_search_result = result
                 
+                # Actualizar el componente usado en la búsqueda (cada componente lleva su propio estado)
+                self._actualizar_component_data_empresa(component_data, result)
+                component_data.setdefault('contexto', {})['empresa'] = empresa
+                
                 # Guardar la información de la empresa para referencia
-                with open('empresa_encontrada.json', 'w') as f:
-                    json.dump(empresa, f, indent=2)
-                print(f"💾 Datos de empresa guardados en 'empresa_encontrada.json'")
+                self._guardar_artefacto('empresa_encontrada.json', empresa, component_data)
+                print(f"💾 Datos de empresa guardados como artefacto 'empresa_encontrada.json'")
                 
                 return empresa
             else:
                 print("❌ No se encontró empresa con ese código")
                 return None
             
+        except FALLOS_TRANSITORIOS:
+            raise
         except Exception as e:
             print(f"❌ Error buscando empresa: {e}")
             return None
     
+    def _actualizar_component_data_empresa(self, component_data, result):
+        """Actualizar el component_data con el serverMemo devuelto por la búsqueda de empresa"""
+        # Es CRÍTICO usar el serverMemo actualizado de la respuesta de búsqueda
+        # para que el checksum y htmlHash sean correctos
+        updated_server_memo = result.get('serverMemo', {})
+        if updated_server_memo:
+            # CRÍTICO: Asegurar que el serverMemo tenga TODOS los campos requeridos
+            # Comparando con la petición exitosa del documento
+            
+            # Obtener data actual y asegurar que tenga todos los campos requeridos
+            current_data = updated_server_memo.get('data', {})
+            
+            # Asegurar que data tenga todos los campos que aparecen en la petición exitosa
+            complete_data = current_data.copy()
+            if 'conductores' not in complete_data:
+                complete_data['conductores'] = []
+            if 'vehiculos' not in complete_data:
+                complete_data['vehiculos'] = []
+            self.catalogo.completar(complete_data)
+            
+            complete_server_memo = {
+                "children": updated_server_memo.get('children', {}),
+                "errors": updated_server_memo.get('errors', []),
+                "htmlHash": updated_server_memo.get('htmlHash'),
+                "data": complete_data,
+                "dataMeta": updated_server_memo.get('dataMeta', []),
+                "checksum": updated_server_memo.get('checksum')
+            }
+            
+            component_data['serverMemo'] = complete_server_memo
+            print(f"🔧 ServerMemo completo actualizado:")
+            print(f"   htmlHash: {complete_server_memo.get('htmlHash', 'N/A')}")
+            print(f"   checksum: {complete_server_memo.get('checksum', 'N/A')[:20]}...")
+            print(f"   children: {len(complete_server_memo.get('children', {}))}")
+            print(f"   errors: {len(complete_server_memo.get('errors', []))}")
+            print(f"   dataMeta: {len(complete_server_memo.get('dataMeta', []))}")
+    
+    @perfilado
     def select_empresa(self, empresa_id, component_data):
         """Seleccionar empresa después de la búsqueda"""
         print(f"✅ Seleccionando empresa con ID: {empresa_id}")
@@ -489,26 +855,25 @@ class SICABot:
             print(f"🌐 Enviando request de selección a: {url}")
             print(f"📦 Payload: {json.dumps(payload, indent=2)}")
             
-            response = self.session.post(url, json=payload, headers=headers)
+            response = self._request('POST', 'selectEmpresa', url, json=payload, headers=headers)
             
             print(f"📊 Status Code: {response.status_code}")
             print(f"📄 Response Headers: {dict(response.headers)}")
             
             if response.status_code != 200:
                 print(f"❌ Error HTTP {response.status_code}: {response.text}")
-                return None
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
             
             try:
-                result = response.json()
-                print(f"✅ Response JSON recibido: {json.dumps(result, indent=2)[:500]}...")
+                result = LivewireResponse(response, conservar_html=self.conservar_html)
+                print(f"✅ Response JSON recibido: {result.resumen()}")
             except json.JSONDecodeError as e:
                 print(f"❌ Error decodificando JSON: {e}")
                 print(f"📄 Response text: {response.text[:500]}...")
                 return None
             
             # Verificar si la selección fue exitosa
-            effects = result.get('effects', {})
-            emits = effects.get('emits', [])
+            emits = result.emits
             
             # Buscar el evento de éxito
             success_found = False
@@ -523,15 +888,17 @@ class SICABot:
                 print("✅ Empresa seleccionada exitosamente")
                 
                 # Actualizar el component_data con la nueva información
-                server_memo = result.get('serverMemo', {})
+                server_memo = result.server_memo
                 if server_memo:
                     component_data['serverMemo'] = server_memo
                 
-                return result
+                return result.to_dict()
             else:
                 print("⚠️ Selección completada pero sin confirmación de éxito")
-                return result
+                return result.to_dict()
             
+        except FALLOS_TRANSITORIOS:
+            raise
         except Exception as e:
             print(f"❌ Error seleccionando empresa: {e}")
             return None
@@ -566,48 +933,6 @@ class SICABot:
             print("❌ No se encontró empresa o error en búsqueda")
             return None
         
-        # Actualizar component_data con los resultados de búsqueda
-        if self.last_search_result:
-            # Es CRÍTICO usar el serverMemo actualizado de la respuesta de búsqueda
-            # para que el checksum y htmlHash sean correctos
-            updated_server_memo = self.last_search_result.get('serverMemo', {})
-            if updated_server_memo:
-                # CRÍTICO: Asegurar que el serverMemo tenga TODOS los campos requeridos
-                # Comparando con la petición exitosa del documento
-                
-                # Obtener data actual y asegurar que tenga todos los campos requeridos
-                current_data = updated_server_memo.get('data', {})
-                
-                # Asegurar que data tenga todos los campos que aparecen en la petición exitosa
-                complete_data = current_data.copy()
-                if 'conductores' not in complete_data:
-                    complete_data['conductores'] = []
-                if 'vehiculos' not in complete_data:
-                    complete_data['vehiculos'] = []
-                if 'rubros_' not in complete_data:
-                    complete_data['rubros_'] = []
-                if 'anios_cuspal' not in complete_data:
-                    complete_data['anios_cuspal'] = ["2021","2022","2023","2024","2025"]
-                if 'meses_cuspal' not in complete_data:
-                    complete_data['meses_cuspal'] = ["Enero","Febrero","Marzo","Abril","Mayo","Junio","Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"]
-                
-                complete_server_memo = {
-                    "children": updated_server_memo.get('children', {}),
-                    "errors": updated_server_memo.get('errors', []),
-                    "htmlHash": updated_server_memo.get('htmlHash'),
-                    "data": complete_data,
-                    "dataMeta": updated_server_memo.get('dataMeta', []),
-                    "checksum": updated_server_memo.get('checksum')
-                }
-                
-                component_data['serverMemo'] = complete_server_memo
-                print(f"🔧 ServerMemo completo actualizado:")
-                print(f"   htmlHash: {complete_server_memo.get('htmlHash', 'N/A')}")
-                print(f"   checksum: {complete_server_memo.get('checksum', 'N/A')[:20]}...")
-                print(f"   children: {len(complete_server_memo.get('children', {}))}")
-                print(f"   errors: {len(complete_server_memo.get('errors', []))}")
-                print(f"   dataMeta: {len(complete_server_memo.get('dataMeta', []))}")
-        
         # Preguntar si desea seleccionar la empresa encontrada
         print(f"\n✅ Empresa encontrada:")
         print(f"   📋 Código: {search_result.get('codigo')}")
@@ -649,9 +974,8 @@ class SICABot:
                 'component_data': component_data
             }
             
-            with open('empresa_seleccionada.json', 'w', encoding='utf-8') as f:
-                json.dump(complete_result, f, indent=2, ensure_ascii=False)
-            print("💾 Resultado completo guardado en 'empresa_seleccionada.json'")
+            self._guardar_artefacto('empresa_seleccionada.json', complete_result, component_data)
+            print("💾 Resultado completo guardado como artefacto 'empresa_seleccionada.json'")
             
             return complete_result
         else:
@@ -685,8 +1009,14 @@ class SICABot:
         
         return empresa
 
-    def search_conductor_by_cedula(self, cedula_conductor, component_data):
-        """Buscar conductor por cédula usando Livewire"""
+    @perfilado
+    def search_conductor_by_cedula(self, cedula_conductor, component_data, solo_lectura=False):
+        """Buscar conductor por cédula usando Livewire (solo_lectura: coalescible, ver _coalescer)"""
+        return self._coalescer('conductor', str(cedula_conductor).strip().upper(), solo_lectura,
+                               self._hedge_busqueda, 'searchConductorCedula', self._search_conductor_by_cedula,
+                               cedula_conductor, component_data)
+    
+    def _search_conductor_by_cedula(self, cedula_conductor, component_data):
         print(f"🔍 Buscando conductor con cédula: {cedula_conductor}")
         
         try:
@@ -716,7 +1046,7 @@ class SICABot:
             print(f"   checksum: {checksum[:20]}...")
             
             # Verificar que la empresa esté seleccionada
-            empresa_seleccionada = server_memo.get('data', {}).get('data', {}).get('THd2VHJ1QzNOWDVoUjlBRGZaSzIrZz09')
+            empresa_seleccionada = server_memo.get('data', {}).get('data', {}).get(CAMPO_EMPRESA_SELECCIONADA)
             if not empresa_seleccionada:
                 print("❌ Error: No hay empresa seleccionada. Debe seleccionar empresa primero.")
                 return None
@@ -737,26 +1067,28 @@ class SICABot:
             # El request exitoso muestra que empresas debe tener la información de la empresa
             empresas_data = server_memo_data.get('empresas', [])
             
+            # Primero usar la empresa registrada en el contexto de este componente
+            empresa_contexto = component_data.get('contexto', {}).get('empresa')
+            if not empresas_data and empresa_contexto:
+                empresas_data = [empresa_contexto]
+            
             # Si empresas está vacío pero tenemos empresa seleccionada, necesitamos reconstruir
             if not empresas_data and empresa_seleccionada:
                 print("⚠️ Array empresas vacío pero empresa seleccionada. Intentando reconstruir...")
-                # Buscar en archivos guardados la información de la empresa
+                # Buscar en los artefactos guardados de este componente la información de la empresa
                 try:
-                    import os
-                    if os.path.exists('empresa_seleccionada.json'):
-                        with open('empresa_seleccionada.json', 'r', encoding='utf-8') as f:
-                            empresa_data = json.load(f)
-                            if 'empresa' in empresa_data:
-                                empresa_info = empresa_data['empresa']
-                                empresas_data = [{
-                                    "id": empresa_info.get('id'),
-                                    "codigo": empresa_info.get('codigo'),
-                                    "rif": empresa_info.get('rif'),
-                                    "razon_social": empresa_info.get('razon_social'),
-                                    "tipo_ente": empresa_info.get('tipo_ente'),
-                                    "nivel": empresa_info.get('nivel')
-                                }]
-                                print(f"✅ Información de empresa reconstruida: {empresa_info.get('razon_social')}")
+                    empresa_data = self._leer_artefacto('empresa_seleccionada.json', component_data)
+                    if empresa_data and 'empresa' in empresa_data:
+                        empresa_info = empresa_data['empresa']
+                        empresas_data = [{
+                            "id": empresa_info.get('id'),
+                            "codigo": empresa_info.get('codigo'),
+                            "rif": empresa_info.get('rif'),
+                            "razon_social": empresa_info.get('razon_social'),
+                            "tipo_ente": empresa_info.get('tipo_ente'),
+                            "nivel": empresa_info.get('nivel')
+                        }]
+                        print(f"✅ Información de empresa reconstruida: {empresa_info.get('razon_social')}")
                 except Exception as e:
                     print(f"⚠️ No se pudo reconstruir información de empresa: {e}")
             
@@ -772,12 +1104,9 @@ class SICABot:
                 complete_data['conductores'] = server_memo_data.get('conductores', [])
             if 'vehiculos' not in complete_data:
                 complete_data['vehiculos'] = server_memo_data.get('vehiculos', [])
-            if 'rubros_' not in complete_data:
-                complete_data['rubros_'] = server_memo_data.get('rubros_', [])
-            if 'anios_cuspal' not in complete_data:
-                complete_data['anios_cuspal'] = ["2021","2022","2023","2024","2025"]
-            if 'meses_cuspal' not in complete_data:
-                complete_data['meses_cuspal'] = ["Enero","Febrero","Marzo","Abril","Mayo","Junio","Julio","Agosto","Septiembre","Octubre","Noviembre","Diciembre"]
+            if 'rubros_' not in complete_data and server_memo_data.get('rubros_'):
+                complete_data['rubros_'] = server_memo_data['rubros_']
+            self.catalogo.completar(complete_data)
             
             print(f"🔧 Estructura serverMemo.data completada:")
             print(f"   empresas: {len(complete_data.get('empresas', []))}")
@@ -835,25 +1164,25 @@ class SICABot:
             print(f"🌐 Enviando request de búsqueda de conductor a: {url}")
             print(f"📦 Payload: {json.dumps(payload, indent=2)}")
             
-            response = self.session.post(url, json=payload, headers=headers)
+            response = self._request('POST', 'searchConductorCedula', url, json=payload, headers=headers)
             
             print(f"📊 Status Code: {response.status_code}")
             print(f"📄 Response Headers: {dict(response.headers)}")
             
             if response.status_code != 200:
                 print(f"❌ Error HTTP {response.status_code}: {response.text}")
-                return None
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
             
             try:
-                result = response.json()
-                print(f"✅ Response JSON recibido: {json.dumps(result, indent=2)[:500]}...")
+                result = LivewireResponse(response, conservar_html=self.conservar_html)
+                print(f"✅ Response JSON recibido: {result.resumen()}")
             except json.JSONDecodeError as e:
                 print(f"❌ Error decodificando JSON: {e}")
                 print(f"📄 Response text: {response.text[:500]}...")
                 return None
             
             # Extraer datos del conductor de la respuesta
-            conductores = result.get('serverMemo', {}).get('data', {}).get('conductores', [])
+            conductores = result.data.get('conductores', [])
             
             if conductores:
                 conductor = conductores[0]  # Tomar el primer conductor encontrado
@@ -865,11 +1194,11 @@ class SICABot:
                 
                 # Actualizar component_data con la nueva información
                 if 'serverMemo' in result:
-                    component_data['serverMemo'] = result['serverMemo']
+                    component_data['serverMemo'] = result.server_memo
+                component_data.setdefault('contexto', {})['conductor'] = conductor
                 
                 # Guardar la información del conductor para referencia
-                with open('conductor_encontrado.json', 'w', encoding='utf-8') as f:
-                    json.dump(conductor, f, indent=2, ensure_ascii=False)
+                self._guardar_artefacto('conductor_encontrado.json', conductor, component_data)
                 print(f"💾 Datos de conductor guardados en 'conductor_encontrado.json'")
                 
                 return conductor
@@ -877,62 +1206,57 @@ class SICABot:
                 print("❌ No se encontró conductor con esa cédula")
                 return None
             
+        except FALLOS_TRANSITORIOS:
+            raise
         except Exception as e:
             print(f"❌ Error buscando conductor: {e}")
             return None
 
+    @perfilado
     def select_conductor(self, conductor_id, component_data):
         """Seleccionar un conductor específico por su ID"""
         print(f"🎯 Seleccionando conductor con ID: {conductor_id}")
         
         try:
-            # Headers específicos para Livewire
+            # Headers específicos para el request
             headers = {
                 'Accept': 'text/html, application/xhtml+xml',
-                'Accept-Encoding': 'gzip, deflate, br, zstd',
-                'Accept-Language': 'es-ES,es;q=0.9',
-                'Connection': 'keep-alive',
                 'Content-Type': 'application/json',
-                'Host': 'sica.sunagro.gob.ve',
-                'Origin': 'https://sica.sunagro.gob.ve',
-                'Referer': 'https://sica.sunagro.gob.ve/despachos/registrar',
-                'Sec-Ch-Ua': '"Not;A=Brand";v="99", "Brave";v="139", "Chromium";v="139"',
-                'Sec-Ch-Ua-Mobile': '?0',
-                'Sec-Ch-Ua-Platform': '"Windows"',
-                'Sec-Fetch-Dest': 'empty',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Site': 'same-origin',
-                'Sec-Gpc': '1',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
-                'X-Csrf-Token': self.csrf_token,
-                'X-Livewire': 'true'
+                'X-Livewire': 'true',
+                'X-CSRF-TOKEN': self.csrf_token,
+                'Referer': f"{self.base_url}/despachos/registrar",
+                'Origin': self.base_url,
             }
             
-            # CONSTRUIR SERVERMEMO COMPLETO SEGÚN EL DOCUMENTO
-            original_server_memo = component_data.get("serverMemo", {})
+            # Verificar que tenemos los datos críticos del component_data
+            server_memo = component_data.get("serverMemo", {})
+            if not server_memo.get("htmlHash") or not server_memo.get("checksum"):
+                print("❌ Error: faltan htmlHash o checksum en serverMemo")
+                return None
+            component_name = component_data.get("fingerprint", {}).get("name", "")
+            if not component_name:
+                print("❌ No se pudo obtener component_name del fingerprint")
+                return None
             
-            # Construir serverMemo COMPLETO con estructura exacta del documento
-            original_data = original_server_memo.get("data", {})
+            original_data = server_memo.get("data", {})
             
             # Construir data COMPLETO con todas las secciones del documento
             # CRÍTICO: Las empresas DEBEN existir para que funcione la selección
             empresas_dinamicas = original_data.get("empresas", [])
             if not empresas_dinamicas:
-                # Si no hay empresas en el contexto, usar la empresa del estado actual del bot
-                if hasattr(self, 'empresa_seleccionada') and self.empresa_seleccionada:
-                    empresas_dinamicas = [self.empresa_seleccionada]
+                # Si no hay empresas en el serverMemo, usar la empresa del contexto del componente
+                empresa_contexto = component_data.get('contexto', {}).get('empresa')
+                if empresa_contexto:
+                    empresas_dinamicas = [empresa_contexto]
                 else:
                     # Fallback: buscar información completa de empresa previamente seleccionada
                     try:
-                        import os
-                        if os.path.exists('empresa_seleccionada.json'):
-                            with open('empresa_seleccionada.json', 'r', encoding='utf-8') as f:
-                                empresa_data = json.load(f)
-                                if 'empresa' in empresa_data:
-                                    empresas_dinamicas = [empresa_data['empresa']]
-                                    print("✅ Empresa recuperada de archivo guardado")
+                        empresa_data = self._leer_artefacto('empresa_seleccionada.json', component_data)
+                        if empresa_data and 'empresa' in empresa_data:
+                            empresas_dinamicas = [empresa_data['empresa']]
+                            print("✅ Empresa recuperada del almacén de artefactos")
                         
-                        # Si no se pudo recuperar del archivo, intentar reconstruir mínimamente
+                        # Si no se pudo recuperar de los artefactos, intentar reconstruir mínimamente
                         if not empresas_dinamicas:
                             data_section = original_data.get("data", {})
                             empresa_id = data_section.get("THd2VHJ1QzNOWDVoUjlBRGZaSzIrZz09", "")
@@ -953,38 +1277,27 @@ class SICABot:
                 "empresas": empresas_dinamicas,  # Empresas dinámicas con fallback inteligente
                 "conductores": original_data.get("conductores", []),  # Usar conductores dinámicos
                 "vehiculos": original_data.get("vehiculos", []),  # Usar vehiculos dinámicos
-                "rubros_": original_data.get("rubros_", []),  # Usar rubros dinámicos
-                "anios_cuspal": original_data.get("anios_cuspal", ["2021", "2022", "2023", "2024", "2025"]),  # Dinámico con fallback
-                "meses_cuspal": original_data.get("meses_cuspal", ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"])  # Dinámico con fallback
             }
+            # rubros_, anios_cuspal y meses_cuspal dinámicos, con el catálogo de la sesión como respaldo
+            complete_data.update({clave: original_data[clave] for clave in CLAVES_CATALOGO if clave in original_data})
+            self.catalogo.completar(complete_data)
             
+            # serverMemo del propio componente: el checksum firma su estado y no es transferible
             complete_server_memo = {
-                "children": {
-                    "l2055706833-0": {"id": "n2S5ZGS8lqe7yGG1IHXD", "tag": "div"},
-                    "l2055706833-1": {"id": "M9IKeJCPxiKwtaJTOnQv", "tag": "div"}
-                },
-                "errors": [],
-                "htmlHash": "859bb9ac",  # Hash exacto del documento
-                "data": complete_data,  # Data COMPLETO con todas las secciones
-                "dataMeta": [],
-                "checksum": "2294cb9befc40c44c863f3cc4694ec453508a98ebc44580e5297413b42bcd423"  # Checksum exacto
+                "children": server_memo.get('children', {}),
+                "errors": server_memo.get('errors', []),
+                "htmlHash": server_memo.get('htmlHash'),
+                "data": complete_data,
+                "dataMeta": server_memo.get('dataMeta', []),
+                "checksum": server_memo.get('checksum')
             }
             
-            print(f"🔧 ServerMemo original checksum: {original_server_memo.get('checksum', 'N/A')}")
-            print(f"🔧 ServerMemo COMPLETO checksum: {complete_server_memo.get('checksum')}")
+            print(f"🔧 ServerMemo checksum: {complete_server_memo['checksum'][:20]}...")
             print(f"🔧 Conductor ID a seleccionar: {conductor_id}")
             
-            # Construir payload con fingerprint y serverMemo EXACTOS del documento
             payload = {
-                "fingerprint": {
-                    "id": "uzayRnVAtIeEl6rcrPxw",  # ID exacto del documento
-                    "name": "eyJpdiI6IkFoWmpPNE9XUEJHWlZlZ3FycVllS3c9PSIsInZhbHVlIjoiTVd2QUVLUjZMNWszNElkbFFWWUxPQXZMNUMyTHdRVCsrSm00akRZVklqbz0iLCJtYWMiOiI5MGJiNDJlNjE1NmM0MGJiMjdjZDc0ZjVlOGZkZWE3MTI2NjJhODljZDRhMDlhYmI1NzIyOWFiOGQ2ZmVlOWY5IiwidGFnIjoiIn0=",
-                    "locale": "es",
-                    "path": "despachos/registrar", 
-                    "method": "GET",
-                    "v": "acj"
-                },
-                "serverMemo": complete_server_memo,  # ServerMemo completo con children y errors
+                "fingerprint": component_data["fingerprint"],
+                "serverMemo": complete_server_memo,
                 "updates": [
                     {
                         "type": "callMethod",
@@ -1000,18 +1313,15 @@ class SICABot:
                 ]
             }
             
-            # Usar component name EXACTO del documento
-            component_name = "eyJpdiI6IkFoWmpPNE9XUEJHWlZlZ3FycVllS3c9PSIsInZhbHVlIjoiTVd2QUVLUjZMNWszNElkbFFWWUxPQXZMNUMyTHdRVCsrSm00akRZVklqbz0iLCJtYWMiOiI5MGJiNDJlNjE1NmM0MGJiMjdjZDc0ZjVlOGZkZWE3MTI2NjJhODljZDRhMDlhYmI1NzIyOWFiOGQ2ZmVlOWY5IiwidGFnIjoiIn0="
-            
-            print(f"🔧 Usando component_name EXACTO del documento: {component_name[:50]}...")
+            print(f"🔧 Usando component_name: {component_name[:50]}...")
             
             # URL del endpoint
             url = f"{self.base_url}/api/app/{component_name}"
             
             print(f"🌐 Enviando request de selección de conductor a: {url}")
-            print(f"📦 Payload de selección EXACTO: {json.dumps(payload, indent=2)}")
+            print(f"📦 Payload de selección: {json.dumps(payload, indent=2)}")
             
-            response = self.session.post(url, json=payload, headers=headers)
+            response = self._request('POST', 'selectConductor', url, json=payload, headers=headers)
             
             print(f"📊 Status Code: {response.status_code}")
             print(f"📄 Response Headers: {dict(response.headers)}")
@@ -1019,22 +1329,20 @@ class SICABot:
             if response.status_code != 200:
                 print(f"❌ Error HTTP {response.status_code}: {response.text}")
                 # Guardar respuesta de error para análisis
-                with open('error_seleccion_conductor.html', 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                print("💾 Respuesta de error guardada en 'error_seleccion_conductor.html'")
-                return None
+                self._guardar_artefacto('error_seleccion_conductor.html', response.text, component_data)
+                print("💾 Respuesta de error guardada como artefacto 'error_seleccion_conductor.html'")
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
             
             try:
-                result = response.json()
-                print(f"✅ Response JSON recibido: {json.dumps(result, indent=2)}")
+                result = LivewireResponse(response, conservar_html=self.conservar_html)
+                print(f"✅ Response JSON recibido: {result.resumen()}")
             except json.JSONDecodeError as e:
                 print(f"❌ Error decodificando JSON: {e}")
                 print(f"📄 Response text: {response.text[:500]}...")
                 return None
             
             # Verificar si la selección fue exitosa
-            effects = result.get('effects', {})
-            emits = effects.get('emits', [])
+            emits = result.emits
             
             # Buscar mensaje de éxito
             success_found = False
@@ -1050,16 +1358,19 @@ class SICABot:
             
             # Actualizar component_data con la nueva información del serverMemo
             if 'serverMemo' in result:
-                component_data['serverMemo'] = result['serverMemo']
+                component_data['serverMemo'] = result.server_memo
                 print("🔄 ServerMemo actualizado con nueva información")
             
+            result = result.to_dict()
+            
             # Guardar respuesta completa para análisis
-            with open('seleccion_conductor_response.json', 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
-            print("💾 Respuesta de selección guardada en 'seleccion_conductor_response.json'")
+            self._guardar_artefacto('seleccion_conductor_response.json', result, component_data)
+            print("💾 Respuesta de selección guardada como artefacto 'seleccion_conductor_response.json'")
             
             return result
             
+        except FALLOS_TRANSITORIOS:
+            raise
         except Exception as e:
             print(f"❌ Error seleccionando conductor: {e}")
             return None
@@ -1074,7 +1385,7 @@ class SICABot:
             return None
         
         server_memo = component_data.get("serverMemo", {})
-        empresa_seleccionada = server_memo.get('data', {}).get('data', {}).get('THd2VHJ1QzNOWDVoUjlBRGZaSzIrZz09')
+        empresa_seleccionada = server_memo.get('data', {}).get('data', {}).get(CAMPO_EMPRESA_SELECCIONADA)
         
         if not empresa_seleccionada:
             print("❌ Error: Debe seleccionar una empresa antes de buscar conductor")
@@ -1089,19 +1400,8 @@ class SICABot:
                 
                 # Validar formato básico de cédula venezolana
                 if cedula_input:
-                    # Permitir formatos como V-12345678, V12345678, 12345678
-                    cedula_clean = cedula_input.upper().replace('-', '').replace(' ', '')
-                    
-                    # Si no tiene letra, agregar V por defecto
-                    if cedula_clean.isdigit():
-                        cedula_formatted = f"V-{cedula_clean}"
-                    elif cedula_clean.startswith(('V', 'E', 'J', 'G', 'P')):
-                        # Formatear con guión si no lo tiene
-                        if '-' not in cedula_input:
-                            cedula_formatted = f"{cedula_clean[0]}-{cedula_clean[1:]}"
-                        else:
-                            cedula_formatted = cedula_input.upper()
-                    else:
+                    cedula_formatted = normalizar_cedula(cedula_input)
+                    if not cedula_formatted:
                         print("❌ Formato de cédula inválido. Use formato: V-12345678")
                         continue
                     
@@ -1146,9 +1446,8 @@ class SICABot:
                                 'estado': 'SELECCIONADO'
                             }
                             
-                            with open('conductor_seleccionado.json', 'w', encoding='utf-8') as f:
-                                json.dump(complete_result, f, indent=2, ensure_ascii=False)
-                            print("💾 Resultado completo guardado en 'conductor_seleccionado.json'")
+                            self._guardar_artefacto('conductor_seleccionado.json', complete_result, component_data)
+                            print("💾 Resultado completo guardado como artefacto 'conductor_seleccionado.json'")
                             
                             return complete_result
                         else:
@@ -1165,9 +1464,8 @@ class SICABot:
                             'estado': 'ENCONTRADO_NO_SELECCIONADO'
                         }
                         
-                        with open('conductor_encontrado.json', 'w', encoding='utf-8') as f:
-                            json.dump(search_result, f, indent=2, ensure_ascii=False)
-                        print("💾 Resultado de búsqueda guardado en 'conductor_encontrado.json'")
+                        self._guardar_artefacto('conductor_encontrado.json', search_result, component_data)
+                        print("💾 Resultado de búsqueda guardado como artefacto 'conductor_encontrado.json'")
                         
                         return search_result
                     else:
@@ -1181,64 +1479,65 @@ class SICABot:
             print("❌ No se encontró conductor o error en búsqueda")
             return None
 
-    def search_vehiculo_por_placa(self, placa, component_data):
-        """Buscar vehículo por placa usando el serverMemo actual"""
+    @perfilado
+    def search_vehiculo_por_placa(self, placa, component_data, solo_lectura=False):
+        """Buscar vehículo por placa usando el serverMemo actual (solo_lectura: coalescible, ver _coalescer)"""
+        return self._coalescer('vehiculo', str(placa).strip().upper(), solo_lectura,
+                               self._hedge_busqueda, 'searchVehiculoPlaca', self._search_vehiculo_por_placa,
+                               placa, component_data)
+    
+    def _search_vehiculo_por_placa(self, placa, component_data):
         print(f"🚗 Buscando vehículo con placa: {placa}")
         
         try:
-            # Headers específicos para Livewire
+            # Headers específicos para el request
             headers = {
                 'Accept': 'text/html, application/xhtml+xml',
-                'Accept-Encoding': 'gzip, deflate, br, zstd',
-                'Accept-Language': 'es-ES,es;q=0.6',
-                'Connection': 'keep-alive',
                 'Content-Type': 'application/json',
-                'Host': 'sica.sunagro.gob.ve',
-                'Origin': 'https://sica.sunagro.gob.ve',
-                'Referer': 'https://sica.sunagro.gob.ve/despachos/registrar',
-                'Sec-Ch-Ua': '"Not;A=Brand";v="99", "Brave";v="139", "Chromium";v="139"',
-                'Sec-Ch-Ua-Mobile': '?0',
-                'Sec-Ch-Ua-Platform': '"Windows"',
-                'Sec-Fetch-Dest': 'empty',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Site': 'same-origin',
-                'Sec-Gpc': '1',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36',
-                'X-Csrf-Token': self.csrf_token,
-                'X-Livewire': 'true'
+                'X-Livewire': 'true',
+                'X-CSRF-TOKEN': self.csrf_token,
+                'Referer': f"{self.base_url}/despachos/registrar",
+                'Origin': self.base_url,
             }
             
-            # Obtener serverMemo actual del component_data
-            original_server_memo = component_data.get("serverMemo", {})
-            original_data = original_server_memo.get("data", {})
+            # Verificar que tenemos los datos críticos del component_data
+            server_memo = component_data.get("serverMemo", {})
+            if not server_memo.get("htmlHash") or not server_memo.get("checksum"):
+                print("❌ Error: faltan htmlHash o checksum en serverMemo")
+                return None
+            component_name = component_data.get("fingerprint", {}).get("name", "")
+            if not component_name:
+                print("❌ No se pudo obtener component_name del fingerprint")
+                return None
+            
+            original_data = server_memo.get("data", {})
             
             # Construir data completo con información de pasos anteriores
             empresas_dinamicas = original_data.get("empresas", [])
+            contexto = component_data.get('contexto', {})
+            if not empresas_dinamicas and contexto.get('empresa'):
+                empresas_dinamicas = [contexto['empresa']]
             if not empresas_dinamicas:
-                # Recuperar empresa de archivo si no está en contexto
+                # Recuperar empresa de los artefactos si no está en contexto
                 try:
-                    import os
-                    if os.path.exists('empresa_seleccionada.json'):
-                        with open('empresa_seleccionada.json', 'r', encoding='utf-8') as f:
-                            empresa_data = json.load(f)
-                            if 'empresa' in empresa_data:
-                                empresas_dinamicas = [empresa_data['empresa']]
-                                print("✅ Empresa recuperada de archivo guardado")
+                    empresa_data = self._leer_artefacto('empresa_seleccionada.json', component_data)
+                    if empresa_data and 'empresa' in empresa_data:
+                        empresas_dinamicas = [empresa_data['empresa']]
+                        print("✅ Empresa recuperada del almacén de artefactos")
                 except Exception as e:
                     print(f"⚠️ Error al recuperar información de empresa: {e}")
             
             # Construir conductores dinámicos
             conductores_dinamicos = original_data.get("conductores", [])
+            if not conductores_dinamicos and contexto.get('conductor'):
+                conductores_dinamicos = [contexto['conductor']]
             if not conductores_dinamicos:
-                # Recuperar conductor de archivo si no está en contexto
+                # Recuperar conductor de los artefactos si no está en contexto
                 try:
-                    import os
-                    if os.path.exists('conductor_seleccionado.json'):
-                        with open('conductor_seleccionado.json', 'r', encoding='utf-8') as f:
-                            conductor_data = json.load(f)
-                            if 'conductor' in conductor_data:
-                                conductores_dinamicos = [conductor_data['conductor']]
-                                print("✅ Conductor recuperado de archivo guardado")
+                    conductor_data = self._leer_artefacto('conductor_seleccionado.json', component_data)
+                    if conductor_data and 'conductor' in conductor_data:
+                        conductores_dinamicos = [conductor_data['conductor']]
+                        print("✅ Conductor recuperado del almacén de artefactos")
                 except Exception as e:
                     print(f"⚠️ Error al recuperar información de conductor: {e}")
             
@@ -1248,42 +1547,25 @@ class SICABot:
                 "empresas": empresas_dinamicas,
                 "conductores": conductores_dinamicos,  # Usar conductores dinámicos recuperados
                 "vehiculos": original_data.get("vehiculos", False),  # Importante: false inicialmente
-                "rubros_": original_data.get("rubros_", []),
-                "anios_cuspal": original_data.get("anios_cuspal", ["2021", "2022", "2023", "2024", "2025"]),
-                "meses_cuspal": original_data.get("meses_cuspal", ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"])
             }
+            complete_data.update({clave: original_data[clave] for clave in CLAVES_CATALOGO if clave in original_data})
+            self.catalogo.completar(complete_data)
             
-            # CRÍTICO: Usar valores exactos del documento de referencia para que el servidor reconozca el request
-            # El problema es que estamos usando component_data dinámico, pero el servidor espera valores específicos
+            # serverMemo del propio componente: el checksum firma su estado y no es transferible
             complete_server_memo = {
-                "children": {
-                    "l2055706833-0": {"id": "xpDRdn5EGdtUFaLbJGFA", "tag": "div"},
-                    "l2055706833-1": {"id": "twiCOztJPCoLTLCdXZC6", "tag": "div"}
-                },
-                "errors": [],
-                "htmlHash": "874c826e",  # Valor exacto del documento
+                "children": server_memo.get('children', {}),
+                "errors": server_memo.get('errors', []),
+                "htmlHash": server_memo.get('htmlHash'),
                 "data": complete_data,
-                "dataMeta": [],
-                "checksum": "037101aa56ea3cff5e7d5be07211c032e62a96ab16c0f044492bbb40d1ab1026"  # Checksum exacto del documento
+                "dataMeta": server_memo.get('dataMeta', []),
+                "checksum": server_memo.get('checksum')
             }
             
-            print(f"🔧 ServerMemo checksum: {complete_server_memo.get('checksum', 'N/A')}")
+            print(f"🔧 ServerMemo checksum: {complete_server_memo['checksum'][:20]}...")
             print(f"🔧 Placa a buscar: {placa}")
             
-            # CRÍTICO: Usar fingerprint exacto del documento de referencia
-            # El problema es que el fingerprint también debe ser exacto
-            exact_fingerprint = {
-                "id": "KHVqzUwh2XF4DDsfeoZ6",
-                "name": "eyJpdiI6IndjOStsenMwMUk1OFZ0YWtYd1JIakE9PSIsInZhbHVlIjoiaUswK1IwVWlXbkZRQUNMc3ZXTElWWncwUlpZQXZ0VTNRbE9JWnFHaFZsWT0iLCJtYWMiOiIyNjFlNGQ1M2I4N2FkN2U4ZjRiNzQyZTM4YWU5ZjdhMGQzNjYxMmY1MWMyMWVjZTM4MzU0MDhmZDE1MTk0ZGI5IiwidGFnIjoiIn0=",
-                "locale": "es",
-                "path": "despachos/registrar",
-                "method": "GET",
-                "v": "acj"
-            }
-            
-            # Construir payload exacto según el documento
             payload = {
-                "fingerprint": exact_fingerprint,
+                "fingerprint": component_data["fingerprint"],
                 "serverMemo": complete_server_memo,
                 "updates": [
                     {
@@ -1305,12 +1587,10 @@ class SICABot:
                 ]
             }
             
-            # Usar component name exacto del documento de referencia
-            component_name = exact_fingerprint["name"]
-            print(f"🔧 Usando component_name EXACTO del documento: {component_name[:50]}...")
+            print(f"🔧 Usando component_name: {component_name[:50]}...")
             
             # URL del request
-            url = f"https://sica.sunagro.gob.ve/api/app/{component_name}"
+            url = f"{self.base_url}/api/app/{component_name}"
             print(f"🌐 Enviando request de búsqueda de vehículo a: {url}")
             
             # Log del payload completo
@@ -1318,25 +1598,27 @@ class SICABot:
             print(json.dumps(payload, indent=2, ensure_ascii=False))
             
             # Realizar request
-            response = self.session.post(url, json=payload, headers=headers)
+            response = self._request('POST', 'searchVehiculoPlaca', url, json=payload, headers=headers)
             
             print(f"📊 Status Code: {response.status_code}")
             print(f"📄 Response Headers: {dict(response.headers)}")
             
             if response.status_code == 200:
                 try:
-                    response_data = response.json()
-                    print(f"✅ Respuesta JSON recibida:")
-                    print(json.dumps(response_data, indent=2, ensure_ascii=False))
+                    livewire_response = LivewireResponse(response, conservar_html=self.conservar_html)
+                    print(f"✅ Respuesta JSON recibida: {livewire_response.resumen()}")
+                    response_data = livewire_response.to_dict()
+                    
+                    # El siguiente paso debe partir del serverMemo que devolvió esta búsqueda
+                    if livewire_response.server_memo:
+                        self._fusionar_server_memo(component_data, livewire_response)
                     
                     # Guardar respuesta completa
-                    with open('busqueda_vehiculo_response.json', 'w', encoding='utf-8') as f:
-                        json.dump(response_data, f, indent=2, ensure_ascii=False)
-                    print("💾 Respuesta de búsqueda guardada en 'busqueda_vehiculo_response.json'")
+                    self._guardar_artefacto('busqueda_vehiculo_response.json', response_data, component_data)
+                    print("💾 Respuesta de búsqueda guardada como artefacto 'busqueda_vehiculo_response.json'")
                     
                     # Extraer vehículos de la respuesta
-                    server_memo = response_data.get('serverMemo', {})
-                    vehiculos_data = server_memo.get('data', {}).get('vehiculos', [])
+                    vehiculos_data = livewire_response.data.get('vehiculos', [])
                     
                     if vehiculos_data and len(vehiculos_data) > 0:
                         vehiculo = vehiculos_data[0]  # Tomar el primer vehículo encontrado
@@ -1364,11 +1646,12 @@ class SICABot:
                 print(response.text[:1000])
                 
                 # Guardar respuesta de error
-                with open('error_busqueda_vehiculo.html', 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                print("💾 Respuesta de error guardada en 'error_busqueda_vehiculo.html'")
-                return None
+                self._guardar_artefacto('error_busqueda_vehiculo.html', response.text, component_data)
+                print("💾 Respuesta de error guardada como artefacto 'error_busqueda_vehiculo.html'")
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
                 
+        except FALLOS_TRANSITORIOS:
+            raise
         except Exception as e:
             print(f"❌ Error buscando vehículo: {e}")
             return None
@@ -1385,8 +1668,8 @@ class SICABot:
             return None
         
         server_memo = component_data.get("serverMemo", {})
-        empresa_seleccionada = server_memo.get('data', {}).get('data', {}).get('THd2VHJ1QzNOWDVoUjlBRGZaSzIrZz09')
-        conductor_seleccionado = server_memo.get('data', {}).get('data', {}).get('MkNMdzRrM0JqeUUxUm1lWUJoNmFZQT09')
+        empresa_seleccionada = server_memo.get('data', {}).get('data', {}).get(CAMPO_EMPRESA_SELECCIONADA)
+        conductor_seleccionado = server_memo.get('data', {}).get('data', {}).get(CAMPO_CONDUCTOR_SELECCIONADO)
         
         if not empresa_seleccionada:
             print("❌ Error: Debe seleccionar una empresa antes de buscar vehículo")
@@ -1406,8 +1689,7 @@ class SICABot:
                 
                 if placa_input:
                     # Validar formato básico de placa (6-9 caracteres alfanuméricos)
-                    import re
-                    if re.match(r'^[A-Z0-9]{6,9}$', placa_input):
+                    if normalizar_placa(placa_input):
                         print(f"🔧 Placa formateada: {placa_input}")
                         break
                     else:
@@ -1443,9 +1725,8 @@ class SICABot:
                 'estado': 'ENCONTRADO'
             }
             
-            with open('vehiculo_encontrado.json', 'w', encoding='utf-8') as f:
-                json.dump(complete_result, f, indent=2, ensure_ascii=False)
-            print("💾 Resultado completo guardado en 'vehiculo_encontrado.json'")
+            self._guardar_artefacto('vehiculo_encontrado.json', complete_result, component_data)
+            print("💾 Resultado completo guardado como artefacto 'vehiculo_encontrado.json'")
             
             print(f"\n🎉 Proceso de vehículo exitoso:")
             print(f"   🆔 ID: {vehiculo.get('id')}")
@@ -1465,10 +1746,369 @@ class SICABot:
     def proceso_busqueda_conductor(self, component_data):
         """Proceso de solo búsqueda de conductor (sin selección automática)"""
         return self.proceso_busqueda_y_seleccion_conductor(component_data)
+    
+    def abrir_componentes_registrar(self, cantidad):
+        """Abrir varios componentes de registro independientes bajo la misma sesión.
+
+        Cada GET de /despachos/registrar genera un wire:id, fingerprint y serverMemo
+        propios, por lo que los componentes pueden usarse en paralelo.
+        """
+        print(f"🔄 Abriendo {cantidad} componentes de registro...")
+        with ThreadPoolExecutor(max_workers=cantidad) as executor:
+            componentes = list(executor.map(lambda _: self.navigate_to_despachos_registrar(), range(cantidad)))
         
+        componentes = [c for c in componentes if c]
+        print(f"✅ {len(componentes)}/{cantidad} componentes de registro abiertos")
+        return componentes
     
-    def make_livewire_request(self, component_name, method_params="cTZRVCtiWmwrSVlGMGpOa3FMZFBjQT09"):
-        """Realizar request de Livewire al sistema"""
+    @perfilado
+    def ejecutar_despacho(self, component_data, codigo_empresa, cedula, placa):
+        """Ejecutar empresa → conductor → vehículo sobre un componente, sin prompts"""
+        with self._despacho_en_curso(), self.medir_trafico() as trafico:
+            resultado = self._ejecutar_despacho(component_data, codigo_empresa, cedula, placa)
+        resultado['trafico'] = trafico
+        return self._marcar_interrumpido(resultado)
+    
+    @contextmanager
+    def _despacho_en_curso(self):
+        with self._en_curso_cond:
+            self._en_curso += 1
+        try:
+            yield
+        finally:
+            with self._en_curso_cond:
+                self._en_curso -= 1
+                self._en_curso_cond.notify_all()
+    
+    def _marcar_interrumpido(self, resultado):
+        """Un despacho cortado por el plazo de drenaje no es un 'no encontrado': queda para reanudar"""
+        if resultado.get('estado') != 'COMPLETADO' and self.apagado.vencido():
+            resultado['estado'] = 'INTERRUMPIDO'
+        return resultado
+    
+    def drenar(self, plazo=None):
+        """Esperar a que terminen los despachos en curso de este bot (por defecto, el plazo del apagado)"""
+        if plazo is None:
+            plazo = self.apagado.restante()
+            if plazo is None:
+                plazo = self.apagado.plazo
+        limite = time.monotonic() + plazo
+        with self._en_curso_cond:
+            if self._en_curso:
+                print(f"⏳ Esperando {self._en_curso} despachos en curso (hasta {plazo:.0f}s)...")
+            while self._en_curso:
+                restante = limite - time.monotonic()
+                if restante <= 0 or self.apagado.forzado:
+                    print(f"⚠️ {self._en_curso} despachos siguen en curso al cerrar")
+                    return False
+                self._en_curso_cond.wait(min(restante, 0.5))
+        return True
+    
+    def _ejecutar_despacho(self, component_data, codigo_empresa, cedula, placa):
+        resultado = {
+            'codigo_empresa': codigo_empresa,
+            'cedula': cedula,
+            'placa': placa,
+            'component_id': component_data.get('fingerprint', {}).get('id'),
+            'component_data': component_data,
+        }
+        
+        try:
+            return self._pasos_despacho(resultado, component_data, codigo_empresa, cedula, placa)
+        except FALLOS_TRANSITORIOS as e:
+            print(f"❌ Despacho cortado por un fallo transitorio: {e}")
+            resultado['estado'] = self._estado_fallo(e)
+            resultado['error'] = str(e)
+            return resultado
+    
+    @staticmethod
+    def _estado_fallo(error):
+        """Estado reintentable de un despacho cortado por un fallo (nunca un 'no encontrado')"""
+        if isinstance(error, DrenajeVencido):
+            return 'INTERRUMPIDO'
+        if isinstance(error, (requests.Timeout, TimeoutError)):
+            return 'TIMEOUT'
+        return 'ERROR'
+    
+    def _pasos_despacho(self, resultado, component_data, codigo_empresa, cedula, placa):
+        empresa = self.search_empresa_by_codigo(codigo_empresa, component_data)
+        if not empresa:
+            resultado['estado'] = 'EMPRESA_NO_ENCONTRADA'
+            return resultado
+        resultado['empresa'] = empresa
+        
+        if self.select_empresa(empresa.get('id'), component_data) is None:
+            resultado['estado'] = 'ERROR_SELECCION_EMPRESA'
+            return resultado
+        
+        conductor = self.search_conductor_by_cedula(cedula, component_data)
+        if not conductor:
+            resultado['estado'] = 'CONDUCTOR_NO_ENCONTRADO'
+            return resultado
+        resultado['conductor'] = conductor
+        
+        if self.select_conductor(conductor.get('id'), component_data) is None:
+            resultado['estado'] = 'ERROR_SELECCION_CONDUCTOR'
+            return resultado
+        
+        vehiculo_result = self.search_vehiculo_por_placa(placa, component_data)
+        if not vehiculo_result:
+            resultado['estado'] = 'VEHICULO_NO_ENCONTRADO'
+            return resultado
+        resultado['vehiculo'] = vehiculo_result.get('vehiculo')
+        
+        resultado['estado'] = 'COMPLETADO'
+        return resultado
+    
+    def ejecutar_despachos_concurrentes(self, despachos, max_componentes=3, checkpoint=None):
+        """Ejecutar varios despachos en paralelo, cada uno en su propio componente de registro.
+
+        despachos: lista de dicts con codigo_empresa, cedula y placa.
+        checkpoint: CheckpointLote opcional. Los despachos que ya terminaron en una corrida
+        anterior no se repiten y los interrumpidos se retoman sobre su último serverMemo.
+        Con el apagado solicitado no se inicia ningún despacho más: quedan PENDIENTE.
+        """
+        print(f"🚀 Ejecutando {len(despachos)} despachos con hasta {max_componentes} componentes en paralelo...")
+        claves = claves_lote(despachos)
+        
+        def ejecutar(component_data, despacho):
+            return self.ejecutar_despacho(component_data, despacho['codigo_empresa'],
+                                          despacho['cedula'], despacho['placa'])
+        
+        def trabajar(indice):
+            despacho, clave = despachos[indice], claves[indice]
+            previo = checkpoint.previo(clave) if checkpoint else None
+            if previo and previo['estado'] in ESTADOS_DEFINITIVOS:
+                return dict(previo['resultado'], reanudado=True)
+            if self.apagado.solicitado:
+                if previo:
+                    # Sigue pendiente tal como quedó (con su serverMemo) en el checkpoint
+                    return previo['resultado']
+                resultado = dict(despacho, estado='PENDIENTE')
+            else:
+                resultado = None
+                if previo and previo.get('component_data'):
+                    print(f"♻️ Retomando despacho {clave} desde su último serverMemo ({previo['estado']})")
+                    resultado = ejecutar(previo['component_data'], despacho)
+                # Sin componente guardado, o si con el guardado quedó en un estado reintentable: uno
+                # nuevo (un "no encontrado" es definitivo y no se repite)
+                if resultado is None or resultado['estado'] not in (*ESTADOS_DEFINITIVOS, 'INTERRUMPIDO'):
+                    component_data = self.navigate_to_despachos_registrar()
+                    if component_data:
+                        resultado = ejecutar(component_data, despacho)
+                    elif resultado is None:
+                        resultado = dict(despacho, estado='ERROR_COMPONENTE')
+            if checkpoint:
+                checkpoint.registrar(clave, despacho, resultado)
+            return resultado
+        
+        with ThreadPoolExecutor(max_workers=max_componentes) as executor:
+            resultados = list(executor.map(trabajar, range(len(despachos))))
+        
+        completados = sum(1 for r in resultados if r.get('estado') == 'COMPLETADO')
+        print(f"🏁 Despachos completados: {completados}/{len(despachos)}")
+        sin_terminar = sum(1 for r in resultados if r.get('estado') in ('PENDIENTE', 'INTERRUMPIDO'))
+        if sin_terminar:
+            print(f"⏸️ {sin_terminar} despachos sin terminar por el apagado"
+                  + (f"; quedan en el checkpoint '{checkpoint.ruta}'" if checkpoint else ""))
+        return resultados
+    
+    def _fusionar_server_memo(self, component_data, result):
+        """Aplicar el serverMemo de una respuesta: Livewire solo devuelve las propiedades modificadas"""
+        memo = copy.deepcopy(component_data.get('serverMemo', {}))
+        for clave, valor in result.server_memo.items():
+            if clave == 'data':
+                memo.setdefault('data', {}).update(valor)
+                if any(c in valor for c in CLAVES_CATALOGO):
+                    self.catalogo.actualizar(memo['data'])
+            else:
+                memo[clave] = valor
+        component_data['serverMemo'] = memo
+    
+    def _rpc_registro(self, component_data, updates, operacion):
+        """Un POST Livewire con varios updates sobre el componente de registro; actualiza su serverMemo.
+
+        Un status distinto de 200 se propaga como requests.HTTPError.
+        """
+        headers = {
+            'Accept': 'text/html, application/xhtml+xml',
+            'Content-Type': 'application/json',
+            'X-Livewire': 'true',
+            'X-CSRF-TOKEN': self.csrf_token,
+            'Referer': f"{self.base_url}/despachos/registrar",
+            'Origin': self.base_url,
+        }
+        payload = {
+            "fingerprint": component_data["fingerprint"],
+            "serverMemo": component_data["serverMemo"],
+            "updates": updates,
+        }
+        url = f"{self.base_url}/api/app/{component_data['fingerprint']['name']}"
+        response = self._request('POST', operacion, url, json=payload, headers=headers)
+        if response.status_code != 200:
+            print(f"❌ Error HTTP {response.status_code} en {operacion}")
+            self._guardar_artefacto(f"error_{operacion}.html", response.text, component_data)
+            raise requests.HTTPError(f"HTTP {response.status_code} en {operacion}", response=response)
+        result = LivewireResponse(response, conservar_html=self.conservar_html)
+        self._fusionar_server_memo(component_data, result)
+        return result
+    
+    @staticmethod
+    def _sync_input(campo, valor):
+        return {"type": "syncInput", "payload": {"id": uuid.uuid4().hex[:4], "name": campo, "value": str(valor)}}
+    
+    @staticmethod
+    def _call_method(metodo, *params):
+        return {"type": "callMethod", "payload": {"id": uuid.uuid4().hex[:4], "method": metodo, "params": list(params)}}
+    
+    @staticmethod
+    def _bytes_payload(component_data, updates):
+        """Tamaño del cuerpo JSON de un POST Livewire con estos updates sobre el componente"""
+        payload = {"fingerprint": component_data["fingerprint"], "serverMemo": component_data["serverMemo"],
+                   "updates": updates}
+        return len(json.dumps(payload).encode('utf-8'))
+    
+    def _campos_formulario(self, despacho):
+        """syncInput/callMethod de los campos que no dependen del servidor, un paso por campo.
+
+        Rubros: nombres de producto mapeados con el catálogo de la sesión (o IDs), cada uno
+        con su "Agregar". Mes y año CUSPAL: validados contra el catálogo. ValueError si un
+        rubro no está en el catálogo o un valor CUSPAL no es válido, antes de enviar nada.
+        """
+        pasos = [[self._sync_input(CAMPOS_REGISTRO[campo], despacho[campo])]
+                 for campo in ('facturas', 'observacion') if despacho.get(campo)]
+        pasos += [[self._sync_input(campo, valor)] for campo, valor in (despacho.get('campos') or {}).items()]
+        
+        # Un rubro es un nombre de producto, o su ID tal cual como int o {'id': ...}
+        rubros = despacho.get('rubros') or []
+        ids = self.catalogo.mapear([r for r in rubros if isinstance(r, str)])
+        faltantes = [nombre for nombre, rubro_id in ids.items() if rubro_id is None]
+        if faltantes:
+            raise ValueError(f"Rubros sin coincidencia en el catálogo: {', '.join(faltantes)}")
+        for rubro in rubros:
+            rubro_id = ids[rubro] if isinstance(rubro, str) else rubro['id'] if isinstance(rubro, dict) else rubro
+            pasos.append([self._sync_input(CAMPO_RUBRO, rubro_id),
+                          self._call_method('__method', METODO_AGREGAR_RUBRO)])
+        
+        nombres = dict(CAMPOS_CUSPAL, **(despacho.get('campos_cuspal') or {}))
+        for campo, validos in (('mes_cuspal', self.catalogo.meses_cuspal), ('anio_cuspal', self.catalogo.anios_cuspal)):
+            valor = despacho.get(campo)
+            if valor is None:
+                continue
+            if str(valor) not in validos:
+                raise ValueError(f"{campo} inválido: {valor} (use {', '.join(validos)})")
+            if not nombres.get(campo):
+                raise ValueError(f"Falta el nombre del campo {campo}: páselo en 'campos_cuspal'")
+            pasos.append([self._sync_input(nombres[campo], valor)])
+        return pasos
+    
+    @perfilado
+    def llenar_formulario(self, component_data, despacho):
+        """Llenar el formulario de registro completo en 3 round trips en lugar de uno por paso.
+
+        despacho: codigo_empresa, cedula y placa, más campos libres opcionales
+        (facturas, observacion, rubros, mes_cuspal, anio_cuspal y 'campos':
+        {'data.<campo>': valor} para el resto). Cada POST agrupa la selección que
+        depende del resultado anterior con los syncInput y la búsqueda siguientes; los
+        campos libres viajan en el último, después de todas las selecciones, para que
+        ninguna los reinicie. resultado['comparacion'] trae los requests y bytes
+        enviados contra los que habría hecho el flujo de un POST por paso.
+        """
+        cedula = normalizar_cedula(despacho['cedula']) or despacho['cedula']
+        placa = normalizar_placa(despacho['placa']) or despacho['placa']
+        resultado = {
+            'codigo_empresa': despacho['codigo_empresa'],
+            'cedula': cedula,
+            'placa': placa,
+            'component_id': component_data.get('fingerprint', {}).get('id'),
+            'component_data': component_data,
+        }
+        try:
+            libres = self._campos_formulario(despacho)
+        except ValueError as e:
+            print(f"❌ {e}")
+            resultado['estado'] = 'DATOS_INVALIDOS'
+            resultado['error'] = str(e)
+            return resultado
+        por_pasos = {'requests': 0, 'bytes_enviados': 0}
+        
+        def enviar(pasos, operacion):
+            # El flujo documentado hace un POST por paso, cada uno con el serverMemo completo
+            por_pasos['requests'] += len(pasos)
+            por_pasos['bytes_enviados'] += sum(self._bytes_payload(component_data, paso) for paso in pasos)
+            return self._rpc_registro(component_data, [update for paso in pasos for update in paso], operacion)
+        
+        with self._despacho_en_curso(), self.medir_trafico() as trafico:
+            resultado['trafico'] = trafico
+            try:
+                # 1) código de empresa + búsqueda
+                result = enviar([[
+                    self._sync_input(CAMPOS_REGISTRO['codigo_empresa'], despacho['codigo_empresa']),
+                    self._call_method('searchEmpresaCodigo'),
+                ]], 'searchEmpresaCodigo')
+                empresas = result.data.get('empresas') if result else None
+                if not empresas:
+                    resultado['estado'] = 'EMPRESA_NO_ENCONTRADA'
+                    return resultado
+                empresa = resultado['empresa'] = empresas[0]
+                component_data.setdefault('contexto', {})['empresa'] = empresa
+                
+                # 2) seleccionar empresa + cédula + búsqueda de conductor
+                result = enviar([
+                    [self._call_method('__method', METODOS_SELECCION['empresa'], empresa['id'])],
+                    [self._sync_input(CAMPOS_REGISTRO['cedula'], cedula), self._call_method('searchConductorCedula')],
+                ], 'selectEmpresa')
+                datos = component_data['serverMemo'].get('data', {}).get('data', {})
+                if result is None or datos.get(CAMPO_EMPRESA_SELECCIONADA) != empresa['id']:
+                    resultado['estado'] = 'ERROR_SELECCION_EMPRESA'
+                    return resultado
+                conductores = result.data.get('conductores')
+                if not conductores:
+                    resultado['estado'] = 'CONDUCTOR_NO_ENCONTRADO'
+                    return resultado
+                conductor = resultado['conductor'] = conductores[0]
+                component_data['contexto']['conductor'] = conductor
+                
+                # 3) seleccionar conductor + placa + campos libres, rubros y CUSPAL + búsqueda de vehículo
+                result = enviar([
+                    [self._call_method('__method', METODOS_SELECCION['conductor'], conductor['id'])],
+                    *libres,
+                    [self._sync_input(CAMPOS_REGISTRO['placa'], placa), self._call_method('searchVehiculoPlaca')],
+                ], 'selectConductor')
+                datos = component_data['serverMemo'].get('data', {}).get('data', {})
+                if result is None or datos.get(CAMPO_CONDUCTOR_SELECCIONADO) != conductor['id']:
+                    resultado['estado'] = 'ERROR_SELECCION_CONDUCTOR'
+                    return resultado
+                vehiculos = result.data.get('vehiculos')
+                if not vehiculos:
+                    resultado['estado'] = 'VEHICULO_NO_ENCONTRADO'
+                    return resultado
+                resultado['vehiculo'] = vehiculos[0]
+                resultado['estado'] = 'COMPLETADO'
+                return resultado
+            except Exception as e:
+                print(f"❌ Error llenando formulario: {e}")
+                resultado['estado'] = self._estado_fallo(e)
+                resultado['error'] = str(e)
+                return self._marcar_interrumpido(resultado)
+            finally:
+                resultado['comparacion'] = {
+                    'por_pasos': por_pasos,
+                    'agrupado': {'requests': trafico['requests'], 'bytes_enviados': trafico['bytes_enviados']},
+                }
+                print(f"📊 Formulario: {trafico['requests']} requests, {trafico['bytes_enviados']} bytes enviados, "
+                      f"{trafico['bytes_recibidos']} bytes recibidos ({resultado.get('estado')})")
+                print(f"📊 Con un POST por paso: {por_pasos['requests']} requests, "
+                      f"{por_pasos['bytes_enviados']} bytes enviados")
+        
+    
+    def make_livewire_request(self, component_name, method_params="cTZRVCtiWmwrSVlGMGpOa3FMZFBjQT09",
+                              conservar_html=None):
+        """Realizar request de Livewire al sistema.
+
+        conservar_html: retener effects.html de esta respuesta aunque el bot no lo haga
+        (None = según self.conservar_html).
+        """
         print("🔄 Realizando request de Livewire...")
         
         try:
@@ -1519,19 +2159,47 @@ class SICABot:
             # URL del endpoint
             url = f"{self.base_url}/api/app/{component_name}"
             
-            response = self.session.post(url, json=payload, headers=headers)
+            response = self._request('POST', 'despachos_tabla', url, json=payload, headers=headers)
             response.raise_for_status()
             
             print("✅ Request de Livewire exitoso")
-            return response.json()
+            if conservar_html is None:
+                conservar_html = self.conservar_html
+            return LivewireResponse(response, conservar_html=conservar_html)
             
         except Exception as e:
             print(f"❌ Error en request de Livewire: {e}")
             return None
     
+    def _precalentar_conexiones(self, conexiones=1):
+        """Abrir de antemano las conexiones extra que usará la fase concurrente del login"""
+        adaptador = self.session.get_adapter(self.base_url)
+        # Los adaptadores de cassette no abren conexiones; con proxy, el pool sería otro
+        if not hasattr(adaptador, 'precalentar') or self.session.proxies or (
+                self.session.trust_env and requests.utils.get_environ_proxies(self.base_url)):
+            return 0
+        return adaptador.precalentar(self.base_url, conexiones, verify=self.session.verify)
+    
+    def _cronometrar(self, fn):
+        inicio = time.monotonic()
+        resultado = fn()
+        return resultado, time.monotonic() - inicio
+    
+    @perfilado
     def full_login_process(self, username, password):
-        """Proceso completo de login"""
+        """Proceso completo de login.
+
+        Los pasos 1-4 son secuenciales; mientras corren se abre en segundo plano una
+        conexión extra. Con el dispositivo vinculado, los tokens de /despachos (paso 5) y
+        la página /despachos/registrar (con el catálogo) se piden en paralelo, y el
+        componente queda para el primer navigate_to_despachos_registrar.
+        """
         print("🚀 Iniciando proceso completo de login...")
+        inicio = time.monotonic()
+        with self._precarga_lock:
+            self._precarga = None
+        if self.precargar_registrar:
+            threading.Thread(target=self._precalentar_conexiones, daemon=True).start()
         
         # Paso 1: Obtener página de login
         if not self.step1_get_login_page():
@@ -1549,21 +2217,51 @@ class SICABot:
         # Paso 4: Verificar dispositivo
         if not self.step4_verify_device():
             return False
+        login = time.monotonic() - inicio
         
-        # Paso 5: Obtener tokens del dashboard
-        tokens = self.step5_get_dashboard_tokens()
+        # Paso 5: Obtener tokens del dashboard (en paralelo con la página de registro)
+        registrar = None
+        if self.precargar_registrar:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                futuro = executor.submit(self._cronometrar, self._cargar_registrar)
+                tokens, segundos_tokens = self._cronometrar(self.step5_get_dashboard_tokens)
+                component_data, registrar = futuro.result()
+            if tokens and component_data:
+                with self._precarga_lock:
+                    self._precarga = (component_data, time.monotonic())
+        else:
+            tokens, segundos_tokens = self._cronometrar(self.step5_get_dashboard_tokens)
         if not tokens:
             return False
         
         # Marcar como logueado exitosamente
         self.logged_in = True
+        total = time.monotonic() - inicio
+        self.calentamiento = {
+            'login': round(login, 3),
+            'tokens': round(segundos_tokens, 3),
+            'registrar': round(registrar, 3) if registrar is not None else None,
+            'total': round(total, 3),
+        }
+        if registrar is not None:
+            print(f"⏱️ Sesión lista en {total:.2f}s (login {login:.2f}s, tokens {segundos_tokens:.2f}s "
+                  f"∥ registrar {registrar:.2f}s)")
+        else:
+            print(f"⏱️ Sesión lista en {total:.2f}s (login {login:.2f}s, tokens {segundos_tokens:.2f}s)")
         print("🎉 ¡Proceso de login completado exitosamente!")
         return tokens
     
     def logout(self):
         """Cerrar sesión en el sistema SICA"""
+        with self._precarga_lock:
+            self._precarga = None
         if not self.logged_in:
             return True
+        
+        if self.sesion_prestada:
+            print("ℹ️ Sesión prestada por el broker: se devuelve sin cerrar sesión")
+            self.logged_in = False
+            return True
             
         print("🔄 Cerrando sesión...")
         
@@ -1572,7 +2270,7 @@ class SICABot:
             if not self.csrf_token:
                 # Intentar obtener token de cualquier página
                 try:
-                    response = self.session.get(f"{self.base_url}/despachos")
+                    response = self._request('GET', 'despachos', f"{self.base_url}/despachos")
                     self.csrf_token = self.get_csrf_token(response.text)
                 except:
                     pass
@@ -1583,7 +2281,8 @@ class SICABot:
             }
             
             # Realizar logout
-            response = self.session.post(
+            response = self._request(
+                'POST', 'logout',
                 f"{self.base_url}/logout",
                 data=logout_data,
                 allow_redirects=True
@@ -1604,28 +2303,49 @@ class SICABot:
             self.logged_in = False
             return False
     
+    def grabar_trafico(self, ruta):
+        """Grabar todos los intercambios HTTP de esta sesión en un cassette"""
+        self.cassette = grabar(self.session, ruta)
+        return self.cassette
+    
+    def reproducir_trafico(self, ruta, tiempo='rapido'):
+        """Servir los requests de esta sesión desde un cassette, sin tocar SICA"""
+        self.cassette = reproducir(self.session, ruta, tiempo)
+        return self.cassette
+    
     def cleanup(self):
-        """Función de limpieza automática"""
+        """Función de limpieza automática: drena los despachos en curso antes del logout"""
         if self.logged_in:
+            self.drenar()
             print("\n🧹 Limpieza automática: cerrando sesión...")
             self.logout()
+        if self.cassette is not None:
+            self.cassette.close()
+            self.cassette = None
+        if self.perfilador is not None:
+            self.perfilador.volcar(self.artefactos)
+        # Los artefactos se escriben en segundo plano: no perder los pendientes al salir
+        self.artefactos.vaciar(timeout=5)
     
     def __enter__(self):
         """Context manager entry"""
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        """Context manager exit - garantiza logout"""
+        """Context manager exit - garantiza logout, después de drenar lo que siga en curso"""
+        if self.logged_in:
+            self.drenar()
         self.logout()
         if exc_type:
             print(f"❌ Error durante ejecución: {exc_val}")
         return False  # No suprimir excepciones
     
-    def get_despachos_data(self):
-        """Obtener datos de despachos usando el request que analizamos"""
+    @perfilado
+    def get_despachos_data(self, conservar_html=None):
+        """Obtener datos de despachos usando el request que analizamos (conservar_html=True para parsear la tabla)"""
         component_name = "eyJpdiI6InJoYmlpMDJOeFBOVS9qaENVMGZ5cUE9PSIsInZhbHVlIjoiZWxDTkd6WkkxN1NxeDByN29IMEJzbTJIaGNBNzlZQ2cvdWVsVG10Ykk5dz0iLCJtYWMiOiI5NjVjMWE2ZmU2MmRhOWMwNmRiNjliNjI1YzFhOTA3MjJkOWE0YjMxY2UwYzMwNTZkM2Q5Y2RjNTRkNWMyMzM4IiwidGFnIjoiIn0="
         
-        return self.make_livewire_request(component_name)
+        return self.make_livewire_request(component_name, conservar_html=conservar_html)
 
 
 def main():
@@ -1637,11 +2357,22 @@ def main():
     # Usar context manager para garantizar logout automático
     try:
         with SICABot() as bot:
-            # Credenciales por defecto
-            username = "CBULLON"
-            password = "Cb17985096."
+            # Grabación / reproducción de tráfico opcional
+            if os.environ.get('SICA_REPRODUCIR'):
+                bot.reproducir_trafico(os.environ['SICA_REPRODUCIR'], os.environ.get('SICA_REPRODUCIR_TIEMPO', 'rapido'))
+            elif os.environ.get('SICA_GRABAR'):
+                bot.grabar_trafico(os.environ['SICA_GRABAR'])
+            
+            # Credenciales: solo del pool configurado en el entorno (nunca en el código ni en la salida)
+            cuentas = PoolCuentas.desde_entorno()
+            cuenta = cuentas.elegir() if cuentas else None
+            if cuenta is None:
+                print("❌ Defina SICA_CUENTAS (usuario:clave,...), SICA_USUARIO y SICA_PASSWORD, "
+                      "o SICA_CUENTAS_ARCHIVO con un archivo de cuentas")
+                return
+            bot.cuenta = cuenta
+            username, password = cuenta.usuario, cuenta.password
             print(f"👤 Usuario: {username}")
-            print(f"🔒 Contraseña: {password}")
             
             # Proceso completo de login
             tokens = bot.full_login_process(username, password)
@@ -1658,10 +2389,9 @@ def main():
                 if despachos_data:
                     print("✅ Datos obtenidos exitosamente")
                     
-                    # Guardar respuesta en archivo
-                    with open('despachos_response.json', 'w', encoding='utf-8') as f:
-                        json.dump(despachos_data, f, indent=2, ensure_ascii=False)
-                    print("💾 Respuesta guardada en 'despachos_response.json'")
+                    # Guardar respuesta en el almacén de artefactos
+                    bot._guardar_artefacto('despachos_response.json', despachos_data.to_dict())
+                    print("💾 Respuesta guardada como artefacto 'despachos_response.json'")
                 else:
                     print("❌ Error obteniendo datos de despachos")
                 
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+SICA Broker - Proceso local dueño de las sesiones autenticadas
+Presta (arrienda) los cookie jars logueados a procesos worker con expiración,
+conteo de referencias y chequeos de salud, evitando una tormenta de logins
+"""
+
+import argparse
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from sica_bot import SICABot
+
+# Tamaño máximo de un mensaje JSON (los arrendamientos llevan el cookie jar completo)
+MAX_MENSAJE = 1024 * 1024
+
+
+def directorio_socket():
+    """Directorio privado (0700) del usuario para el socket del broker.
+
+    Usa $XDG_RUNTIME_DIR si existe y si no el directorio temporal; rechaza un directorio
+    ajeno o accesible por otros usuarios en lugar de escuchar dentro de él.
+    """
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    directorio = os.path.join(base, f'sica-{os.getuid()}')
+    try:
+        os.mkdir(directorio, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directorio)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{directorio} no es un directorio propio")
+    if info.st_mode & 0o077:
+        raise PermissionError(f"{directorio} es accesible por otros usuarios (use chmod 700)")
+    return directorio
+
+
+def direccion_por_defecto():
+    """Ruta del socket Unix del broker dentro de directorio_socket()"""
+    return os.path.join(directorio_socket(), 'broker.sock')
+
+
+def clave_broker():
+    """Clave compartida broker/workers desde SICA_BROKER_KEY; no hay valor por defecto"""
+    clave = os.environ.get('SICA_BROKER_KEY')
+    if not clave:
+        raise RuntimeError("Defina SICA_BROKER_KEY (la misma clave en el broker y en los workers)")
+    return clave.encode('utf-8')
+
+
+def enviar_json(conexion, datos):
+    """Enviar un mensaje como JSON (nunca pickle: el receptor no ejecuta nada al decodificarlo)"""
+    conexion.send_bytes(json.dumps(datos, default=str).encode('utf-8'))
+
+
+def recibir_json(conexion):
+    return json.loads(conexion.recv_bytes(MAX_MENSAJE).decode('utf-8'))
+
+
+def exportar_cookies(session):
+    """Serializar el cookie jar de una sesión requests"""
+    return [
+        {'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path,
+         'secure': c.secure, 'expires': c.expires}
+        for c in session.cookies
+    ]
+
+
+def importar_cookies(session, cookies):
+    """Cargar cookies serializadas con exportar_cookies en una sesión requests"""
+    for c in cookies:
+        session.cookies.set(c['name'], c['value'], domain=c['domain'], path=c['path'],
+                            secure=c['secure'], expires=c['expires'])
+
+
+class _SesionBroker:
+    """Sesión logueada propiedad del broker"""
+
+    def __init__(self, bot):
+        self.id = uuid.uuid4().hex[:8]
+        self.bot = bot
+        self.referencias = 0
+        self.creada = time.time()
+        self.ultimo_uso = time.time()
+        self.ultimo_chequeo = time.time()
+        self.sana = True
+
+
+class BrokerSesiones:
+    """Dueño de las sesiones SICA logueadas; las presta a workers por un tiempo limitado"""
+
+    def __init__(self, username, password, max_sesiones=2, max_referencias=4,
+                 duracion_arrendamiento=300, edad_maxima=3600, intervalo_chequeo=120):
+        self.username = username
+        self.password = password
+        self.max_sesiones = max_sesiones
+        # Workers que pueden compartir una misma sesión a la vez
+        self.max_referencias = max_referencias
+        self.duracion_arrendamiento = duracion_arrendamiento
+        # Sesiones más viejas que esto se renuevan cuando quedan sin arrendamientos
+        self.edad_maxima = edad_maxima
+        self.intervalo_chequeo = intervalo_chequeo
+
+        self.sesiones = []
+        # Logins en curso: cuentan contra max_sesiones mientras se hacen fuera del lock
+        self.logins_pendientes = 0
+        self.arrendamientos = {}
+        self._lock = threading.Condition()
+        self._login_lock = threading.Lock()
+        self._detener = threading.Event()
+        self.stats = {'logins': 0, 'arrendamientos': 0, 'expirados': 0, 'renovaciones': 0, 'logouts': 0}
+
+    # --- Ciclo de vida de sesiones ---
+
+    def _login(self):
+        """Crear una sesión nueva; los logins se serializan para no saturar /vincular_dispositivo"""
+        with self._login_lock:
+            bot = SICABot(conservar_html=False)
+            self.stats['logins'] += 1
+            if not bot.full_login_process(self.username, self.password):
+                return None
+            return _SesionBroker(bot)
+
+    def _cerrar(self, sesion):
+        try:
+            sesion.bot.logout()
+            self.stats['logouts'] += 1
+        except Exception as e:
+            print(f"⚠️ Error cerrando sesión {sesion.id}: {e}")
+
+    def _sesion_disponible(self):
+        """Sesión sana con menos referencias, o None si todas están llenas"""
+        candidatas = [s for s in self.sesiones if s.sana and s.referencias < self.max_referencias]
+        return min(candidatas, key=lambda s: s.referencias) if candidatas else None
+
+    # --- Arrendamientos ---
+
+    def arrendar(self, worker, duracion=None, timeout=60):
+        """Prestar una sesión al worker; crea una nueva solo si todas están llenas"""
+        duracion = duracion or self.duracion_arrendamiento
+        limite = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                sesion = self._sesion_disponible()
+                if sesion is not None:
+                    break
+                if len(self.sesiones) + self.logins_pendientes < self.max_sesiones:
+                    # Cupo reservado antes de soltar el lock: el login va fuera del lock
+                    self.logins_pendientes += 1
+                    self._lock.release()
+                    try:
+                        nueva = self._login()
+                    finally:
+                        self._lock.acquire()
+                        self.logins_pendientes -= 1
+                        self._lock.notify_all()
+                    if nueva is not None:
+                        self.sesiones.append(nueva)
+                        continue
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return {'error': 'sin_sesiones'}
+                self._lock.wait(min(restante, 5))
+
+            sesion.referencias += 1
+            sesion.ultimo_uso = time.time()
+            arrendamiento = {
+                'lease_id': uuid.uuid4().hex,
+                'sesion_id': sesion.id,
+                'worker': worker,
+                'expira': time.time() + duracion,
+            }
+            self.arrendamientos[arrendamiento['lease_id']] = arrendamiento
+            self.stats['arrendamientos'] += 1
+            return dict(arrendamiento,
+                        cookies=exportar_cookies(sesion.bot.session),
+                        csrf_token=sesion.bot.csrf_token,
+                        base_url=sesion.bot.base_url)
+
+    def renovar(self, lease_id, duracion=None):
+        """Extender la expiración de un arrendamiento vigente"""
+        with self._lock:
+            arrendamiento = self.arrendamientos.get(lease_id)
+            if not arrendamiento:
+                return {'error': 'arrendamiento_desconocido'}
+            arrendamiento['expira'] = time.time() + (duracion or self.duracion_arrendamiento)
+            self.stats['renovaciones'] += 1
+            return {'lease_id': lease_id, 'expira': arrendamiento['expira']}
+
+    def liberar(self, lease_id, sana=True):
+        """Devolver una sesión; sana=False pide al broker revalidarla"""
+        with self._lock:
+            arrendamiento = self.arrendamientos.pop(lease_id, None)
+            if not arrendamiento:
+                return {'error': 'arrendamiento_desconocido'}
+            sesion = self._buscar(arrendamiento['sesion_id'])
+            if sesion:
+                sesion.referencias -= 1
+                sesion.ultimo_uso = time.time()
+                if not sana:
+                    sesion.sana = False
+            self._lock.notify_all()
+            return {'ok': True}
+
+    def _buscar(self, sesion_id):
+        for sesion in self.sesiones:
+            if sesion.id == sesion_id:
+                return sesion
+        return None
+
+    # --- Mantenimiento ---
+
+    def _sesion_valida(self, sesion):
+        """Chequeo de salud: /despachos no debe redirigir al login"""
+        try:
+            response = sesion.bot._request('GET', 'despachos', f"{sesion.bot.base_url}/despachos", timeout=30)
+            return response.status_code == 200 and '/login' not in response.url
+        except Exception:
+            return False
+
+    def mantenimiento(self):
+        """Expirar arrendamientos vencidos, chequear salud y renovar sesiones viejas"""
+        ahora = time.time()
+        with self._lock:
+            for lease_id, arrendamiento in list(self.arrendamientos.items()):
+                if arrendamiento['expira'] < ahora:
+                    print(f"⌛ Arrendamiento de worker {arrendamiento['worker']} expirado")
+                    self.arrendamientos.pop(lease_id)
+                    sesion = self._buscar(arrendamiento['sesion_id'])
+                    if sesion:
+                        sesion.referencias -= 1
+                    self.stats['expirados'] += 1
+            libres = [s for s in self.sesiones if s.referencias == 0]
+
+        for sesion in libres:
+            retirar = False
+            if ahora - sesion.creada > self.edad_maxima:
+                print(f"🔄 Sesión {sesion.id} alcanzó su edad máxima, renovando")
+                retirar = True
+            elif not sesion.sana or ahora - sesion.ultimo_chequeo > self.intervalo_chequeo:
+                sesion.ultimo_chequeo = ahora
+                sesion.sana = self._sesion_valida(sesion)
+                retirar = not sesion.sana
+                if retirar:
+                    print(f"⚠️ Sesión {sesion.id} no pasó el chequeo de salud")
+
+            if retirar:
+                with self._lock:
+                    # Solo retirar si sigue sin arrendamientos
+                    if sesion.referencias != 0:
+                        continue
+                    self.sesiones.remove(sesion)
+                self._cerrar(sesion)
+
+        with self._lock:
+            self._lock.notify_all()
+
+    def estado(self):
+        with self._lock:
+            return {
+                'sesiones': [{'id': s.id, 'referencias': s.referencias, 'sana': s.sana,
+                              'edad': time.time() - s.creada} for s in self.sesiones],
+                'arrendamientos': len(self.arrendamientos),
+                'logins_pendientes': self.logins_pendientes,
+                'stats': dict(self.stats),
+            }
+
+    def cerrar(self):
+        """Cerrar todas las sesiones del broker"""
+        self._detener.set()
+        with self._lock:
+            sesiones, self.sesiones = self.sesiones, []
+            self.arrendamientos.clear()
+        for sesion in sesiones:
+            self._cerrar(sesion)
+
+    # --- Servidor ---
+
+    def _atender(self, conexion):
+        try:
+            while not self._detener.is_set():
+                try:
+                    mensaje = recibir_json(conexion)
+                except EOFError:
+                    break
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ Mensaje inválido de un worker: {e}")
+                    break
+                op = mensaje.get('op') if isinstance(mensaje, dict) else None
+                if op == 'arrendar':
+                    respuesta = self.arrendar(mensaje.get('worker'), mensaje.get('duracion'))
+                elif op == 'renovar':
+                    respuesta = self.renovar(mensaje['lease_id'], mensaje.get('duracion'))
+                elif op == 'liberar':
+                    respuesta = self.liberar(mensaje['lease_id'], mensaje.get('sana', True))
+                elif op == 'estado':
+                    respuesta = self.estado()
+                else:
+                    respuesta = {'error': f'operacion_desconocida: {op}'}
+                enviar_json(conexion, respuesta)
+        finally:
+            conexion.close()
+
+    def _bucle_mantenimiento(self, intervalo):
+        while not self._detener.wait(intervalo):
+            try:
+                self.mantenimiento()
+            except Exception as e:
+                print(f"⚠️ Error en mantenimiento del broker: {e}")
+
+    def servir(self, direccion=None, authkey=None, intervalo_mantenimiento=15):
+        """Atender workers hasta Ctrl-C; authkey por defecto sale de SICA_BROKER_KEY"""
+        direccion = direccion or direccion_por_defecto()
+        authkey = authkey or clave_broker()
+        if isinstance(direccion, str) and os.path.exists(direccion):
+            os.unlink(direccion)
+        listener = Listener(direccion, authkey=authkey)
+        threading.Thread(target=self._bucle_mantenimiento, args=(intervalo_mantenimiento,), daemon=True).start()
+        print(f"🌐 Broker de sesiones escuchando en {direccion}")
+        try:
+            while not self._detener.is_set():
+                try:
+                    conexion = listener.accept()
+                except (AuthenticationError, EOFError, ConnectionError) as e:
+                    print(f"⚠️ Conexión rechazada: {e or 'clave incorrecta'}")
+                    continue
+                threading.Thread(target=self._atender, args=(conexion,), daemon=True).start()
+        except KeyboardInterrupt:
+            print("\n⚠️ Deteniendo broker...")
+        finally:
+            listener.close()
+            self.cerrar()
+
+
+class ArrendamientoSesion:
+    """Sesión prestada por el broker; usar como context manager para devolverla siempre"""
+
+    def __init__(self, cliente, datos):
+        self.cliente = cliente
+        self.lease_id = datos['lease_id']
+        self.expira = datos['expira']
+        self.sana = True
+
+        # Bot con la sesión del broker: nunca hace logout por su cuenta
+        self.bot = SICABot(conservar_html=False)
+        self.bot.base_url = datos['base_url']
+        importar_cookies(self.bot.session, datos['cookies'])
+        self.bot.csrf_token = datos['csrf_token']
+        self.bot.logged_in = True
+        self.bot.sesion_prestada = True
+
+    def renovar(self, duracion=None):
+        respuesta = self.cliente._llamar({'op': 'renovar', 'lease_id': self.lease_id, 'duracion': duracion})
+        self.expira = respuesta.get('expira', self.expira)
+        return respuesta
+
+    def marcar_no_sana(self):
+        """Avisar al broker que la sesión parece caída (p. ej. redirecciones al login)"""
+        self.sana = False
+
+    def liberar(self):
+        return self.cliente._llamar({'op': 'liberar', 'lease_id': self.lease_id, 'sana': self.sana})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.liberar()
+        return False
+
+
+class ClienteBroker:
+    """Cliente usado por los procesos worker para arrendar sesiones"""
+
+    def __init__(self, direccion=None, authkey=None):
+        self.direccion = direccion or direccion_por_defecto()
+        self.authkey = authkey or clave_broker()
+        self._lock = threading.Lock()
+        self._conexion = None
+
+    def _llamar(self, mensaje):
+        with self._lock:
+            if self._conexion is None:
+                self._conexion = Client(self.direccion, authkey=self.authkey)
+            enviar_json(self._conexion, mensaje)
+            return recibir_json(self._conexion)
+
+    def arrendar(self, duracion=None):
+        """Pedir una sesión logueada al broker"""
+        respuesta = self._llamar({'op': 'arrendar', 'worker': os.getpid(), 'duracion': duracion})
+        if 'error' in respuesta:
+            raise RuntimeError(f"Broker sin sesión disponible: {respuesta['error']}")
+        return ArrendamientoSesion(self, respuesta)
+
+    def estado(self):
+        return self._llamar({'op': 'estado'})
+
+    def cerrar(self):
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+
+def main():
+    """Arrancar el broker con credenciales de SICA_USUARIO / SICA_PASSWORD y clave SICA_BROKER_KEY"""
+    parser = argparse.ArgumentParser(description="Broker de sesiones SICA")
+    parser.add_argument('--direccion', help="Ruta del socket Unix (por defecto en un directorio 0700 del usuario)")
+    parser.add_argument('--max-sesiones', type=int, default=2)
+    parser.add_argument('--max-referencias', type=int, default=4)
+    args = parser.parse_args()
+
+    username = os.environ.get('SICA_USUARIO')
+    password = os.environ.get('SICA_PASSWORD')
+    if not username or not password:
+        print("❌ Defina SICA_USUARIO y SICA_PASSWORD en el entorno")
+        return 1
+
+    try:
+        authkey = clave_broker()
+        direccion = args.direccion or direccion_por_defecto()
+    except (RuntimeError, PermissionError) as e:
+        print(f"❌ {e}")
+        return 1
+    broker = BrokerSesiones(username, password, max_sesiones=args.max_sesiones,
+                            max_referencias=args.max_referencias)
+    broker.servir(direccion, authkey=authkey)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
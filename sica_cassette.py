@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+SICA Cassette - Grabación y reproducción de todo el tráfico HTTP de un SICABot
+Cada intercambio request/response se guarda en un cassette comprimido e indexado
+(zip con un índice), con cookies y credenciales redactadas
+"""
+
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+import zipfile
+from collections import defaultdict, deque
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+REDACTADO = '[REDACTADO]'
+
+# Headers que nunca se guardan en claro
+HEADERS_SENSIBLES = {'cookie', 'set-cookie', 'x-csrf-token', 'x-xsrf-token', 'authorization'}
+
+# Campos de formulario con credenciales o tokens
+CAMPOS_SENSIBLES = {'password', '_token', 'name', 'codigo'}
+
+# Atributo con el valor de un token dentro de un tag (value= del input, content= del meta)
+_VALOR_TOKEN = re.compile(rb'(\b(?:value|content)\s*=\s*)(["\'])[^"\']*\2')
+
+
+def _redactar_tag(coincidencia):
+    """Redactar el valor del token en un tag, esté antes o después del name="""
+    return _VALOR_TOKEN.sub(rb'\1\2' + REDACTADO.encode() + rb'\2', coincidencia.group(0))
+
+
+# Tokens CSRF incrustados en el HTML de las respuestas (el token del formulario, el meta
+# csrf-token y el que Livewire deja en un script)
+PATRONES_HTML = [
+    (re.compile(rb'<(?:input|meta)\b[^>]*\bname\s*=\s*["\'](?:_token|csrf-token)["\'][^>]*>', re.IGNORECASE),
+     _redactar_tag),
+    (re.compile(rb'(window\.livewire_token\s*=\s*)(["\'])[^"\']*\2'), rb'\1\2' + REDACTADO.encode() + rb'\2'),
+]
+
+
+def _redactar_headers(headers):
+    return {k: (REDACTADO if k.lower() in HEADERS_SENSIBLES else v) for k, v in headers.items()}
+
+
+def _redactar_cuerpo_request(body, content_type):
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if 'application/x-www-form-urlencoded' in (content_type or ''):
+        campos = [(k, REDACTADO if k in CAMPOS_SENSIBLES else v)
+                  for k, v in parse_qsl(body.decode('utf-8'), keep_blank_values=True)]
+        return urlencode(campos).encode('utf-8')
+    return body
+
+
+def _redactar_cuerpo_response(content):
+    for patron, reemplazo in PATRONES_HTML:
+        content = patron.sub(reemplazo, content)
+    return content
+
+
+def _codificar(datos):
+    return base64.b64encode(datos).decode('ascii') if datos is not None else None
+
+
+def _decodificar(texto):
+    return base64.b64decode(texto) if texto is not None else None
+
+
+class AdaptadorGrabacion(HTTPAdapter):
+    """HTTPAdapter que envía normalmente y guarda cada intercambio en el cassette"""
+
+    def __init__(self, ruta, **kwargs):
+        super().__init__(**kwargs)
+        self.ruta = ruta
+        self._zip = zipfile.ZipFile(ruta, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._indice = []
+        self._lock = threading.Lock()
+        self._inicio = time.monotonic()
+
+    def send(self, request, **kwargs):
+        inicio = time.monotonic()
+        response = super().send(request, **kwargs)
+        duracion = time.monotonic() - inicio
+        content = response.content  # cuerpo ya descomprimido por urllib3
+
+        with self._lock:
+            n = len(self._indice)
+            intercambio = {
+                'request': {
+                    'method': request.method,
+                    'url': request.url,
+                    'headers': _redactar_headers(request.headers),
+                    'body': _codificar(_redactar_cuerpo_request(request.body, request.headers.get('Content-Type'))),
+                },
+                'response': {
+                    'status': response.status_code,
+                    'reason': response.reason,
+                    'url': response.url,
+                    'headers': _redactar_headers(response.headers),
+                    'body': _codificar(_redactar_cuerpo_response(content)),
+                },
+                'duracion': duracion,
+                'desfase': inicio - self._inicio,
+            }
+            nombre = f"{n:06d}.json"
+            self._zip.writestr(nombre, json.dumps(intercambio, ensure_ascii=False))
+            self._indice.append({
+                'n': n,
+                'archivo': nombre,
+                'method': request.method,
+                'url': request.url,
+                'status': response.status_code,
+                'bytes': len(content),
+                'duracion': duracion,
+                'desfase': intercambio['desfase'],
+            })
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.writestr('indice.json', json.dumps(self._indice, ensure_ascii=False, indent=1))
+                self._zip.close()
+                self._zip = None
+                print(f"💾 Cassette guardado en '{self.ruta}' ({len(self._indice)} intercambios)")
+        super().close()
+
+
+class CassetteNoCoincide(Exception):
+    """El cassette no tiene un intercambio grabado para el request"""
+
+
+class AdaptadorReproduccion(HTTPAdapter):
+    """HTTPAdapter que responde desde un cassette sin tocar la red.
+
+    Los requests se emparejan por (method, url) en el orden grabado.
+    tiempo='original' respeta la duración grabada; tiempo='rapido' responde de inmediato.
+    """
+
+    def __init__(self, ruta, tiempo='rapido', **kwargs):
+        super().__init__(**kwargs)
+        self.ruta = ruta
+        self.tiempo = tiempo
+        self._lock = threading.Lock()
+        self._pendientes = defaultdict(deque)
+        with zipfile.ZipFile(ruta) as z:
+            indice = json.loads(z.read('indice.json'))
+            for entrada in indice:
+                intercambio = json.loads(z.read(entrada['archivo']))
+                self._pendientes[(entrada['method'], entrada['url'])].append(intercambio)
+        self.total = len(indice)
+        self.servidos = 0
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            cola = self._pendientes.get((request.method, request.url))
+            if not cola:
+                raise CassetteNoCoincide(f"Sin intercambio grabado para {request.method} {request.url}")
+            intercambio = cola.popleft()
+            self.servidos += 1
+
+        if self.tiempo == 'original':
+            time.sleep(intercambio['duracion'])
+
+        grabada = intercambio['response']
+        response = Response()
+        response.status_code = grabada['status']
+        response.reason = grabada['reason']
+        response.url = grabada['url']
+        response.request = request
+        response.encoding = None
+        response._content = _decodificar(grabada['body']) or b''
+        # El cuerpo se grabó descomprimido
+        headers = {k: v for k, v in grabada['headers'].items()
+                   if k.lower() not in ('content-encoding', 'transfer-encoding', 'set-cookie')}
+        headers['Content-Length'] = str(len(response._content))
+        response.headers = CaseInsensitiveDict(headers)
+        response.elapsed = timedelta(seconds=intercambio['duracion'])
+        response.connection = self
+        return response
+
+    def restantes(self):
+        with self._lock:
+            return sum(len(cola) for cola in self._pendientes.values())
+
+
+def grabar(session, ruta):
+    """Montar la grabación en una sesión requests; cerrar el adaptador al terminar"""
+    adaptador = AdaptadorGrabacion(ruta)
+    session.mount('https://', adaptador)
+    session.mount('http://', adaptador)
+    print(f"⏺️ Grabando tráfico HTTP en '{ruta}'")
+    return adaptador
+
+
+def reproducir(session, ruta, tiempo='rapido'):
+    """Montar la reproducción de un cassette en una sesión requests"""
+    adaptador = AdaptadorReproduccion(ruta, tiempo=tiempo)
+    session.mount('https://', adaptador)
+    session.mount('http://', adaptador)
+    print(f"▶️ Reproduciendo '{ruta}' ({adaptador.total} intercambios, tiempo {tiempo})")
+    return adaptador
+
+
+def main():
+    """Mostrar el índice de un cassette"""
+    parser = argparse.ArgumentParser(description="Inspeccionar cassettes de tráfico SICA")
+    parser.add_argument('cassette')
+    args = parser.parse_args()
+
+    with zipfile.ZipFile(args.cassette) as z:
+        indice = json.loads(z.read('indice.json'))
+    total_bytes = sum(e['bytes'] for e in indice)
+    total_tiempo = sum(e['duracion'] for e in indice)
+    for e in indice:
+        print(f"{e['n']:4d} {e['desfase']:8.2f}s {e['method']:4s} {e['status']} "
+              f"{e['bytes']:8d}B {e['duracion'] * 1000:8.1f}ms {e['url'][:90]}")
+    print(f"📊 {len(indice)} intercambios, {total_bytes} bytes, {total_tiempo:.2f}s en red")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+SICA Catálogo - Rubros, años y meses CUSPAL del componente de registro
+Se cargan una vez por sesión desde el serverMemo de /despachos/registrar y se indexan
+en memoria para mapear nombres de productos (del ERP) a rubros sin round trips
+"""
+
+import bisect
+import hashlib
+import json
+import threading
+import unicodedata
+
+# Valores por defecto mientras el servidor no haya enviado los suyos
+ANIOS_CUSPAL_POR_DEFECTO = ["2021", "2022", "2023", "2024", "2025"]
+MESES_CUSPAL_POR_DEFECTO = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+                            "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+CLAVES_CATALOGO = ('rubros_', 'anios_cuspal', 'meses_cuspal')
+
+# Campos donde puede venir el nombre de un rubro
+CAMPOS_NOMBRE = ('nombre', 'descripcion', 'rubro', 'name')
+
+
+def normalizar_nombre(texto):
+    """Mayúsculas, sin acentos y con espacios colapsados: 'Café  molido' -> 'CAFE MOLIDO'"""
+    if texto is None:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.upper().split())
+
+
+def _nombre_rubro(rubro):
+    if isinstance(rubro, dict):
+        for campo in CAMPOS_NOMBRE:
+            if rubro.get(campo):
+                return str(rubro[campo])
+        return None
+    return str(rubro)
+
+
+def _id_rubro(rubro):
+    if isinstance(rubro, dict):
+        return rubro.get('id')
+    return rubro
+
+
+class CatalogoRubros:
+    """Catálogo indexado de rubros (exacto, sin acentos y por prefijo) más años y meses CUSPAL"""
+
+    def __init__(self):
+        self.rubros = []
+        self.anios_cuspal = list(ANIOS_CUSPAL_POR_DEFECTO)
+        self.meses_cuspal = list(MESES_CUSPAL_POR_DEFECTO)
+        self.version = None
+        self._exacto = {}
+        self._normalizado = {}
+        self._claves_ordenadas = []
+        self._lock = threading.Lock()
+        self.stats = {'cargas': 0, 'sin_cambios': 0, 'consultas': 0, 'aciertos': 0}
+
+    @property
+    def cargado(self):
+        return self.version is not None
+
+    def actualizar(self, data):
+        """Cargar el catálogo desde serverMemo.data; solo reindexa si el contenido cambió"""
+        if not data or not any(clave in data for clave in CLAVES_CATALOGO):
+            return False
+        contenido = {clave: data.get(clave) for clave in CLAVES_CATALOGO}
+        version = hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            if version == self.version:
+                self.stats['sin_cambios'] += 1
+                return False
+            rubros = contenido['rubros_'] or []
+            exacto, normalizado = {}, {}
+            for rubro in rubros:
+                nombre = _nombre_rubro(rubro)
+                if not nombre:
+                    continue
+                exacto.setdefault(nombre, rubro)
+                normalizado.setdefault(normalizar_nombre(nombre), rubro)
+            self.rubros = list(rubros)
+            if contenido['anios_cuspal']:
+                self.anios_cuspal = list(contenido['anios_cuspal'])
+            if contenido['meses_cuspal']:
+                self.meses_cuspal = list(contenido['meses_cuspal'])
+            self._exacto = exacto
+            self._normalizado = normalizado
+            self._claves_ordenadas = sorted(normalizado)
+            self.version = version
+            self.stats['cargas'] += 1
+        print(f"📚 Catálogo cargado: {len(rubros)} rubros, {len(self.anios_cuspal)} años, "
+              f"{len(self.meses_cuspal)} meses")
+        return True
+
+    def completar(self, data):
+        """Agregar a un serverMemo.data las claves de catálogo que le falten (retorna el mismo dict)"""
+        with self._lock:
+            data.setdefault('rubros_', list(self.rubros))
+            data.setdefault('anios_cuspal', list(self.anios_cuspal))
+            data.setdefault('meses_cuspal', list(self.meses_cuspal))
+        return data
+
+    def buscar(self, nombre):
+        """Rubro para un nombre de producto: exacto, luego sin acentos/mayúsculas, luego por prefijo único"""
+        with self._lock:
+            self.stats['consultas'] += 1
+            rubro = self._exacto.get(nombre)
+            if rubro is None:
+                clave = normalizar_nombre(nombre)
+                rubro = self._normalizado.get(clave)
+                if rubro is None and clave:
+                    rubro = self._por_prefijo(clave)
+            if rubro is not None:
+                self.stats['aciertos'] += 1
+            return rubro
+
+    def _por_prefijo(self, prefijo):
+        """Único rubro cuyo nombre normalizado empieza por el prefijo (ambiguo o ninguno: None)"""
+        claves = self._claves_ordenadas
+        inicio = bisect.bisect_left(claves, prefijo)
+        fin = bisect.bisect_left(claves, prefijo + '\uffff', inicio)
+        if fin - inicio == 1:
+            return self._normalizado[claves[inicio]]
+        return None
+
+    def candidatos(self, prefijo, limite=10):
+        """Rubros cuyo nombre normalizado empieza por el prefijo (para sugerencias)"""
+        prefijo = normalizar_nombre(prefijo)
+        with self._lock:
+            claves = self._claves_ordenadas
+            inicio = bisect.bisect_left(claves, prefijo)
+            resultado = []
+            for clave in claves[inicio:inicio + limite]:
+                if not clave.startswith(prefijo):
+                    break
+                resultado.append(self._normalizado[clave])
+            return resultado
+
+    def mapear(self, nombres):
+        """Mapear un lote de nombres de productos a IDs de rubro (None si no hay coincidencia)"""
+        resultado = {}
+        for nombre in nombres:
+            rubro = self.buscar(nombre)
+            resultado[nombre] = _id_rubro(rubro) if rubro is not None else None
+        return resultado
+
+    def metricas(self):
+        with self._lock:
+            return dict(self.stats, rubros=len(self.rubros), version=self.version[:12] if self.version else None)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+SICA CLI - Punto de entrada de línea de comandos con subcomandos
+login-check, despachos export, lookup, batch y daemon. El módulo solo importa la
+biblioteca estándar liviana: requests, bs4 y sica_bot se cargan dentro del subcomando
+que los necesita, así que `sica --help` y los errores de argumentos arrancan rápido
+"""
+
+import argparse
+import os
+import sys
+from contextlib import contextmanager, redirect_stdout
+
+# Archivo de cuentas por defecto si el entorno no define credenciales
+ARCHIVO_CUENTAS_POR_DEFECTO = os.path.join(os.path.expanduser('~'), '.sica', 'cuentas.json')
+
+VARIABLES_CREDENCIALES = ('SICA_CUENTAS_ARCHIVO', 'SICA_CUENTAS', 'SICA_USUARIO')
+
+# Códigos de salida para los hooks del ERP
+SALIDA_OK = 0
+SALIDA_ERROR = 1
+SALIDA_NO_ENCONTRADO = 3
+SALIDA_INTERRUMPIDO = 4
+
+
+def configurar_cuentas(ruta=None):
+    """Fijar SICA_CUENTAS_ARCHIVO desde --cuentas o, sin credenciales en el entorno, ~/.sica/cuentas.json"""
+    if ruta is None:
+        if any(os.environ.get(v) for v in VARIABLES_CREDENCIALES):
+            return
+        if not os.path.exists(ARCHIVO_CUENTAS_POR_DEFECTO):
+            return
+        ruta = ARCHIVO_CUENTAS_POR_DEFECTO
+    if os.name == 'posix' and os.stat(ruta).st_mode & 0o077:
+        print(f"⚠️ {ruta} es legible por otros usuarios; use chmod 600", file=sys.stderr)
+    os.environ['SICA_CUENTAS_ARCHIVO'] = ruta
+
+
+@contextmanager
+def _bot_logueado(args, precargar_registrar=False):
+    """SICABot logueado con una cuenta del pool (None si no hay credenciales o falla el login)"""
+    from sica_bot import SICABot
+    from sica_cuentas import PoolCuentas
+
+    cuentas = PoolCuentas.desde_entorno()
+    if cuentas is None:
+        print("❌ Defina SICA_CUENTAS (usuario:clave,...), SICA_USUARIO y SICA_PASSWORD, "
+              f"o un archivo de cuentas con --cuentas / {ARCHIVO_CUENTAS_POR_DEFECTO}")
+        yield None
+        return
+    with SICABot(conservar_html=False, precargar_registrar=precargar_registrar) as bot:
+        if args.reproducir:
+            bot.reproducir_trafico(args.reproducir)
+        elif args.grabar:
+            bot.grabar_trafico(args.grabar)
+        if not cuentas.login(bot):
+            yield None
+            return
+        yield bot
+
+
+def _escribir_json(args, datos):
+    """Resultado a --salida o al stdout original (el de los mensajes puede estar redirigido)"""
+    import json
+    texto = json.dumps(datos, ensure_ascii=False, indent=2, default=str)
+    if args.salida and args.salida != '-':
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+        print(f"💾 Resultado guardado en '{args.salida}'")
+    else:
+        args.stdout.write(texto + '\n')
+        args.stdout.flush()
+
+
+# --- Subcomandos ---
+
+def cmd_login_check(args):
+    with _bot_logueado(args) as bot:
+        if bot is None:
+            return SALIDA_ERROR
+        print(f"✅ Login correcto con la cuenta {bot.cuenta.usuario}")
+        return SALIDA_OK
+
+
+def cmd_despachos_export(args):
+    with _bot_logueado(args) as bot:
+        if bot is None:
+            return SALIDA_ERROR
+        despachos = bot.get_despachos_data()
+        if despachos is None:
+            return SALIDA_ERROR
+        _escribir_json(args, despachos.to_dict())
+        return SALIDA_OK
+
+
+def cmd_lookup(args):
+    from sica_bot import FALLOS_TRANSITORIOS, normalizar_cedula, normalizar_placa
+
+    valor = args.valor
+    if args.tipo == 'cedula':
+        valor = normalizar_cedula(valor)
+    elif args.tipo == 'placa':
+        valor = normalizar_placa(valor)
+    if valor is None:
+        print(f"❌ {args.tipo} inválida: {args.valor}")
+        return SALIDA_ERROR
+
+    with _bot_logueado(args, precargar_registrar=True) as bot:
+        if bot is None:
+            return SALIDA_ERROR
+        component_data = bot.navigate_to_despachos_registrar()
+        if not component_data:
+            return SALIDA_ERROR
+        try:
+            if args.tipo != 'empresa':
+                empresa = bot.search_empresa_by_codigo(args.empresa, component_data)
+                if not empresa or bot.select_empresa(empresa.get('id'), component_data) is None:
+                    print(f"❌ No se pudo seleccionar la empresa {args.empresa}")
+                    return SALIDA_ERROR
+
+            if args.tipo == 'empresa':
+                registro = bot.search_empresa_by_codigo(valor, component_data)
+            elif args.tipo == 'cedula':
+                registro = bot.search_conductor_by_cedula(valor, component_data)
+            else:
+                vehiculo_result = bot.search_vehiculo_por_placa(valor, component_data)
+                registro = vehiculo_result.get('vehiculo') if vehiculo_result else None
+        except FALLOS_TRANSITORIOS as e:
+            # Timeout o error del servidor: no se sabe si existe, no es un "no encontrado"
+            print(f"❌ La consulta falló: {e}")
+            return SALIDA_ERROR
+
+        _escribir_json(args, {'tipo': args.tipo, 'valor': valor,
+                              'estado': 'ENCONTRADO' if registro else 'NO_ENCONTRADO',
+                              'registro': registro})
+        return SALIDA_OK if registro else SALIDA_NO_ENCONTRADO
+
+
+def leer_despachos(ruta):
+    """Despachos de un JSON (lista de objetos) o CSV con columnas codigo_empresa, cedula y placa"""
+    if ruta.lower().endswith('.json'):
+        import json
+        with open(ruta, 'r', encoding='utf-8') as f:
+            filas = json.load(f)
+    else:
+        import csv
+        with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+            filas = [{(k or '').strip().lower(): (v or '').strip() for k, v in fila.items()}
+                     for fila in csv.DictReader(f)]
+    campos = ('codigo_empresa', 'cedula', 'placa')
+    despachos = []
+    for numero, fila in enumerate(filas, 1):
+        faltantes = [c for c in campos if not fila.get(c)]
+        if faltantes:
+            raise ValueError(f"Despacho {numero} sin {', '.join(faltantes)}")
+        despachos.append({c: fila[c] for c in campos})
+    return despachos
+
+
+def cmd_batch(args):
+    try:
+        despachos = leer_despachos(args.archivo)
+    except (OSError, ValueError) as e:
+        print(f"❌ No se pudo leer '{args.archivo}': {e}")
+        return SALIDA_ERROR
+    if not despachos:
+        print("⚠️ El archivo no tiene despachos")
+        return SALIDA_OK
+
+    from sica_apagado import CheckpointLote, apagado_compartido
+
+    # Ctrl-C / SIGTERM: terminar lo que está en curso, guardar el resto y reanudar en la próxima corrida
+    apagado = apagado_compartido()
+    apagado.instalar()
+    checkpoint = None
+    if args.checkpoint != '-':
+        checkpoint = CheckpointLote(args.checkpoint or f"{args.archivo}.checkpoint.json")
+
+    with _bot_logueado(args, precargar_registrar=True) as bot:
+        if bot is None:
+            return SALIDA_ERROR
+        resultados = bot.ejecutar_despachos_concurrentes(despachos, args.componentes, checkpoint=checkpoint)
+        for resultado in resultados:
+            resultado.pop('component_data', None)
+        _escribir_json(args, resultados)
+        if apagado.solicitado:
+            print("⏸️ Lote interrumpido: vuelva a ejecutar el mismo comando para reanudarlo")
+            return SALIDA_INTERRUMPIDO
+        if checkpoint and not checkpoint.pendientes():
+            # Lote terminado: repetir el comando vuelve a ejecutarlo completo
+            checkpoint.eliminar()
+        completos = all(r.get('estado') == 'COMPLETADO' for r in resultados)
+        return SALIDA_OK if completos else SALIDA_ERROR
+
+
+def cmd_daemon(args):
+    import sica_daemon
+    opciones = list(args.opciones)
+    if args.perfil:
+        opciones += ['--perfil', args.perfil]
+    return sica_daemon.main(opciones, prog='sica daemon')
+
+
+# --- Parser ---
+
+def construir_parser():
+    parser = argparse.ArgumentParser(prog='sica', description="Automatización de despachos SICA")
+    parser.add_argument('--cuentas', metavar='ARCHIVO',
+                        help="JSON de cuentas [{usuario, password}] (por defecto el entorno o ~/.sica/cuentas.json)")
+    parser.add_argument('--perfil', help="Perfilar operaciones: todo o lista de cprofile,muestreo,memoria")
+    parser.add_argument('--reproducir', metavar='CASSETTE', help="Servir el tráfico desde un cassette grabado")
+    parser.add_argument('--grabar', metavar='CASSETTE', help="Grabar el tráfico HTTP en un cassette")
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help="Mensajes del bot en stdout (por defecto van a stderr)")
+    subparsers = parser.add_subparsers(dest='comando', metavar='COMANDO', required=True)
+
+    sub = subparsers.add_parser('login-check', help="Verificar que las credenciales permiten loguear")
+    sub.set_defaults(funcion=cmd_login_check)
+
+    despachos = subparsers.add_parser('despachos', help="Operaciones sobre el listado de despachos")
+    acciones = despachos.add_subparsers(dest='accion', metavar='ACCION', required=True)
+    sub = acciones.add_parser('export', help="Exportar la tabla de despachos a JSON")
+    sub.add_argument('--salida', '-o', default='-', help="Archivo de salida (por defecto stdout)")
+    sub.set_defaults(funcion=cmd_despachos_export)
+
+    sub = subparsers.add_parser('lookup', help="Buscar una empresa, cédula o placa")
+    sub.add_argument('tipo', choices=('empresa', 'cedula', 'placa'))
+    sub.add_argument('valor')
+    sub.add_argument('--empresa', help="Código de empresa a seleccionar antes de buscar (obligatorio con cedula o placa)")
+    sub.add_argument('--salida', '-o', default='-', help="Archivo de salida (por defecto stdout)")
+    sub.set_defaults(funcion=cmd_lookup)
+
+    sub = subparsers.add_parser('batch', help="Ejecutar un lote de despachos (CSV o JSON)")
+    sub.add_argument('archivo', help="Columnas codigo_empresa, cedula y placa")
+    sub.add_argument('--componentes', type=int, default=3, help="Despachos en paralelo")
+    sub.add_argument('--checkpoint', help="Estado del lote para reanudarlo (por defecto <archivo>.checkpoint.json; - lo desactiva)")
+    sub.add_argument('--salida', '-o', default='-', help="Archivo de resultados (por defecto stdout)")
+    sub.set_defaults(funcion=cmd_batch)
+
+    # Sus opciones (incluida --help) pasan tal cual a sica_daemon.main
+    sub = subparsers.add_parser('daemon', help="Arrancar el daemon (opciones de sica_daemon.py)", add_help=False)
+    sub.set_defaults(funcion=cmd_daemon)
+    return parser
+
+
+def main(argv=None):
+    parser = construir_parser()
+    args, resto = parser.parse_known_args(argv)
+    if args.comando == 'daemon':
+        args.opciones = resto
+    elif resto:
+        parser.error(f"argumentos no reconocidos: {' '.join(resto)}")
+    if args.comando == 'lookup' and args.tipo != 'empresa' and not args.empresa:
+        # SICA solo busca conductores y vehículos con una empresa seleccionada en el componente
+        parser.error(f"lookup {args.tipo} requiere --empresa")
+    args.stdout = sys.stdout
+    configurar_cuentas(args.cuentas)
+    if args.perfil and args.comando != 'daemon':
+        from sica_perfil import configurar_perfil
+        try:
+            configurar_perfil(args.perfil)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.verbose or args.comando == 'daemon':
+        return args.funcion(args)
+    # stdout queda para el JSON de resultado; los mensajes del bot van a stderr
+    with redirect_stdout(sys.stderr):
+        return args.funcion(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+SICA Cola - Cola de despachos con arrendamientos para repartir un backlog entre workers y máquinas
+Backends: SQLite (un solo host, bloqueo del archivo) y red (HTTP/JSON contra un coordinador)
+"""
+
+import abc
+import argparse
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sica_apagado import ESTADOS_DEFINITIVOS
+from sica_planificador import PRIORIDADES, clase_prioridad
+
+# Hosts que solo aceptan conexiones de la propia máquina: servirlos sin token es seguro
+HOSTS_LOCALES = ('127.0.0.1', 'localhost', '::1')
+
+
+class ColaDespachos(abc.ABC):
+    """Interfaz de la cola de despachos.
+
+    Cada trabajo (codigo_empresa, cedula, placa) se arrienda a un worker por un tiempo
+    de visibilidad; si el worker no lo completa ni lo extiende, vuelve a estar visible.
+    Los trabajos que agotan sus intentos pasan a la cola de muertos, y la completación
+    se registra una sola vez por trabajo.
+    """
+
+    @abc.abstractmethod
+    def encolar(self, despacho, job_id=None, max_intentos=5, prioridad='normal', plazo=None):
+        """Los trabajos se arriendan por prioridad (urgente, normal, masivo) y plazo más cercano"""
+
+    @abc.abstractmethod
+    def arrendar(self, worker, visibilidad=300):
+        """Retorna {'id', 'despacho', 'lease_token', 'intentos'} o None si no hay trabajo"""
+
+    @abc.abstractmethod
+    def extender(self, job_id, lease_token, visibilidad=300):
+        """Renovar el arrendamiento; False si el lease_token ya no es el vigente"""
+
+    @abc.abstractmethod
+    def completar(self, job_id, lease_token, resultado):
+        """True solo para la primera completación registrada del trabajo"""
+
+    @abc.abstractmethod
+    def fallar(self, job_id, lease_token, error):
+        """Devolver el trabajo a la cola con backoff o moverlo a muertos; retorna el nuevo estado"""
+
+    @abc.abstractmethod
+    def muertos(self):
+        """Trabajos que agotaron sus intentos"""
+
+    @abc.abstractmethod
+    def estadisticas(self):
+        """Conteo de trabajos por estado"""
+
+
+class ColaSQLite(ColaDespachos):
+    """Cola en un archivo SQLite; varios procesos del mismo host la comparten vía el bloqueo de SQLite"""
+
+    def __init__(self, ruta='sica_cola.db', backoff_base=2.0, backoff_maximo=300.0):
+        self.ruta = ruta
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+        self._local = threading.local()
+        self._crear_esquema()
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            if self.ruta != ':memory:':
+                conexion.execute('PRAGMA journal_mode=WAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def _crear_esquema(self):
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS trabajos (
+                id TEXT PRIMARY KEY,
+                despacho TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                max_intentos INTEGER NOT NULL,
+                visible_desde REAL NOT NULL,
+                lease_token TEXT,
+                lease_worker TEXT,
+                ultimo_error TEXT,
+                creado REAL NOT NULL,
+                actualizado REAL NOT NULL,
+                prioridad INTEGER NOT NULL DEFAULT 1,
+                plazo REAL
+            );
+            CREATE TABLE IF NOT EXISTS completados (
+                id TEXT PRIMARY KEY,
+                resultado TEXT,
+                worker TEXT,
+                completado REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_trabajos_planificacion ON trabajos (estado, prioridad, plazo, creado);
+        """)
+
+    def _transaccion(self, fn):
+        """Ejecutar fn dentro de BEGIN IMMEDIATE (un solo escritor a la vez entre procesos)"""
+        conexion = self._conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            resultado = fn(conexion)
+            conexion.execute('COMMIT')
+            return resultado
+        except Exception:
+            conexion.execute('ROLLBACK')
+            raise
+
+    def encolar(self, despacho, job_id=None, max_intentos=5, prioridad='normal', plazo=None):
+        job_id = job_id or uuid.uuid4().hex
+        ahora = time.time()
+        self._conexion().execute(
+            "INSERT OR IGNORE INTO trabajos (id, despacho, estado, max_intentos, visible_desde, creado, actualizado, "
+            "prioridad, plazo) VALUES (?, ?, 'pendiente', ?, ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(despacho, ensure_ascii=False), max_intentos, ahora, ahora, ahora,
+             PRIORIDADES[clase_prioridad(prioridad)], plazo),
+        )
+        return job_id
+
+    def arrendar(self, worker, visibilidad=300):
+        def _arrendar(conexion):
+            ahora = time.time()
+            while True:
+                fila = conexion.execute(
+                    "SELECT * FROM trabajos WHERE estado IN ('pendiente', 'arrendado') AND visible_desde <= ? "
+                    "ORDER BY prioridad, plazo IS NULL, plazo, creado LIMIT 1",
+                    (ahora,),
+                ).fetchone()
+                if fila is None:
+                    return None
+                if fila['intentos'] >= fila['max_intentos']:
+                    # Arrendamiento vencido en su último intento: a muertos
+                    conexion.execute(
+                        "UPDATE trabajos SET estado = 'muerto', lease_token = NULL, actualizado = ?, "
+                        "ultimo_error = COALESCE(ultimo_error, 'arrendamiento vencido') WHERE id = ?",
+                        (ahora, fila['id']),
+                    )
+                    continue
+                token = uuid.uuid4().hex
+                conexion.execute(
+                    "UPDATE trabajos SET estado = 'arrendado', intentos = intentos + 1, lease_token = ?, "
+                    "lease_worker = ?, visible_desde = ?, actualizado = ? WHERE id = ?",
+                    (token, worker, ahora + visibilidad, ahora, fila['id']),
+                )
+                return {
+                    'id': fila['id'],
+                    'despacho': json.loads(fila['despacho']),
+                    'lease_token': token,
+                    'intentos': fila['intentos'] + 1,
+                }
+        return self._transaccion(_arrendar)
+
+    def extender(self, job_id, lease_token, visibilidad=300):
+        cursor = self._conexion().execute(
+            "UPDATE trabajos SET visible_desde = ?, actualizado = ? "
+            "WHERE id = ? AND lease_token = ? AND estado = 'arrendado'",
+            (time.time() + visibilidad, time.time(), job_id, lease_token),
+        )
+        return cursor.rowcount == 1
+
+    def completar(self, job_id, lease_token, resultado):
+        def _completar(conexion):
+            fila = conexion.execute("SELECT lease_token, lease_worker FROM trabajos WHERE id = ?", (job_id,)).fetchone()
+            if fila is None:
+                return False
+            # Se acepta aunque el arrendamiento haya vencido: el despacho ya ocurrió en SICA
+            cursor = conexion.execute(
+                "INSERT OR IGNORE INTO completados (id, resultado, worker, completado) VALUES (?, ?, ?, ?)",
+                (job_id, json.dumps(resultado, ensure_ascii=False, default=str), fila['lease_worker'], time.time()),
+            )
+            if cursor.rowcount == 0:
+                return False
+            conexion.execute(
+                "UPDATE trabajos SET estado = 'completado', lease_token = NULL, actualizado = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+            return True
+        return self._transaccion(_completar)
+
+    def fallar(self, job_id, lease_token, error):
+        def _fallar(conexion):
+            fila = conexion.execute(
+                "SELECT intentos, max_intentos FROM trabajos WHERE id = ? AND lease_token = ? AND estado = 'arrendado'",
+                (job_id, lease_token),
+            ).fetchone()
+            if fila is None:
+                return None
+            ahora = time.time()
+            if fila['intentos'] >= fila['max_intentos']:
+                estado, visible = 'muerto', ahora
+            else:
+                estado = 'pendiente'
+                visible = ahora + min(self.backoff_maximo, self.backoff_base ** fila['intentos'])
+            conexion.execute(
+                "UPDATE trabajos SET estado = ?, visible_desde = ?, lease_token = NULL, ultimo_error = ?, "
+                "actualizado = ? WHERE id = ?",
+                (estado, visible, str(error), ahora, job_id),
+            )
+            return estado
+        return self._transaccion(_fallar)
+
+    def muertos(self):
+        filas = self._conexion().execute(
+            "SELECT id, despacho, intentos, ultimo_error FROM trabajos WHERE estado = 'muerto' ORDER BY actualizado"
+        ).fetchall()
+        return [dict(f, despacho=json.loads(f['despacho'])) for f in filas]
+
+    def reencolar_muerto(self, job_id):
+        """Devolver un trabajo muerto a la cola con sus intentos reiniciados"""
+        cursor = self._conexion().execute(
+            "UPDATE trabajos SET estado = 'pendiente', intentos = 0, visible_desde = ?, actualizado = ? "
+            "WHERE id = ? AND estado = 'muerto'",
+            (time.time(), time.time(), job_id),
+        )
+        return cursor.rowcount == 1
+
+    def resultado(self, job_id):
+        fila = self._conexion().execute("SELECT * FROM completados WHERE id = ?", (job_id,)).fetchone()
+        return dict(fila, resultado=json.loads(fila['resultado'])) if fila else None
+
+    def estadisticas(self):
+        filas = self._conexion().execute("SELECT estado, COUNT(*) AS n FROM trabajos GROUP BY estado").fetchall()
+        return {fila['estado']: fila['n'] for fila in filas}
+
+
+class ServidorCola:
+    """Coordinador HTTP/JSON que expone una cola local (normalmente ColaSQLite) a otras máquinas.
+
+    Por defecto escucha solo en 127.0.0.1; para escuchar en otra interfaz exige un token
+    que los clientes envían como 'Authorization: Bearer <token>'.
+    """
+
+    def __init__(self, cola, host='127.0.0.1', port=8767, token=None):
+        if host not in HOSTS_LOCALES and not token:
+            raise ValueError(f"Servir la cola en {host} requiere un token (SICA_COLA_TOKEN)")
+        self.cola = cola
+        self.host = host
+        self.port = port
+        self.token = token
+        self._servidor = None
+
+    def _autorizado(self, cabecera):
+        if not self.token:
+            return True
+        return hmac.compare_digest((cabecera or '').encode('utf-8'), f"Bearer {self.token}".encode('utf-8'))
+
+    def _despachar(self, ruta, datos):
+        cola = self.cola
+        if ruta == '/encolar':
+            return {'id': cola.encolar(datos['despacho'], datos.get('id'), datos.get('max_intentos', 5),
+                                       datos.get('prioridad', 'normal'), datos.get('plazo'))}
+        if ruta == '/arrendar':
+            return {'trabajo': cola.arrendar(datos['worker'], datos.get('visibilidad', 300))}
+        if ruta == '/extender':
+            return {'ok': cola.extender(datos['id'], datos['lease_token'], datos.get('visibilidad', 300))}
+        if ruta == '/completar':
+            return {'ok': cola.completar(datos['id'], datos['lease_token'], datos.get('resultado'))}
+        if ruta == '/fallar':
+            return {'estado': cola.fallar(datos['id'], datos['lease_token'], datos.get('error'))}
+        if ruta == '/muertos':
+            return {'muertos': cola.muertos()}
+        if ruta == '/estadisticas':
+            return {'estadisticas': cola.estadisticas()}
+        return None
+
+    def iniciar(self):
+        """Arrancar el servidor en un hilo de fondo y retornar (host, port) efectivos"""
+        servidor_cola = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                longitud = int(self.headers.get('Content-Length', 0))
+                if not servidor_cola._autorizado(self.headers.get('Authorization')):
+                    return self._responder(401, {'error': 'Token inválido'})
+                try:
+                    datos = json.loads(self.rfile.read(longitud) or b'{}')
+                    respuesta = servidor_cola._despachar(self.path, datos)
+                    status = 200 if respuesta is not None else 404
+                except Exception as e:
+                    respuesta, status = {'error': str(e)}, 500
+                self._responder(status, respuesta or {'error': 'Ruta no encontrada'})
+
+            def _responder(self, status, respuesta):
+                cuerpo = json.dumps(respuesta, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((self.host, self.port), Manejador)
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self._servidor.server_address
+
+    def detener(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+
+class ColaRed(ColaDespachos):
+    """Cola remota: cada operación es un POST JSON al ServidorCola del coordinador"""
+
+    def __init__(self, url, timeout=30, token=None):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.token = token or os.environ.get('SICA_COLA_TOKEN')
+
+    def _llamar(self, ruta, datos=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            f"{self.url}{ruta}",
+            data=json.dumps(datos or {}, ensure_ascii=False, default=str).encode('utf-8'),
+            headers=headers,
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def encolar(self, despacho, job_id=None, max_intentos=5, prioridad='normal', plazo=None):
+        return self._llamar('/encolar', {'despacho': despacho, 'id': job_id, 'max_intentos': max_intentos,
+                                         'prioridad': prioridad, 'plazo': plazo})['id']
+
+    def arrendar(self, worker, visibilidad=300):
+        return self._llamar('/arrendar', {'worker': worker, 'visibilidad': visibilidad})['trabajo']
+
+    def extender(self, job_id, lease_token, visibilidad=300):
+        return self._llamar('/extender', {'id': job_id, 'lease_token': lease_token, 'visibilidad': visibilidad})['ok']
+
+    def completar(self, job_id, lease_token, resultado):
+        return self._llamar('/completar', {'id': job_id, 'lease_token': lease_token, 'resultado': resultado})['ok']
+
+    def fallar(self, job_id, lease_token, error):
+        return self._llamar('/fallar', {'id': job_id, 'lease_token': lease_token, 'error': str(error)})['estado']
+
+    def muertos(self):
+        return self._llamar('/muertos')['muertos']
+
+    def estadisticas(self):
+        return self._llamar('/estadisticas')['estadisticas']
+
+
+@contextmanager
+def mantener_arrendamiento(cola, trabajo, visibilidad=300):
+    """Extender el arrendamiento del trabajo cada visibilidad/3 mientras dure el bloque.
+
+    Un despacho lento (reintentos, circuito abierto) no debe volver a quedar visible para
+    otro worker a mitad de camino. Si la cola rechaza la extensión (el arrendamiento ya
+    venció y otro worker lo tomó) el latido se detiene y lo avisa.
+    """
+    terminado = threading.Event()
+
+    def latir():
+        while not terminado.wait(visibilidad / 3):
+            try:
+                if not cola.extender(trabajo['id'], trabajo['lease_token'], visibilidad):
+                    print(f"⚠️ Arrendamiento del trabajo {trabajo['id'][:8]} perdido: ya no se extiende")
+                    return
+            except Exception as e:
+                # Coordinador caído un momento: reintentar en el próximo latido
+                print(f"⚠️ No se pudo extender el trabajo {trabajo['id'][:8]}: {e}")
+
+    hilo = threading.Thread(target=latir, daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        terminado.set()
+        hilo.join()
+
+
+def ejecutar_worker(cola, bot, worker=None, visibilidad=300, espera_vacia=2.0, detener=None, guardia=None):
+    """Drenar la cola con un bot ya logueado hasta que detener (threading.Event) se active.
+
+    El arrendamiento de cada trabajo se extiende mientras se procesa (mantener_arrendamiento).
+    Con el apagado del bot solicitado (SIGINT/SIGTERM) no arrienda más trabajos; los que
+    queden cortados vuelven a la cola al fallar o al vencer su arrendamiento.
+    guardia: GuardiaIdempotencia opcional para no duplicar guías al reintentar (clave: id del trabajo).
+    """
+    worker = worker or f"{uuid.uuid4().hex[:8]}"
+    print(f"👷 Worker {worker} procesando la cola...")
+    while (detener is None or not detener.is_set()) and not bot.apagado.solicitado:
+        trabajo = cola.arrendar(worker, visibilidad)
+        if trabajo is None:
+            if detener is None:
+                return
+            detener.wait(espera_vacia)
+            continue
+
+        despacho = trabajo['despacho']
+        print(f"📦 Trabajo {trabajo['id'][:8]} (intento {trabajo['intentos']}): {despacho}")
+
+        def enviar():
+            component_data = bot.navigate_to_despachos_registrar()
+            if not component_data:
+                return {'estado': 'ERROR_COMPONENTE'}
+            return bot.ejecutar_despacho(component_data, despacho['codigo_empresa'],
+                                         despacho['cedula'], despacho['placa'])
+
+        try:
+            with mantener_arrendamiento(cola, trabajo, visibilidad):
+                resultado = guardia.ejecutar(despacho, enviar, bot, clave=trabajo['id']) if guardia else enviar()
+        except Exception as e:
+            cola.fallar(trabajo['id'], trabajo['lease_token'], e)
+            continue
+
+        resultado.pop('component_data', None)
+        if resultado['estado'] in ESTADOS_DEFINITIVOS:
+            cola.completar(trabajo['id'], trabajo['lease_token'], resultado)
+        else:
+            estado = cola.fallar(trabajo['id'], trabajo['lease_token'], resultado['estado'])
+            print(f"⚠️ Trabajo {trabajo['id'][:8]} falló ({resultado['estado']}), ahora: {estado}")
+
+
+def main():
+    """Servir una cola SQLite por HTTP para que otras máquinas la consuman con ColaRed"""
+    parser = argparse.ArgumentParser(description="Coordinador de la cola de despachos SICA")
+    parser.add_argument('--db', default='sica_cola.db')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="Interfaz donde escuchar; fuera de localhost exige SICA_COLA_TOKEN")
+    parser.add_argument('--port', type=int, default=8767)
+    args = parser.parse_args()
+
+    try:
+        servidor = ServidorCola(ColaSQLite(args.db), args.host, args.port, token=os.environ.get('SICA_COLA_TOKEN'))
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    host, port = servidor.iniciar()
+    print(f"🌐 Cola de despachos servida en http://{host}:{port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n⚠️ Deteniendo coordinador...")
+        servidor.detener()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
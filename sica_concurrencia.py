@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+SICA Concurrencia - Primitivas de concurrencia compartidas entre workers del bot
+"""
+
+import copy
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+
+class _LlamadaEnVuelo:
+    """Estado de una llamada en curso compartida por varios llamadores"""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """Coalesce llamadas idénticas concurrentes: una sola ejecución, resultado para todos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self.stats = {
+            'llamadas': 0,
+            'ejecutadas': 0,
+            'coalescidas': 0,
+            'errores': 0,
+        }
+
+    def do(self, clave, fn, *args, **kwargs):
+        """Ejecutar fn para la clave, o esperar la ejecución en curso.
+
+        Retorna (resultado, compartido). Los llamadores coalescidos reciben una
+        copia profunda del resultado para que no compartan objetos mutables.
+        """
+        with self._lock:
+            self.stats['llamadas'] += 1
+            llamada = self._en_vuelo.get(clave)
+            if llamada is not None:
+                llamada.esperando += 1
+                self.stats['coalescidas'] += 1
+                lider = False
+            else:
+                llamada = _LlamadaEnVuelo()
+                self._en_vuelo[clave] = llamada
+                self.stats['ejecutadas'] += 1
+                lider = True
+
+        if not lider:
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            return copy.deepcopy(llamada.resultado), True
+
+        try:
+            llamada.resultado = fn(*args, **kwargs)
+        except Exception as e:
+            llamada.error = e
+            with self._lock:
+                self.stats['errores'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+            llamada.evento.set()
+
+        return llamada.resultado, False
+
+    def en_vuelo(self):
+        """Número de claves con una llamada en curso"""
+        with self._lock:
+            return len(self._en_vuelo)
+
+    def estadisticas(self):
+        """Copia de los contadores de llamadas y coalescencia"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['ratio_coalescidas'] = (stats['coalescidas'] / stats['llamadas']) if stats['llamadas'] else 0.0
+        return stats
+
+
+class _PermisoLimitador:
+    """Permiso de concurrencia adquirido para una operación; se libera con el resultado"""
+
+    def __init__(self, limitador, operacion):
+        self._limitador = limitador
+        self.operacion = operacion
+        self.liberado = False
+
+    def liberar(self, latencia, fallo=None):
+        """Liberar el permiso informando latencia (s) y motivo de fallo (None si fue sano)"""
+        if not self.liberado:
+            self.liberado = True
+            self._limitador._liberar(self.operacion, latencia, fallo)
+
+
+class _EstadoOperacion:
+    """Límite AIMD y métricas de un tipo de operación"""
+
+    def __init__(self, limite_inicial, ventana):
+        self.limite = float(limite_inicial)
+        self.en_vuelo = 0
+        self.exitos = 0
+        self.fallos = 0
+        self.fallos_por_motivo = {}
+        self.recientes = deque(maxlen=ventana)  # True = fallo
+        self.latencia_ewma = None
+        self.latencia_base = None
+        self.ultimo_recorte = 0.0
+        self.recortes = 0
+
+
+class LimitadorAdaptativo:
+    """Limitador de concurrencia AIMD por tipo de operación, compartido por todas las sesiones.
+
+    Sube el límite de forma aditiva mientras SICA responde sano y lo recorta de forma
+    multiplicativa ante 5xx, timeouts o páginas de loading.
+    """
+
+    def __init__(self, limite_inicial=4, limite_minimo=1, limite_maximo=32,
+                 factor_recorte=0.5, enfriamiento=2.0, factor_latencia=3.0, ventana=50):
+        self.limite_inicial = limite_inicial
+        self.limite_minimo = limite_minimo
+        self.limite_maximo = limite_maximo
+        self.factor_recorte = factor_recorte
+        # Tras un recorte no se vuelve a recortar hasta pasado este tiempo (misma ráfaga)
+        self.enfriamiento = enfriamiento
+        # Latencia por encima de factor_latencia * latencia base no cuenta como sana
+        self.factor_latencia = factor_latencia
+        self.ventana = ventana
+        self._cond = threading.Condition()
+        self._operaciones = {}
+
+    def _estado(self, operacion):
+        estado = self._operaciones.get(operacion)
+        if estado is None:
+            estado = _EstadoOperacion(self.limite_inicial, self.ventana)
+            self._operaciones[operacion] = estado
+        return estado
+
+    def adquirir(self, operacion, timeout=None):
+        """Esperar un hueco bajo el límite actual de la operación y devolver el permiso"""
+        limite_espera = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            estado = self._estado(operacion)
+            while estado.en_vuelo >= max(self.limite_minimo, int(estado.limite)):
+                restante = None if limite_espera is None else limite_espera - time.monotonic()
+                if restante is not None and restante <= 0:
+                    raise TimeoutError(f"Sin capacidad para '{operacion}' (límite {int(estado.limite)})")
+                self._cond.wait(restante)
+            estado.en_vuelo += 1
+        return _PermisoLimitador(self, operacion)
+
+    def _liberar(self, operacion, latencia, fallo):
+        with self._cond:
+            estado = self._estado(operacion)
+            estado.en_vuelo -= 1
+            estado.recientes.append(fallo is not None)
+
+            if fallo is not None:
+                estado.fallos += 1
+                estado.fallos_por_motivo[fallo] = estado.fallos_por_motivo.get(fallo, 0) + 1
+                ahora = time.monotonic()
+                if ahora - estado.ultimo_recorte >= self.enfriamiento:
+                    estado.limite = max(self.limite_minimo, estado.limite * self.factor_recorte)
+                    estado.ultimo_recorte = ahora
+                    estado.recortes += 1
+            else:
+                estado.exitos += 1
+                if estado.latencia_ewma is None:
+                    estado.latencia_ewma = latencia
+                else:
+                    estado.latencia_ewma = 0.8 * estado.latencia_ewma + 0.2 * latencia
+                if estado.latencia_base is None or estado.latencia_ewma < estado.latencia_base:
+                    estado.latencia_base = estado.latencia_ewma
+                # Aumento aditivo: +1 por cada "límite" de respuestas sanas
+                if latencia <= self.factor_latencia * estado.latencia_base:
+                    estado.limite = min(self.limite_maximo, estado.limite + 1.0 / estado.limite)
+
+            self._cond.notify_all()
+
+    def limite(self, operacion):
+        """Límite de concurrencia actual de la operación"""
+        with self._cond:
+            return int(self._estado(operacion).limite)
+
+    def metricas(self):
+        """Límite, carga y salud por operación"""
+        with self._cond:
+            metricas = {}
+            for operacion, estado in self._operaciones.items():
+                recientes = list(estado.recientes)
+                metricas[operacion] = {
+                    'limite': int(estado.limite),
+                    'en_vuelo': estado.en_vuelo,
+                    'exitos': estado.exitos,
+                    'fallos': estado.fallos,
+                    'fallos_por_motivo': dict(estado.fallos_por_motivo),
+                    'tasa_error': (sum(recientes) / len(recientes)) if recientes else 0.0,
+                    'latencia_ewma': estado.latencia_ewma,
+                    'recortes': estado.recortes,
+                }
+            return metricas
+
+
+_limitador_compartido = None
+_limitador_lock = threading.Lock()
+
+
+def limitador_compartido():
+    """Limitador adaptativo único del proceso, compartido por todas las instancias de SICABot"""
+    global _limitador_compartido
+    with _limitador_lock:
+        if _limitador_compartido is None:
+            _limitador_compartido = LimitadorAdaptativo()
+        return _limitador_compartido
+
+
+class PoliticaHedge:
+    """Hedging de requests idempotentes con presupuesto global.
+
+    Si la respuesta no llegó dentro del retraso indicado (p95 de la operación), se
+    lanza un duplicado y se usa la primera respuesta que llegue. Cada request aporta
+    'proporcion' fichas al presupuesto (hasta 'rafaga') y cada duplicado consume una,
+    así el hedging nunca agrega más de ~proporcion de carga extra.
+    """
+
+    def __init__(self, proporcion=0.05, rafaga=5, max_hilos=64):
+        self.proporcion = proporcion
+        self.rafaga = rafaga
+        self._fichas = float(rafaga)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='hedge')
+        self.stats = {'requests': 0, 'hedges': 0, 'ganados_por_hedge': 0, 'sin_presupuesto': 0, 'sin_duplicado': 0}
+
+    def _autorizar(self):
+        with self._lock:
+            if self._fichas >= 1.0:
+                self._fichas -= 1.0
+                self.stats['hedges'] += 1
+                return True
+            self.stats['sin_presupuesto'] += 1
+            return False
+
+    def ejecutar(self, fn, retraso, duplicado=None):
+        """Ejecutar fn(); si no termina en 'retraso' segundos (None = sin hedge), duplicarla.
+
+        duplicado: callable opcional que arma el duplicado recién cuando hace falta y retorna
+        la función a ejecutar (p. ej. la misma búsqueda sobre otro componente), o None si no
+        hay con qué duplicar; en ese caso se espera al primario y la ficha se devuelve.
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            self._fichas = min(self.rafaga, self._fichas + self.proporcion)
+        if retraso is None:
+            return fn()
+
+        primario = self._executor.submit(fn)
+        try:
+            return primario.result(timeout=retraso)
+        except FuturesTimeout:
+            pass
+        if not self._autorizar():
+            return primario.result()
+        fn_duplicado = duplicado() if duplicado is not None else fn
+        if fn_duplicado is None:
+            with self._lock:
+                self._fichas = min(self.rafaga, self._fichas + 1.0)
+                self.stats['hedges'] -= 1
+                self.stats['sin_duplicado'] += 1
+            return primario.result()
+
+        duplicado = self._executor.submit(fn_duplicado)
+        pendientes = {primario, duplicado}
+        error = None
+        while pendientes:
+            hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                if futuro.exception() is None:
+                    if futuro is duplicado:
+                        with self._lock:
+                            self.stats['ganados_por_hedge'] += 1
+                    # El perdedor termina por su cuenta; su respuesta se descarta
+                    return futuro.result()
+                error = error or futuro.exception()
+        raise error
+
+    def metricas(self):
+        with self._lock:
+            return dict(self.stats, fichas=round(self._fichas, 2))
+
+
+_hedge_compartido = None
+_hedge_lock = threading.Lock()
+
+
+def hedge_compartido():
+    """Política de hedging única del proceso (presupuesto global entre todas las sesiones)"""
+    global _hedge_compartido
+    with _hedge_lock:
+        if _hedge_compartido is None:
+            _hedge_compartido = PoliticaHedge()
+        return _hedge_compartido
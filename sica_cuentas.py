@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+SICA Cuentas - Pool de cuentas de operador con presupuesto de requests por cuenta
+Reparte la carga entre varias cuentas SICA, lleva el estado de sesión, vinculación
+de dispositivo y errores de cada una, y pone en cuarentena las que fallan el login
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class Cuenta:
+    """Credenciales de un operador con su presupuesto de requests y su historial"""
+
+    def __init__(self, usuario, password, presupuesto=120, ventana=60.0):
+        self.usuario = usuario
+        self.password = password
+        # Máximo de requests a SICA por ventana deslizante (segundos)
+        self.presupuesto = presupuesto
+        self.ventana = ventana
+
+        self.sesiones_activas = 0
+        self.dispositivo_vinculado = False
+        self.ultimo_login = None
+        self.logins = 0
+        self.fallos_login_consecutivos = 0
+        self.cuarentena_hasta = 0.0
+        self.errores = deque(maxlen=50)
+        self._requests = deque()
+        self._lock = threading.Condition()
+
+    def _purgar(self, ahora):
+        while self._requests and ahora - self._requests[0] >= self.ventana:
+            self._requests.popleft()
+
+    def disponible(self):
+        """Requests que quedan en la ventana actual"""
+        with self._lock:
+            self._purgar(time.monotonic())
+            return self.presupuesto - len(self._requests)
+
+    def consumir(self, timeout=None):
+        """Registrar un request; espera a que haya presupuesto si la ventana está llena"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self._purgar(ahora)
+                if len(self._requests) < self.presupuesto:
+                    self._requests.append(ahora)
+                    return True
+                espera = self._requests[0] + self.ventana - ahora
+                if limite is not None:
+                    espera = min(espera, limite - ahora)
+                    if espera <= 0:
+                        return False
+                self._lock.wait(espera)
+
+    def registrar_error(self, tipo, detalle=None):
+        self.errores.append({'ts': time.time(), 'tipo': tipo, 'detalle': detalle})
+
+    def en_cuarentena(self):
+        return time.time() < self.cuarentena_hasta
+
+    def metricas(self):
+        return {
+            'usuario': self.usuario,
+            'sesiones_activas': self.sesiones_activas,
+            'dispositivo_vinculado': self.dispositivo_vinculado,
+            'presupuesto': self.presupuesto,
+            'disponible': self.disponible(),
+            'logins': self.logins,
+            'fallos_login_consecutivos': self.fallos_login_consecutivos,
+            'en_cuarentena': self.en_cuarentena(),
+            'cuarentena_restante': max(0.0, self.cuarentena_hasta - time.time()),
+            'errores_recientes': list(self.errores)[-5:],
+        }
+
+
+class PoolCuentas:
+    """Elige la cuenta con más presupuesto libre y aísla las que fallan el login"""
+
+    def __init__(self, cuentas, fallos_para_cuarentena=2, cuarentena_base=300.0, cuarentena_maxima=3600.0):
+        if not cuentas:
+            raise ValueError("El pool necesita al menos una cuenta")
+        self.cuentas = list(cuentas)
+        self.fallos_para_cuarentena = fallos_para_cuarentena
+        self.cuarentena_base = cuarentena_base
+        self.cuarentena_maxima = cuarentena_maxima
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls, **opciones):
+        """Pool desde SICA_CUENTAS_ARCHIVO (JSON), SICA_CUENTAS ('u1:p1,u2:p2') o SICA_USUARIO/SICA_PASSWORD"""
+        presupuesto = int(os.environ.get('SICA_PRESUPUESTO_CUENTA', 120))
+        cuentas = []
+        if os.environ.get('SICA_CUENTAS_ARCHIVO'):
+            with open(os.environ['SICA_CUENTAS_ARCHIVO'], 'r', encoding='utf-8') as f:
+                for item in json.load(f):
+                    cuentas.append(Cuenta(item['usuario'], item['password'],
+                                          presupuesto=item.get('presupuesto', presupuesto)))
+        elif os.environ.get('SICA_CUENTAS'):
+            for par in os.environ['SICA_CUENTAS'].split(','):
+                usuario, _, password = par.strip().partition(':')
+                if usuario and password:
+                    cuentas.append(Cuenta(usuario, password, presupuesto=presupuesto))
+        elif os.environ.get('SICA_USUARIO') and os.environ.get('SICA_PASSWORD'):
+            cuentas.append(Cuenta(os.environ['SICA_USUARIO'], os.environ['SICA_PASSWORD'], presupuesto=presupuesto))
+        if not cuentas:
+            return None
+        return cls(cuentas, **opciones)
+
+    def __len__(self):
+        return len(self.cuentas)
+
+    def elegir(self, excluir=()):
+        """Cuenta fuera de cuarentena con más presupuesto libre por sesión; None si no hay"""
+        with self._lock:
+            candidatas = [c for c in self.cuentas if not c.en_cuarentena() and c not in excluir]
+            if not candidatas:
+                return None
+            return max(candidatas, key=lambda c: (c.disponible() / (c.sesiones_activas + 1), -c.sesiones_activas))
+
+    def login(self, bot, cuenta=None):
+        """Loguear el bot con una cuenta del pool; retorna la cuenta usada o None"""
+        intentadas = []
+        while True:
+            elegida = cuenta or self.elegir(excluir=intentadas)
+            if elegida is None:
+                print("❌ No quedan cuentas disponibles (en cuarentena o con login fallido)")
+                return None
+            intentadas.append(elegida)
+
+            print(f"👤 Usando cuenta {elegida.usuario}")
+            bot.cuenta = elegida
+            bot.verification_code = None
+            ok = bot.full_login_process(elegida.usuario, elegida.password)
+            self.registrar_login(elegida, bool(ok), dispositivo=bool(ok) or bot.verification_code is not None)
+            if ok:
+                with self._lock:
+                    elegida.sesiones_activas += 1
+                return elegida
+            bot.cuenta = None
+            if cuenta is not None:
+                return None
+
+    def liberar(self, cuenta):
+        """La sesión de un bot con esta cuenta se cerró o se perdió"""
+        with self._lock:
+            cuenta.sesiones_activas = max(0, cuenta.sesiones_activas - 1)
+
+    def registrar_login(self, cuenta, ok, dispositivo=False):
+        """Actualizar el estado de la cuenta tras un login; cuarentena exponencial si falla seguido"""
+        with self._lock:
+            cuenta.logins += 1
+            if ok:
+                cuenta.ultimo_login = time.time()
+                cuenta.dispositivo_vinculado = True
+                cuenta.fallos_login_consecutivos = 0
+                return
+            # Si llegó al código de verificación, las credenciales son válidas: falló la vinculación
+            cuenta.registrar_error('vinculacion' if dispositivo else 'login')
+            cuenta.dispositivo_vinculado = False
+            cuenta.fallos_login_consecutivos += 1
+            if cuenta.fallos_login_consecutivos >= self.fallos_para_cuarentena:
+                exceso = cuenta.fallos_login_consecutivos - self.fallos_para_cuarentena
+                duracion = min(self.cuarentena_base * (2 ** exceso), self.cuarentena_maxima)
+                cuenta.cuarentena_hasta = time.time() + duracion
+                print(f"🚫 Cuenta {cuenta.usuario} en cuarentena por {duracion:.0f}s "
+                      f"({cuenta.fallos_login_consecutivos} logins fallidos seguidos)")
+
+    def metricas(self):
+        return [c.metricas() for c in self.cuentas]
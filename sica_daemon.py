@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+SICA Daemon - Proceso de larga duración con sesiones autenticadas en caliente
+Expone una API HTTP/JSON local para enviar despachos y consultar su estado
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sica_apagado import ESTADOS_DEFINITIVOS, CheckpointLote, apagado_compartido
+from sica_cuentas import Cuenta, PoolCuentas
+from sica_perfil import configurar_perfil
+from sica_planificador import PlanificadorDespachos, clase_prioridad
+from sica_reserva import ReservaSesiones
+
+
+def plazo_despacho(despacho):
+    """Plazo del despacho como timestamp epoch: 'plazo' o 'plazo_minutos' desde ahora (None si no trae).
+
+    ValueError si no es un número finito, para que la API responda 400.
+    """
+    try:
+        if despacho.get('plazo') is not None:
+            plazo = float(despacho['plazo'])
+        elif despacho.get('plazo_minutos') is not None:
+            plazo = time.time() + float(despacho['plazo_minutos']) * 60
+        else:
+            return None
+    except (TypeError, ValueError):
+        raise ValueError("plazo y plazo_minutos deben ser números") from None
+    if not math.isfinite(plazo):
+        raise ValueError("plazo y plazo_minutos deben ser números finitos")
+    return plazo
+
+
+class DaemonSICA:
+    """Mantiene sesiones SICA logueadas en reserva y ejecuta los despachos que llegan por la API local"""
+
+    def __init__(self, username=None, password=None, sesiones=1, workers_por_sesion=2, max_trabajos_guardados=10000,
+                 cuentas=None, reserva_urgente=1, checkpoint=None, apagado=None):
+        # Pool de cuentas de operador; con usuario/contraseña sueltos, un pool de una sola cuenta
+        self.cuentas = cuentas or PoolCuentas([Cuenta(username, password)])
+        self.sesiones = sesiones
+        self.workers_por_sesion = workers_por_sesion
+        self.max_trabajos_guardados = max_trabajos_guardados
+
+        # Sesiones en caliente con un componente de registro precargado por worker
+        self.reserva = ReservaSesiones(self.cuentas, sesiones=sesiones, componentes_por_sesion=workers_por_sesion)
+        # Prioridad + plazo (EDF), con workers reservados para despachos urgentes
+        self.cola = PlanificadorDespachos(sesiones * workers_por_sesion, reserva_urgente=reserva_urgente)
+        self.trabajos = OrderedDict()
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._workers = []
+        self.iniciado = None
+        # Apagado ordenado: los trabajos sin terminar se guardan en el checkpoint y se reencolan al arrancar
+        self.apagado = apagado or apagado_compartido()
+        self.checkpoint = checkpoint
+        self._lote = None
+        # Último component_data (fingerprint + serverMemo) de los trabajos sin terminar, para retomarlos
+        self._componentes = {}
+
+    def iniciar(self):
+        """Loguear las sesiones y arrancar los workers"""
+        print(f"🚀 Iniciando daemon con {self.sesiones} sesiones y {self.workers_por_sesion} workers por sesión "
+              f"sobre {len(self.cuentas)} cuentas...")
+        self.reserva.iniciar()
+
+        for _ in range(self.sesiones * self.workers_por_sesion):
+            worker = threading.Thread(target=self._worker, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        self.iniciado = time.time()
+        self._reanudar()
+        print("✅ Daemon listo para recibir despachos")
+
+    def detener(self):
+        """Drenar: sin trabajos nuevos, esperar los en curso hasta el plazo, guardar los pendientes y cerrar sesiones"""
+        self.apagado.solicitar('detener')
+        limite = time.monotonic() + (self.apagado.restante() or 0)
+        for worker in self._workers:
+            worker.join(max(0.0, limite - time.monotonic()))
+        self._detener.set()
+        self._guardar_pendientes()
+        self.reserva.detener()
+
+    def _checkpoint_lote(self):
+        if self._lote is None:
+            self._lote = CheckpointLote(self.checkpoint)
+        return self._lote
+
+    def _guardar_pendientes(self):
+        if not self.checkpoint:
+            return
+        with self._lock:
+            pendientes = [(dict(t), self._componentes.get(t['id'])) for t in self.trabajos.values()
+                          if t['estado'] in ('EN_COLA', 'EN_PROCESO', 'INTERRUMPIDO')]
+        if not pendientes and not os.path.exists(self.checkpoint):
+            return
+        lote = self._checkpoint_lote()
+        for trabajo, component_data in pendientes:
+            lote.registrar(trabajo['id'], trabajo, {'estado': trabajo['estado'], 'component_data': component_data})
+        if not lote.pendientes():
+            lote.eliminar()
+            return
+        print(f"💾 {len(lote.pendientes())} trabajos sin terminar guardados en '{self.checkpoint}'")
+
+    def _reanudar(self):
+        """Reencolar (con su mismo id y último serverMemo) los trabajos que quedaron sin terminar.
+
+        Siguen en el checkpoint hasta que terminen en un estado definitivo: si el daemon
+        vuelve a caer antes, se retoman otra vez en el siguiente arranque.
+        """
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return
+        lote = self._checkpoint_lote()
+        reanudados = 0
+        for clave in lote.pendientes():
+            previo = lote.previo(clave)
+            if previo.get('component_data'):
+                with self._lock:
+                    self._componentes[clave] = previo['component_data']
+            self.enviar(previo['despacho'], trabajo_id=clave)
+            reanudados += 1
+        print(f"♻️ {reanudados} trabajos reencolados desde '{self.checkpoint}'")
+
+    def _registrar_en_checkpoint(self, trabajo, resultado):
+        """Actualizar un trabajo reanudado en el checkpoint; al terminar en un estado definitivo sale de él"""
+        if self._lote is None or self._lote.previo(trabajo['id']) is None:
+            return
+        if resultado['estado'] in ESTADOS_DEFINITIVOS:
+            self._lote.descartar(trabajo['id'])
+        else:
+            self._lote.registrar(trabajo['id'], trabajo, resultado)
+
+    @property
+    def bots(self):
+        return self.reserva.bots
+
+    def enviar(self, despacho, trabajo_id=None):
+        """Encolar un despacho y retornar su trabajo.
+
+        Opcionales: 'prioridad' (urgente, normal, masivo) y el plazo como 'plazo'
+        (timestamp epoch) o 'plazo_minutos' desde ahora.
+        """
+        plazo = plazo_despacho(despacho)
+        trabajo = {
+            'id': trabajo_id or uuid.uuid4().hex,
+            'codigo_empresa': despacho['codigo_empresa'],
+            'cedula': despacho['cedula'],
+            'placa': despacho['placa'],
+            'prioridad': clase_prioridad(despacho.get('prioridad')),
+            'plazo': plazo,
+            'estado': 'EN_COLA',
+            'recibido': time.time(),
+        }
+        with self._lock:
+            self.trabajos[trabajo['id']] = trabajo
+            # Acotar memoria: descartar los trabajos terminados más antiguos
+            while len(self.trabajos) > self.max_trabajos_guardados:
+                trabajo_id, antiguo = next(iter(self.trabajos.items()))
+                if antiguo['estado'] in ('EN_COLA', 'EN_PROCESO'):
+                    break
+                del self.trabajos[trabajo_id]
+                self._componentes.pop(trabajo_id, None)
+        self.cola.put(trabajo['id'], prioridad=trabajo['prioridad'], plazo=trabajo['plazo'])
+        return dict(trabajo)
+
+    def consultar(self, trabajo_id):
+        """Estado actual de un trabajo (None si no existe)"""
+        with self._lock:
+            trabajo = self.trabajos.get(trabajo_id)
+            return dict(trabajo) if trabajo else None
+
+    def estado(self):
+        """Resumen del daemon: sesiones, cola y trabajos por estado"""
+        with self._lock:
+            por_estado = {}
+            for trabajo in self.trabajos.values():
+                por_estado[trabajo['estado']] = por_estado.get(trabajo['estado'], 0) + 1
+        return {
+            'sesiones': len(self.bots),
+            'sesiones_activas': sum(1 for bot in self.bots if bot.logged_in),
+            'workers': len(self._workers),
+            'en_cola': self.cola.qsize(),
+            'planificador': self.cola.metricas(),
+            'trabajos': por_estado,
+            'uptime': time.time() - self.iniciado if self.iniciado else 0,
+            'drenando': self.apagado.solicitado,
+            'limitador': self.bots[0].limitador.metricas() if self.bots else {},
+            'circuitos': self.bots[0].circuitos.metricas() if self.bots else {},
+            'timeouts': self.bots[0].timeouts.metricas() if self.bots else {},
+            'hedge': self.bots[0].hedge.metricas() if self.bots and self.bots[0].hedge else None,
+            'cuentas': self.cuentas.metricas(),
+            'reserva': self.reserva.metricas(),
+        }
+
+    def _actualizar(self, trabajo_id, **cambios):
+        with self._lock:
+            trabajo = self.trabajos.get(trabajo_id)
+            if trabajo:
+                trabajo.update(cambios)
+
+    def _worker(self):
+        while not self._detener.is_set() and not self.apagado.solicitado:
+            try:
+                trabajo_id = self.cola.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            trabajo = self.consultar(trabajo_id)
+            if not trabajo or self.apagado.solicitado:
+                # Con el apagado solicitado queda EN_COLA y va al checkpoint
+                self.cola.terminar(trabajo_id)
+                continue
+            self._actualizar(trabajo_id, estado='EN_PROCESO', iniciado=time.time())
+
+            try:
+                # La reserva elige la sesión cuya cuenta tiene más presupuesto y repone el componente
+                componente = self.reserva.tomar()
+                if componente is None:
+                    self._actualizar(trabajo_id, estado='ERROR_SESION', terminado=time.time())
+                    continue
+
+                with self._lock:
+                    guardado = self._componentes.get(trabajo_id)
+                resultado = None
+                if guardado:
+                    print(f"♻️ Retomando trabajo {trabajo_id[:8]} desde su último serverMemo")
+                    resultado = componente.bot.ejecutar_despacho(guardado, trabajo['codigo_empresa'],
+                                                                 trabajo['cedula'], trabajo['placa'])
+                # Sin componente guardado, o si con el guardado quedó en un estado reintentable: el de
+                # la reserva (un "no encontrado" es definitivo y no se repite)
+                if resultado is None or resultado['estado'] not in (*ESTADOS_DEFINITIVOS, 'INTERRUMPIDO'):
+                    resultado = componente.bot.ejecutar_despacho(componente.component_data, trabajo['codigo_empresa'],
+                                                                 trabajo['cedula'], trabajo['placa'])
+                # Solo un interrumpido va al checkpoint en el apagado: conservar su último serverMemo
+                with self._lock:
+                    if resultado['estado'] == 'INTERRUMPIDO' and resultado.get('component_data'):
+                        self._componentes[trabajo_id] = resultado['component_data']
+                    else:
+                        self._componentes.pop(trabajo_id, None)
+                self._registrar_en_checkpoint(trabajo, resultado)
+                self._actualizar(
+                    trabajo_id,
+                    estado=resultado['estado'],
+                    empresa=resultado.get('empresa'),
+                    conductor=resultado.get('conductor'),
+                    vehiculo=resultado.get('vehiculo'),
+                    terminado=time.time(),
+                )
+            except Exception as e:
+                print(f"❌ Error procesando trabajo {trabajo_id}: {e}")
+                self._actualizar(trabajo_id, estado='ERROR', error=str(e), terminado=time.time())
+            finally:
+                cumplido = self.cola.terminar(trabajo_id)
+                if cumplido is not None:
+                    self._actualizar(trabajo_id, plazo_cumplido=cumplido)
+                    if not cumplido:
+                        print(f"⏰ Trabajo {trabajo_id[:8]} terminó fuera de plazo")
+
+
+class _ManejadorAPI(BaseHTTPRequestHandler):
+    """API JSON local: POST /despachos, GET /despachos/<id>, GET /estado"""
+
+    daemon = None
+
+    def _responder(self, status, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == '/estado':
+            return self._responder(200, self.daemon.estado())
+        if self.path.startswith('/despachos/'):
+            trabajo = self.daemon.consultar(self.path.rsplit('/', 1)[-1])
+            if trabajo:
+                return self._responder(200, trabajo)
+            return self._responder(404, {'error': 'Trabajo no encontrado'})
+        return self._responder(404, {'error': 'Ruta no encontrada'})
+
+    def do_POST(self):
+        if self.path != '/despachos':
+            return self._responder(404, {'error': 'Ruta no encontrada'})
+        if self.daemon.apagado.solicitado:
+            return self._responder(503, {'error': 'Daemon deteniéndose; reintente en el próximo arranque'})
+        try:
+            longitud = int(self.headers.get('Content-Length', 0))
+            despacho = json.loads(self.rfile.read(longitud) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            return self._responder(400, {'error': 'JSON inválido'})
+        if not isinstance(despacho, dict):
+            return self._responder(400, {'error': 'Se esperaba un objeto JSON'})
+
+        faltantes = [campo for campo in ('codigo_empresa', 'cedula', 'placa') if not despacho.get(campo)]
+        if faltantes:
+            return self._responder(400, {'error': f"Faltan campos: {', '.join(faltantes)}"})
+        try:
+            clase_prioridad(despacho.get('prioridad'))
+            plazo_despacho(despacho)
+        except ValueError as e:
+            return self._responder(400, {'error': str(e)})
+
+        return self._responder(202, self.daemon.enviar(despacho))
+
+    def log_message(self, format, *args):
+        # Silenciar el log por request de http.server
+        pass
+
+
+def servir(daemon, host='127.0.0.1', port=8765):
+    """Servir la API local del daemon hasta SIGINT/SIGTERM (Ctrl-C), luego drenar y detener"""
+    manejador = type('ManejadorAPI', (_ManejadorAPI,), {'daemon': daemon})
+    servidor = ThreadingHTTPServer((host, port), manejador)
+    print(f"🌐 API local escuchando en http://{host}:{port}")
+    daemon.apagado.instalar()
+    daemon.apagado.al_solicitar(servidor.shutdown)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️ Deteniendo daemon...")
+    finally:
+        servidor.server_close()
+        daemon.detener()
+
+
+def main(argv=None, prog=None):
+    """Arrancar el daemon con las cuentas de SICA_CUENTAS(_ARCHIVO) o SICA_USUARIO / SICA_PASSWORD"""
+    parser = argparse.ArgumentParser(prog=prog, description="Daemon SICA con API local de despachos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--sesiones', type=int, default=None, help="Por defecto, una por cuenta")
+    parser.add_argument('--workers', type=int, default=2, help="Workers por sesión")
+    parser.add_argument('--reserva-urgente', type=int, default=1, help="Workers reservados para despachos urgentes")
+    parser.add_argument('--perfil', help="Perfilar operaciones: todo o lista de cprofile,muestreo,memoria")
+    parser.add_argument('--checkpoint', default='sica_daemon_checkpoint.json',
+                        help="Trabajos sin terminar al detener; se reencolan al arrancar")
+    parser.add_argument('--plazo-drenaje', type=float, default=None,
+                        help="Segundos para terminar los despachos en curso al detener (SICA_PLAZO_DRENAJE, 60)")
+    args = parser.parse_args(argv)
+    if args.perfil:
+        configurar_perfil(args.perfil)
+    if args.plazo_drenaje is not None:
+        apagado_compartido().plazo = args.plazo_drenaje
+
+    cuentas = PoolCuentas.desde_entorno()
+    if cuentas is None:
+        print("❌ Defina SICA_CUENTAS (usuario:clave,...) o SICA_USUARIO y SICA_PASSWORD en el entorno")
+        return 1
+
+    daemon = DaemonSICA(sesiones=args.sesiones or len(cuentas), workers_por_sesion=args.workers, cuentas=cuentas,
+                        reserva_urgente=args.reserva_urgente, checkpoint=args.checkpoint)
+    daemon.iniciar()
+    servir(daemon, args.host, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
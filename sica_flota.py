@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+SICA Flota - Verificación masiva de placas y cédulas de conductores
+Normaliza y deduplica las entradas, las consulta en paralelo sobre varios componentes
+de registro (con el limitador del bot) y escribe un reporte encontrado/no encontrado
+"""
+
+import argparse
+import csv
+import json
+import queue
+import threading
+import time
+
+from sica_bot import SICABot, normalizar_cedula, normalizar_placa
+from sica_cuentas import PoolCuentas
+from sica_perfil import configurar_perfil
+
+
+def leer_entradas(ruta):
+    """Leer cédulas y placas de un CSV con columnas 'cedula' y/o 'placa'"""
+    cedulas, placas = [], []
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+        for fila in csv.DictReader(f):
+            fila = {(k or '').strip().lower(): (v or '').strip() for k, v in fila.items()}
+            if fila.get('cedula'):
+                cedulas.append(fila['cedula'])
+            if fila.get('placa'):
+                placas.append(fila['placa'])
+    return cedulas, placas
+
+
+def preparar(entradas, normalizar):
+    """Normalizar y deduplicar conservando el orden; retorna (validos, invalidos)"""
+    validos, invalidos, vistos = [], [], set()
+    for entrada in entradas:
+        valor = normalizar(entrada)
+        if valor is None:
+            invalidos.append(entrada)
+        elif valor not in vistos:
+            vistos.add(valor)
+            validos.append((entrada, valor))
+    return validos, invalidos
+
+
+class EscanerFlota:
+    """Consulta cédulas y placas en paralelo, un hilo por componente de registro"""
+
+    def __init__(self, bot, componentes=4, codigo_empresa=None):
+        self.bot = bot
+        self.componentes = componentes
+        # SICA solo busca conductores con una empresa seleccionada en el componente
+        self.codigo_empresa = codigo_empresa
+
+    def _preparar_componente(self, component_data):
+        if not self.codigo_empresa:
+            return component_data
+        empresa = self.bot.search_empresa_by_codigo(self.codigo_empresa, component_data)
+        if not empresa or self.bot.select_empresa(empresa.get('id'), component_data) is None:
+            print(f"⚠️ No se pudo seleccionar la empresa {self.codigo_empresa} en un componente")
+            return None
+        return component_data
+
+    def _consultar(self, component_data, tipo, valor):
+        # Consultas sin selección posterior: se pueden coalescer con otras idénticas en curso
+        if tipo == 'cedula':
+            return self.bot.search_conductor_by_cedula(valor, component_data, solo_lectura=True)
+        vehiculo_result = self.bot.search_vehiculo_por_placa(valor, component_data, solo_lectura=True)
+        return vehiculo_result.get('vehiculo') if vehiculo_result else None
+
+    def _trabajar(self, component_data, tareas, resultados):
+        while True:
+            try:
+                indice, tipo, entrada, valor = tareas.get_nowait()
+            except queue.Empty:
+                return
+            resultado = {'tipo': tipo, 'entrada': entrada, 'valor': valor}
+            try:
+                registro = self._consultar(component_data, tipo, valor)
+                resultado['estado'] = 'ENCONTRADO' if registro else 'NO_ENCONTRADO'
+                resultado['registro'] = registro
+            except Exception as e:
+                resultado['estado'] = 'ERROR'
+                resultado['error'] = str(e)
+            resultados[indice] = resultado
+
+    def escanear(self, cedulas=(), placas=()):
+        """Consultar las cédulas y placas ya normalizadas ([(entrada, valor), ...]).
+
+        Las cédulas exigen codigo_empresa: sin empresa seleccionada todas saldrían NO_ENCONTRADO.
+        """
+        if cedulas and not self.codigo_empresa:
+            raise ValueError("La consulta de cédulas requiere el código de empresa")
+        tareas = queue.Queue()
+        total = 0
+        for tipo, lista in (('cedula', cedulas), ('placa', placas)):
+            for entrada, valor in lista:
+                tareas.put((total, tipo, entrada, valor))
+                total += 1
+        if not total:
+            return []
+
+        componentes = self.bot.abrir_componentes_registrar(min(self.componentes, total))
+        componentes = [c for c in map(self._preparar_componente, componentes) if c]
+        if not componentes:
+            print("❌ No hay componentes de registro disponibles para el escaneo")
+            return []
+
+        print(f"🚀 Verificando {total} entradas con {len(componentes)} componentes en paralelo...")
+        inicio = time.monotonic()
+        resultados = [None] * total
+        hilos = [threading.Thread(target=self._trabajar, args=(c, tareas, resultados)) for c in componentes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        encontrados = sum(1 for r in resultados if r and r['estado'] == 'ENCONTRADO')
+        print(f"🏁 {encontrados}/{total} encontrados en {time.monotonic() - inicio:.1f}s")
+        return [r for r in resultados if r]
+
+
+def escribir_reporte(resultados, invalidos, ruta):
+    """Reporte CSV: tipo, entrada, valor normalizado, estado, id y registro compacto"""
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['tipo', 'entrada', 'valor', 'estado', 'id', 'detalle'])
+        for r in resultados:
+            registro = r.get('registro') or {}
+            detalle = json.dumps(registro, ensure_ascii=False, separators=(',', ':')) if registro else r.get('error', '')
+            writer.writerow([r['tipo'], r['entrada'], r['valor'], r['estado'], registro.get('id', ''), detalle])
+        for tipo, entrada in invalidos:
+            writer.writerow([tipo, entrada, '', 'INVALIDO', '', ''])
+    print(f"💾 Reporte guardado en '{ruta}'")
+
+
+def main(argv=None):
+    """Verificar una flota (CSV con columnas cedula y/o placa) con las cuentas del entorno"""
+    parser = argparse.ArgumentParser(description="Verificación masiva de placas y cédulas en SICA")
+    parser.add_argument('archivo', help="CSV con columnas 'cedula' y/o 'placa'")
+    parser.add_argument('--salida', default='reporte_flota.csv')
+    parser.add_argument('--componentes', type=int, default=4, help="Consultas en paralelo")
+    parser.add_argument('--empresa', help="Empresa a seleccionar antes de consultar (obligatorio con cédulas)")
+    parser.add_argument('--perfil', help="Perfilar operaciones: todo o lista de cprofile,muestreo,memoria")
+    args = parser.parse_args(argv)
+    if args.perfil:
+        configurar_perfil(args.perfil)
+
+    cedulas, placas = leer_entradas(args.archivo)
+    if cedulas and not args.empresa:
+        parser.error("el archivo trae cédulas: indique --empresa (SICA solo busca conductores de una empresa)")
+    cedulas, invalidas_c = preparar(cedulas, normalizar_cedula)
+    placas, invalidas_p = preparar(placas, normalizar_placa)
+    invalidos = [('cedula', e) for e in invalidas_c] + [('placa', e) for e in invalidas_p]
+    print(f"📋 {len(cedulas)} cédulas y {len(placas)} placas únicas ({len(invalidos)} inválidas)")
+
+    cuentas = PoolCuentas.desde_entorno()
+    if cuentas is None:
+        print("❌ Defina SICA_CUENTAS (usuario:clave,...) o SICA_USUARIO y SICA_PASSWORD en el entorno")
+        return 1
+
+    with SICABot(conservar_html=False) as bot:
+        if not cuentas.login(bot):
+            return 1
+        resultados = EscanerFlota(bot, args.componentes, args.empresa).escanear(cedulas, placas)
+        escribir_reporte(resultados, invalidos, args.salida)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
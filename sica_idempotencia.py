@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+SICA Idempotencia - Evitar guías duplicadas al reintentar despachos
+Cada trabajo tiene una clave; ante un fallo ambiguo se verifica contra una copia local
+indexada del listado de despachos antes de volver a enviarlo
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+# Estados de fallo en los que no se sabe si SICA registró la guía (timeout, 5xx o error de
+# conexión, o cortado por el drenaje)... pero solo si el despacho llegó a un paso de escritura
+ESTADOS_AMBIGUOS = ('ERROR', 'TIMEOUT', 'INTERRUMPIDO')
+
+# Marca que pone en el resultado (o en la excepción) el paso que envía la guía a SICA antes
+# de hacer el POST. Búsquedas y selecciones no escriben nada: si fallan, se reintenta sin más
+ESCRITURA_INICIADA = 'escritura_iniciada'
+
+
+def clave_idempotencia(despacho):
+    """Clave de un despacho: la explícita o el id del trabajo que lo lleva.
+
+    No se deriva del contenido: dos viajes legítimos con los mismos datos son dos guías.
+    """
+    clave = despacho.get('clave_idempotencia') or despacho.get('id')
+    if not clave:
+        raise ValueError("El despacho no tiene clave_idempotencia ni id de trabajo")
+    return str(clave)
+
+
+def normalizar(texto):
+    """Mayúsculas y espacios colapsados, para comparar valores del listado por igualdad"""
+    return ' '.join(str(texto or '').upper().split())
+
+
+def separar_facturas(texto):
+    """Conjunto de números de factura de una celda o campo ('F-1, F-2' / 'F-1 / F-2')"""
+    return {f for f in re.split(r'[\s,;/]+', normalizar(texto)) if f}
+
+
+def parsear_despachos(html_content):
+    """Extraer las filas de la tabla 'LISTA DE GUÍAS DE DESPACHO' del HTML del componente"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    despachos = []
+    for fila in soup.select('#tabla-component tbody tr'):
+        celdas = [td.get_text(' ', strip=True) for td in fila.find_all('td')]
+        if len(celdas) < 7 or not celdas[1].isdigit():
+            continue
+        try:
+            emision = datetime.strptime(celdas[5], '%d/%m/%Y %I:%M:%S %p').timestamp()
+        except ValueError:
+            emision = None
+        despachos.append({
+            'nro_despacho': celdas[1],
+            'estatus': celdas[0],
+            'facturas': celdas[2],
+            'origen': celdas[3],
+            'destino': celdas[4],
+            'emision': emision,
+            'vencimiento': celdas[6],
+        })
+    return despachos
+
+
+class GuardiaIdempotencia:
+    """Registro local de resultados por clave con verificación contra el listado de despachos"""
+
+    CONFIRMADO = 'confirmado'
+    EN_CURSO = 'en_curso'
+    AMBIGUO = 'ambiguo'
+    FALLIDO = 'fallido'
+    REVISION = 'requiere_revision'
+
+    def __init__(self, ruta='sica_idempotencia.db', margen_emision=600):
+        self.ruta = ruta
+        # Segundos de tolerancia entre el inicio del intento y la emisión registrada en SICA
+        self.margen_emision = margen_emision
+        self._local = threading.local()
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS intentos (
+                clave TEXT PRIMARY KEY,
+                despacho TEXT NOT NULL,
+                estado TEXT NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                primer_intento REAL,
+                nro_despacho TEXT,
+                resultado TEXT,
+                actualizado REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS despachos (
+                nro_despacho TEXT PRIMARY KEY,
+                estatus TEXT,
+                facturas TEXT,
+                origen TEXT,
+                destino TEXT,
+                emision REAL,
+                vencimiento TEXT,
+                visto REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_despachos_emision ON despachos (emision);
+        """)
+
+    def _conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+            conexion.row_factory = sqlite3.Row
+            self._local.conexion = conexion
+        return conexion
+
+    # --- Copia local del listado de despachos ---
+
+    def indexar_despachos(self, despachos):
+        """Guardar/actualizar filas del listado en el índice local"""
+        ahora = time.time()
+        self._conexion().executemany(
+            "INSERT OR REPLACE INTO despachos (nro_despacho, estatus, facturas, origen, destino, emision, "
+            "vencimiento, visto) VALUES (:nro_despacho, :estatus, :facturas, :origen, :destino, :emision, "
+            ":vencimiento, :visto)",
+            [dict(d, visto=ahora) for d in despachos],
+        )
+        return len(despachos)
+
+    def sincronizar(self, bot):
+        """Traer la primera página del listado (las guías más recientes) e indexarla"""
+        # La tabla viene en effects.html: pedirlo aunque el bot descarte el HTML (conservar_html=False)
+        data = bot.get_despachos_data(conservar_html=True)
+        if not data or not data.html:
+            print("⚠️ No se pudo obtener el listado de despachos para verificar")
+            return None
+        n = self.indexar_despachos(parsear_despachos(data.html))
+        print(f"🔄 Listado de despachos sincronizado: {n} guías indexadas")
+        return n
+
+    def buscar_despacho(self, despacho, desde):
+        """Guía del índice que corresponde al despacho, emitida después de 'desde'.
+
+        Compara por igualdad de valores normalizados: todas las facturas del despacho deben
+        estar en la fila (y el destino, si viene, debe ser el mismo); "12" no coincide con "1234".
+        """
+        facturas = separar_facturas(despacho.get('facturas'))
+        if not facturas:
+            return None
+        destino = normalizar(despacho.get('destino'))
+        filas = self._conexion().execute(
+            "SELECT * FROM despachos WHERE emision IS NULL OR emision >= ? ORDER BY emision DESC",
+            (desde - self.margen_emision,),
+        )
+        for fila in filas:
+            if not facturas <= separar_facturas(fila['facturas']):
+                continue
+            if not destino or normalizar(fila['destino']) == destino:
+                return dict(fila)
+        return None
+
+    # --- Registro de intentos ---
+
+    def consultar(self, clave):
+        fila = self._conexion().execute("SELECT * FROM intentos WHERE clave = ?", (clave,)).fetchone()
+        return dict(fila) if fila else None
+
+    def _registrar(self, clave, despacho, estado, nro_despacho=None, resultado=None, nuevo_intento=False):
+        ahora = time.time()
+        self._conexion().execute(
+            "INSERT INTO intentos (clave, despacho, estado, intentos, primer_intento, nro_despacho, resultado, "
+            "actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(clave) DO UPDATE SET estado = excluded.estado, "
+            "intentos = intentos + excluded.intentos, "
+            "nro_despacho = COALESCE(excluded.nro_despacho, nro_despacho), "
+            "resultado = COALESCE(excluded.resultado, resultado), actualizado = excluded.actualizado",
+            (clave, json.dumps(despacho, ensure_ascii=False, default=str), estado, 1 if nuevo_intento else 0,
+             ahora, nro_despacho, json.dumps(resultado, ensure_ascii=False, default=str) if resultado else None, ahora),
+        )
+
+    def verificar(self, clave, despacho, bot):
+        """Sincronizar el listado y buscar la guía de un intento ambiguo; marca confirmado si aparece"""
+        registro = self.consultar(clave)
+        desde = registro['primer_intento'] if registro else time.time()
+        self.sincronizar(bot)
+        encontrado = self.buscar_despacho(despacho, desde)
+        if encontrado:
+            print(f"✅ La guía {encontrado['nro_despacho']} ya estaba registrada: no se reenvía")
+            self._registrar(clave, despacho, self.CONFIRMADO, nro_despacho=encontrado['nro_despacho'],
+                            resultado={'estado': 'COMPLETADO', 'verificado_en_listado': encontrado})
+        return encontrado
+
+    def ejecutar(self, despacho, enviar, bot, clave=None, estados_exitosos=('COMPLETADO',),
+                 estados_ambiguos=ESTADOS_AMBIGUOS):
+        """Ejecutar enviar() una sola vez por clave.
+
+        enviar: callable sin argumentos que registra el despacho y retorna un dict con 'estado'
+        (y 'nro_despacho' si lo conoce). clave: la del trabajo (por defecto clave_idempotencia).
+        Un fallo solo es ambiguo si el resultado o la excepción traen ESCRITURA_INICIADA; los
+        demás quedan como fallidos y se reintentan. Si un intento previo quedó ambiguo, primero
+        se verifica en el listado; sin datos para verificar (facturas) no se reenvía.
+        """
+        clave = str(clave) if clave else clave_idempotencia(despacho)
+        registro = self.consultar(clave)
+
+        if registro and registro['estado'] == self.CONFIRMADO:
+            print(f"♻️ Despacho {clave[:12]} ya confirmado (guía {registro['nro_despacho']}): no se reenvía")
+            return json.loads(registro['resultado']) if registro['resultado'] else {'estado': 'COMPLETADO'}
+
+        if registro and registro['estado'] in (self.EN_CURSO, self.AMBIGUO, self.REVISION):
+            if self.verificar(clave, despacho, bot):
+                return json.loads(self.consultar(clave)['resultado'])
+            # EN_CURSO solo dice que el worker cayó; sin escritura conocida se puede reenviar
+            if registro['estado'] != self.EN_CURSO and not separar_facturas(despacho.get('facturas')):
+                print(f"⚠️ Despacho {clave[:12]} quedó ambiguo y no tiene facturas para verificarlo")
+                self._registrar(clave, despacho, self.REVISION)
+                return {'estado': 'REQUIERE_REVISION', 'clave': clave}
+
+        self._registrar(clave, despacho, self.EN_CURSO, nuevo_intento=True)
+        try:
+            resultado = enviar()
+        except (requests.RequestException, TimeoutError) as e:
+            if not getattr(e, ESCRITURA_INICIADA, False):
+                self._registrar(clave, despacho, self.FALLIDO)
+                raise
+            # No sabemos si SICA registró la guía
+            print(f"⚠️ Fallo ambiguo enviando despacho {clave[:12]}: {e}")
+            self._registrar(clave, despacho, self.AMBIGUO)
+            if self.verificar(clave, despacho, bot):
+                return json.loads(self.consultar(clave)['resultado'])
+            raise
+
+        estado = resultado.get('estado')
+        if estado in estados_exitosos:
+            self._registrar(clave, despacho, self.CONFIRMADO, nro_despacho=resultado.get('nro_despacho'),
+                            resultado=resultado)
+        elif estado in estados_ambiguos and resultado.get(ESCRITURA_INICIADA):
+            self._registrar(clave, despacho, self.AMBIGUO, resultado=resultado)
+            if self.verificar(clave, despacho, bot):
+                return json.loads(self.consultar(clave)['resultado'])
+        else:
+            self._registrar(clave, despacho, self.FALLIDO, resultado=resultado)
+        resultado['clave'] = clave
+        return resultado
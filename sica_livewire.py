@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+SICA Livewire - Envoltorio de respuestas Livewire
+Decodifica el JSON de /api/app/{component} una sola vez al recibirlo, descarta el fragmento
+HTML si no se pidió y construye el árbol HTML solo cuando se accede
+"""
+
+import json
+
+
+class LivewireResponse:
+    """Respuesta de Livewire decodificada una vez, sin el cuerpo crudo; el árbol HTML es perezoso"""
+
+    def __init__(self, response, conservar_html=True):
+        contenido = response.content or b''
+        self.status_code = response.status_code
+        self.bytes_recibidos = len(contenido)
+        # Un solo json.loads (el decodificador C); un JSON inválido falla aquí, dentro del
+        # try/except json.JSONDecodeError de cada paso del bot
+        payload = json.loads(contenido)
+        effects = payload.get('effects') or {}
+        html = effects.pop('html', None)
+        # Solo retener el fragmento HTML si el llamador lo pidió; el cuerpo crudo no se guarda
+        self._html = html if conservar_html else None
+        self._payload = payload
+        self._html_tree = None
+
+    @property
+    def server_memo(self):
+        """serverMemo completo de la respuesta"""
+        return self._payload.get('serverMemo', {})
+
+    @property
+    def checksum(self):
+        """Checksum del serverMemo devuelto por el servidor"""
+        return self.server_memo.get('checksum')
+
+    @property
+    def data(self):
+        """serverMemo.data de la respuesta"""
+        return self.server_memo.get('data', {})
+
+    @property
+    def effects(self):
+        """effects sin el fragmento HTML"""
+        return self._payload.get('effects', {})
+
+    @property
+    def emits(self):
+        """Eventos emitidos por el componente (alertas, etc.)"""
+        return self.effects.get('emits', [])
+
+    @property
+    def html(self):
+        """Fragmento HTML crudo (None si no se conservó)"""
+        return self._html
+
+    @property
+    def html_tree(self):
+        """Árbol BeautifulSoup del fragmento HTML, construido solo al acceder"""
+        if self._html_tree is None:
+            if self._html is None:
+                return None
+            from bs4 import BeautifulSoup
+            self._html_tree = BeautifulSoup(self._html, 'html.parser')
+        return self._html_tree
+
+    def alerta(self, tipo=None):
+        """Primer evento 'alert' emitido, opcionalmente filtrado por tipo (success, error...)"""
+        for emit in self.emits:
+            params = emit.get('params', [])
+            if emit.get('event') == 'alert' and (tipo is None or (params and params[0] == tipo)):
+                return emit
+        return None
+
+    def resumen(self):
+        """Resumen corto para logging sin volcar el cuerpo completo"""
+        return (f"checksum={str(self.checksum)[:20]}... "
+                f"data_keys={list(self.data.keys())} "
+                f"emits={len(self.emits)} bytes={self.bytes_recibidos}")
+
+    def to_dict(self):
+        """Diccionario equivalente a response.json() (incluye effects.html si se conservó)"""
+        if self._html is None:
+            return self._payload
+        completo = dict(self._payload)
+        completo['effects'] = dict(self.effects, html=self._html)
+        return completo
+
+    # Compatibilidad con el código que trataba la respuesta como dict
+    def get(self, key, default=None):
+        if key == 'effects' and self._html is not None:
+            return self.to_dict().get(key, default)
+        return self._payload.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self._payload
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+SICA Perfil - Perfilado de CPU y memoria por operación lógica del bot
+cProfile, un perfilador por muestreo de pilas y snapshots de tracemalloc, activables con
+SICA_PERFIL (o --perfil); los reportes van al almacén de artefactos. Desactivado, cada
+operación cuesta una comparación con None
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MODOS = ('cprofile', 'muestreo', 'memoria')
+
+
+def _snapshot():
+    # Sin las asignaciones del propio tracemalloc ni del perfilador
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def parsear_modos(valor):
+    """'1'/'todo' -> todos los modos; 'cprofile,memoria' -> esos; ''/'0' -> ninguno"""
+    valor = (valor or '').strip().lower()
+    if valor in ('', '0', 'no'):
+        return ()
+    if valor in ('1', 'si', 'todo'):
+        return MODOS
+    modos = tuple(m.strip() for m in valor.split(',') if m.strip())
+    desconocidos = [m for m in modos if m not in MODOS]
+    if desconocidos:
+        raise ValueError(f"Modos de perfil desconocidos: {', '.join(desconocidos)} (use {', '.join(MODOS)})")
+    return modos
+
+
+class _PerfilOperacion:
+    """Acumulado de una operación: tiempos, estadísticas cProfile, pilas muestreadas y asignaciones"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+        self.stats = None
+        self.pilas = Counter()
+        self.asignaciones = Counter()
+        self.bytes_netos = 0
+
+
+class Perfilador:
+    """Perfila la operación más externa de cada hilo (las anidadas quedan dentro de su perfil)"""
+
+    def __init__(self, modos=MODOS, intervalo_muestreo=0.005, top=30):
+        self.modos = tuple(modos)
+        self.intervalo_muestreo = intervalo_muestreo
+        self.top = top
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operaciones = {}
+        # Hilos con una operación en curso: id de hilo -> nombre de operación
+        self._activos = {}
+        self._detener = threading.Event()
+        if 'memoria' in self.modos and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        if 'muestreo' in self.modos:
+            threading.Thread(target=self._muestrear, daemon=True).start()
+        print(f"🔬 Perfilado activo: {', '.join(self.modos)}")
+
+    def _perfil(self, operacion):
+        perfil = self._operaciones.get(operacion)
+        if perfil is None:
+            perfil = _PerfilOperacion()
+            self._operaciones[operacion] = perfil
+        return perfil
+
+    def ejecutar(self, operacion, fn, *args, **kwargs):
+        """Ejecutar fn perfilada como 'operacion'"""
+        profundidad = getattr(self._local, 'profundidad', 0)
+        if profundidad:
+            # Anidada: ya la cubre el perfil de la operación externa; solo se cuenta el tiempo
+            self._local.profundidad = profundidad + 1
+            inicio = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._local.profundidad = profundidad
+                self._acumular(operacion, time.perf_counter() - inicio)
+
+        self._local.profundidad = 1
+        hilo = threading.get_ident()
+        perfilador = cProfile.Profile() if 'cprofile' in self.modos else None
+        antes = _snapshot() if 'memoria' in self.modos else None
+        with self._lock:
+            self._activos[hilo] = operacion
+        inicio = time.perf_counter()
+        try:
+            if perfilador is not None:
+                try:
+                    perfilador.enable()
+                except ValueError:
+                    # Python 3.12+: un solo cProfile activo por proceso; este hilo va sin cProfile
+                    perfilador = None
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                if perfilador is not None:
+                    perfilador.disable()
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self._activos.pop(hilo, None)
+            self._local.profundidad = 0
+            despues = _snapshot() if antes is not None else None
+            self._acumular(operacion, duracion, perfilador, antes, despues)
+
+    def _acumular(self, operacion, duracion, perfilador=None, antes=None, despues=None):
+        diferencias = despues.compare_to(antes, 'lineno') if despues is not None else ()
+        with self._lock:
+            perfil = self._perfil(operacion)
+            perfil.llamadas += 1
+            perfil.segundos += duracion
+            perfil.maximo = max(perfil.maximo, duracion)
+            if perfilador is not None:
+                if perfil.stats is None:
+                    perfil.stats = pstats.Stats(perfilador)
+                else:
+                    perfil.stats.add(perfilador)
+            for diferencia in diferencias:
+                if diferencia.size_diff > 0:
+                    frame = diferencia.traceback[0]
+                    perfil.asignaciones[f"{frame.filename}:{frame.lineno}"] += diferencia.size_diff
+                perfil.bytes_netos += diferencia.size_diff
+
+    def _muestrear(self):
+        """Cada intervalo, registrar la pila de los hilos que están dentro de una operación"""
+        while not self._detener.wait(self.intervalo_muestreo):
+            with self._lock:
+                activos = dict(self._activos)
+            if not activos:
+                continue
+            frames = sys._current_frames()
+            for hilo, operacion in activos.items():
+                frame = frames.get(hilo)
+                pila = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                    frame = frame.f_back
+                if pila:
+                    with self._lock:
+                        self._perfil(operacion).pilas[';'.join(reversed(pila))] += 1
+
+    # --- Reportes ---
+
+    def _reporte(self, operacion, perfil):
+        salida = io.StringIO()
+        promedio = perfil.segundos / perfil.llamadas if perfil.llamadas else 0.0
+        salida.write(f"Operación: {operacion}\n")
+        salida.write(f"Llamadas: {perfil.llamadas}  total: {perfil.segundos:.3f}s  "
+                     f"promedio: {promedio * 1000:.1f}ms  máximo: {perfil.maximo * 1000:.1f}ms\n")
+        if perfil.stats is not None:
+            salida.write("\n=== cProfile (por tiempo acumulado) ===\n")
+            stats = pstats.Stats(stream=salida)
+            stats.add(perfil.stats)
+            stats.sort_stats('cumulative').print_stats(self.top)
+        if perfil.pilas:
+            total = sum(perfil.pilas.values())
+            salida.write(f"\n=== Muestreo ({total} muestras, función más interna) ===\n")
+            hojas = Counter()
+            for pila, muestras in perfil.pilas.items():
+                hojas[pila.rsplit(';', 1)[-1]] += muestras
+            for funcion, muestras in hojas.most_common(self.top):
+                salida.write(f"{muestras / total:6.1%}  {funcion}\n")
+        if perfil.asignaciones or perfil.bytes_netos:
+            salida.write("\n=== Memoria (tracemalloc, incluye otros hilos concurrentes) ===\n")
+            salida.write(f"Bytes netos retenidos: {perfil.bytes_netos}\n")
+            for linea, tamano in perfil.asignaciones.most_common(self.top):
+                salida.write(f"{tamano:>12d} B  {linea}\n")
+        return salida.getvalue()
+
+    def volcar(self, artefactos):
+        """Escribir un reporte por operación (y sus pilas en formato folded) en el almacén"""
+        with self._lock:
+            operaciones = list(self._operaciones.items())
+        for operacion, perfil in operaciones:
+            with self._lock:
+                texto = self._reporte(operacion, perfil)
+                pilas = '\n'.join(f"{pila} {n}" for pila, n in perfil.pilas.most_common())
+            artefactos.guardar(f"perfil_{operacion}.txt", texto, clave='perfil')
+            if pilas:
+                # Formato 'folded' de flamegraph.pl / speedscope
+                artefactos.guardar(f"perfil_{operacion}.folded", pilas, clave='perfil')
+        if operaciones:
+            print(f"🔬 Perfiles de {len(operaciones)} operaciones guardados como artefactos 'perfil_*'")
+
+    def resumen(self):
+        with self._lock:
+            return {operacion: {'llamadas': p.llamadas, 'segundos': round(p.segundos, 3),
+                                'maximo': round(p.maximo, 3)}
+                    for operacion, p in self._operaciones.items()}
+
+
+def perfilado(metodo):
+    """Decorador para métodos de SICABot: los perfila (con su nombre) si self.perfilador está activo"""
+    operacion = metodo.__name__
+
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        perfilador = self.perfilador
+        if perfilador is None:
+            return metodo(self, *args, **kwargs)
+        return perfilador.ejecutar(operacion, metodo, self, *args, **kwargs)
+    return envoltura
+
+
+_perfilador_compartido = None
+_perfilador_configurado = False
+_perfilador_lock = threading.Lock()
+
+
+def configurar_perfil(modos):
+    """Activar el perfilado del proceso (p. ej. desde un flag --perfil); modos vacío lo desactiva"""
+    global _perfilador_compartido, _perfilador_configurado
+    if isinstance(modos, str):
+        modos = parsear_modos(modos)
+    with _perfilador_lock:
+        _perfilador_compartido = Perfilador(modos) if modos else None
+        _perfilador_configurado = True
+        return _perfilador_compartido
+
+
+def perfilador_compartido():
+    """Perfilador único del proceso según SICA_PERFIL; None si el perfilado está desactivado"""
+    global _perfilador_compartido, _perfilador_configurado
+    with _perfilador_lock:
+        if not _perfilador_configurado:
+            modos = parsear_modos(os.environ.get('SICA_PERFIL'))
+            _perfilador_compartido = Perfilador(modos) if modos else None
+            _perfilador_configurado = True
+        return _perfilador_compartido
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+SICA Planificador - Orden de despachos por prioridad y plazo
+Clases de prioridad con earliest-deadline-first dentro de cada clase, capacidad
+reservada para urgentes bajo carga y reporte de plazos incumplidos
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+# Clases de prioridad: menor valor, antes se atiende
+PRIORIDADES = {'urgente': 0, 'normal': 1, 'masivo': 2}
+
+
+def clase_prioridad(prioridad):
+    """Normalizar una prioridad (nombre o número) a su nombre de clase"""
+    if prioridad is None:
+        return 'normal'
+    if isinstance(prioridad, int):
+        for nombre, valor in PRIORIDADES.items():
+            if valor == prioridad:
+                return nombre
+    if isinstance(prioridad, str) and prioridad in PRIORIDADES:
+        return prioridad
+    raise ValueError(f"Prioridad desconocida: {prioridad} (use {', '.join(PRIORIDADES)})")
+
+
+class PlanificadorDespachos:
+    """Cola en memoria EDF por clase de prioridad, usable por cualquier pool de workers.
+
+    Los workers llaman get() / terminar(item) en lugar de get() / task_done(). Con
+    reserva_urgente=N, los trabajos no urgentes nunca ocupan los últimos N de los
+    'capacidad' workers, que quedan libres para trabajo urgente.
+    """
+
+    def __init__(self, capacidad, reserva_urgente=1):
+        self.capacidad = capacidad
+        self.reserva_urgente = min(reserva_urgente, max(0, capacidad - 1))
+        self._heap = []
+        self._secuencia = itertools.count()
+        self._metadatos = {}
+        self._en_proceso = {clase: 0 for clase in PRIORIDADES}
+        self._sin_terminar = 0
+        self._cond = threading.Condition()
+        self.vencidos_recientes = deque(maxlen=100)
+        self.stats = {clase: {'encolados': 0, 'terminados': 0, 'en_plazo': 0, 'vencidos': 0} for clase in PRIORIDADES}
+
+    def put(self, item, prioridad='normal', plazo=None):
+        """Encolar un item hashable (p. ej. el id del trabajo); plazo es un timestamp epoch"""
+        clase = clase_prioridad(prioridad)
+        with self._cond:
+            self._metadatos[item] = {'clase': clase, 'plazo': plazo, 'encolado': time.time()}
+            heapq.heappush(self._heap, (PRIORIDADES[clase], plazo if plazo is not None else float('inf'),
+                                        next(self._secuencia), item))
+            self._sin_terminar += 1
+            self.stats[clase]['encolados'] += 1
+            self._cond.notify_all()
+
+    def _elegible(self, clase):
+        if clase == 'urgente':
+            return True
+        no_urgentes = sum(n for c, n in self._en_proceso.items() if c != 'urgente')
+        return no_urgentes < self.capacidad - self.reserva_urgente
+
+    def get(self, timeout=None):
+        """Siguiente item según prioridad y plazo; queue.Empty si no hay uno elegible a tiempo"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._heap:
+                    item = self._heap[0][3]
+                    clase = self._metadatos[item]['clase']
+                    if self._elegible(clase):
+                        heapq.heappop(self._heap)
+                        self._en_proceso[clase] += 1
+                        self._metadatos[item]['iniciado'] = time.time()
+                        return item
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    raise queue.Empty
+                self._cond.wait(restante)
+
+    def terminar(self, item):
+        """Marcar un item como terminado; retorna True/False si cumplió su plazo (None sin plazo)"""
+        with self._cond:
+            meta = self._metadatos.pop(item, None)
+            if meta is None:
+                return None
+            clase = meta['clase']
+            self._en_proceso[clase] -= 1
+            self._sin_terminar -= 1
+            self.stats[clase]['terminados'] += 1
+            cumplido = None
+            if meta['plazo'] is not None:
+                retraso = time.time() - meta['plazo']
+                cumplido = retraso <= 0
+                if cumplido:
+                    self.stats[clase]['en_plazo'] += 1
+                else:
+                    self.stats[clase]['vencidos'] += 1
+                    self.vencidos_recientes.append({'item': item, 'clase': clase, 'retraso': retraso})
+            self._cond.notify_all()
+            return cumplido
+
+    def qsize(self):
+        with self._cond:
+            return len(self._heap)
+
+    def join(self):
+        with self._cond:
+            while self._sin_terminar:
+                self._cond.wait()
+
+    def metricas(self):
+        ahora = time.time()
+        with self._cond:
+            pendientes = {clase: 0 for clase in PRIORIDADES}
+            vencidos_en_cola = 0
+            for _, plazo, _, item in self._heap:
+                pendientes[self._metadatos[item]['clase']] += 1
+                if plazo < ahora:
+                    vencidos_en_cola += 1
+            return {
+                'capacidad': self.capacidad,
+                'reserva_urgente': self.reserva_urgente,
+                'pendientes': pendientes,
+                'en_proceso': dict(self._en_proceso),
+                'vencidos_en_cola': vencidos_en_cola,
+                'por_clase': {clase: dict(s) for clase, s in self.stats.items()},
+                'vencidos_recientes': list(self.vencidos_recientes)[-10:],
+            }
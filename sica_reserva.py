@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+SICA Reserva - Sesiones en espera activa con componentes de registro ya cargados
+Mantiene N sesiones logueadas, cada una con componentes de /despachos/registrar
+extraídos de antemano, para que un despacho nuevo arranque directo en el RPC Livewire
+"""
+
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sica_bot import SICABot
+
+
+class ComponenteListo:
+    """Componente de registro recién extraído, listo para un despacho (uso único)"""
+
+    def __init__(self, sesion, component_data):
+        self.sesion = sesion
+        self.component_data = component_data
+        self.creado = time.monotonic()
+
+    @property
+    def bot(self):
+        return self.sesion.bot
+
+
+class _SesionReserva:
+    """Sesión logueada de la reserva con su stock de componentes"""
+
+    def __init__(self, indice):
+        self.indice = indice
+        self.bot = SICABot(conservar_html=False)
+        self.componentes = deque()
+        self.reponiendo = 0
+        self.ultimo_ping = time.monotonic()
+        self.ultimo_intento_login = 0.0
+        self.login_lock = threading.Lock()
+
+
+class ReservaSesiones:
+    """Sesiones SICA en caliente: login, componentes precargados, keep-alive y reposición en segundo plano"""
+
+    def __init__(self, cuentas, sesiones=1, componentes_por_sesion=2, intervalo_keepalive=120.0,
+                 edad_maxima_componente=900.0, reintento_login=30.0):
+        self.cuentas = cuentas
+        self.componentes_por_sesion = componentes_por_sesion
+        self.intervalo_keepalive = intervalo_keepalive
+        # Componentes más viejos que esto se descartan (serverMemo/CSRF potencialmente vencidos)
+        self.edad_maxima_componente = edad_maxima_componente
+        self.reintento_login = reintento_login
+
+        self.sesiones = [_SesionReserva(i) for i in range(sesiones)]
+        for sesion in self.sesiones:
+            # Los duplicados de búsquedas (hedging) van sobre un componente de la misma sesión
+            sesion.bot.componente_repuesto = functools.partial(self.tomar_repuesto, sesion)
+        self._lock = threading.Condition()
+        self._detener = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, sesiones * componentes_por_sesion),
+                                            thread_name_prefix='reserva')
+        self._hilo = None
+        self._esperas = deque(maxlen=500)
+        self.stats = {'tomados': 0, 'sin_espera': 0, 'repuestos': 0, 'descartados': 0, 'pings': 0, 'relogins': 0,
+                      'para_hedge': 0}
+
+    # --- Ciclo de vida ---
+
+    def iniciar(self):
+        """Loguear las sesiones, precargar componentes y arrancar el mantenimiento"""
+        print(f"🔥 Preparando reserva: {len(self.sesiones)} sesiones × {self.componentes_por_sesion} componentes...")
+        # Los logins de sesiones distintas son independientes: en paralelo
+        list(self._executor.map(self._login, self.sesiones))
+        self._reponer_todo()
+        self._hilo = threading.Thread(target=self._mantenimiento, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        with self._lock:
+            self._lock.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for sesion in self.sesiones:
+            sesion.componentes.clear()
+            sesion.bot.logout()
+            if sesion.bot.cuenta is not None:
+                self.cuentas.liberar(sesion.bot.cuenta)
+                sesion.bot.cuenta = None
+
+    @property
+    def bots(self):
+        return [sesion.bot for sesion in self.sesiones]
+
+    # --- Checkout ---
+
+    def tomar(self, timeout=120):
+        """Sacar un componente listo (de la sesión cuya cuenta tiene más presupuesto) y reponerlo"""
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        with self._lock:
+            while not self._detener.is_set():
+                self._descartar_viejos()
+                candidatas = [s for s in self.sesiones if s.componentes and s.bot.logged_in]
+                if candidatas:
+                    sesion = max(candidatas, key=lambda s: s.bot.cuenta.disponible() if s.bot.cuenta else 0)
+                    componente = sesion.componentes.popleft()
+                    espera = time.monotonic() - inicio
+                    self._esperas.append(espera)
+                    self.stats['tomados'] += 1
+                    if espera < 0.01:
+                        self.stats['sin_espera'] += 1
+                    self._programar_reposicion(sesion)
+                    return componente
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._lock.wait(min(restante, 1.0))
+        return None
+
+    def tomar_repuesto(self, sesion):
+        """component_data de un componente listo de la sesión, sin esperar (None si no hay).
+
+        Lo usa el hedging de búsquedas: el componente queda consumido y se repone.
+        """
+        with self._lock:
+            self._descartar_viejos()
+            if not sesion.componentes or not sesion.bot.logged_in:
+                return None
+            componente = sesion.componentes.popleft()
+            self.stats['para_hedge'] += 1
+            self._programar_reposicion(sesion)
+            return componente.component_data
+
+    # --- Reposición ---
+
+    def _programar_reposicion(self, sesion):
+        """Completar el stock de la sesión en segundo plano (llamar con el lock tomado)"""
+        if self._detener.is_set() or not sesion.bot.logged_in:
+            return
+        faltan = self.componentes_por_sesion - len(sesion.componentes) - sesion.reponiendo
+        for _ in range(max(0, faltan)):
+            sesion.reponiendo += 1
+            self._executor.submit(self._reponer, sesion)
+
+    def _reponer(self, sesion):
+        component_data = None
+        try:
+            component_data = sesion.bot.navigate_to_despachos_registrar()
+        except Exception as e:
+            print(f"⚠️ Error reponiendo componente en sesión {sesion.indice}: {e}")
+        with self._lock:
+            sesion.reponiendo -= 1
+            if component_data:
+                sesion.componentes.append(ComponenteListo(sesion, component_data))
+                sesion.ultimo_ping = time.monotonic()
+                self.stats['repuestos'] += 1
+                self._lock.notify_all()
+
+    def _reponer_todo(self):
+        with self._lock:
+            for sesion in self.sesiones:
+                self._programar_reposicion(sesion)
+
+    def _descartar_viejos(self):
+        ahora = time.monotonic()
+        for sesion in self.sesiones:
+            while sesion.componentes and ahora - sesion.componentes[0].creado > self.edad_maxima_componente:
+                sesion.componentes.popleft()
+                self.stats['descartados'] += 1
+            self._programar_reposicion(sesion)
+
+    # --- Sesiones ---
+
+    def _login(self, sesion):
+        """(Re)loguear una sesión con una cuenta del pool; un solo login por sesión a la vez"""
+        with sesion.login_lock:
+            if sesion.bot.cuenta is not None and sesion.bot.cuenta.en_cuarentena():
+                print(f"🔄 Cuenta {sesion.bot.cuenta.usuario} en cuarentena, cambiando de cuenta...")
+                sesion.bot.logout()
+            if sesion.bot.logged_in:
+                return True
+            if sesion.bot.cuenta is not None:
+                self.cuentas.liberar(sesion.bot.cuenta)
+                sesion.bot.cuenta = None
+            sesion.ultimo_intento_login = time.monotonic()
+            if not self.cuentas.login(sesion.bot):
+                print(f"⚠️ Sesión {sesion.indice} no disponible; se reintentará el login")
+                return False
+            sesion.ultimo_ping = time.monotonic()
+            return True
+
+    def _ping(self, sesion):
+        """Keep-alive: /despachos no debe redirigir al login"""
+        bot = sesion.bot
+        self.stats['pings'] += 1
+        try:
+            response = bot._request('GET', 'despachos', f"{bot.base_url}/despachos", timeout=30)
+            return response.status_code == 200 and '/login' not in response.url
+        except Exception:
+            return False
+
+    def _mantenimiento(self):
+        while not self._detener.wait(5):
+            for sesion in self.sesiones:
+                ahora = time.monotonic()
+                bot = sesion.bot
+                cuarentena = bot.cuenta is not None and bot.cuenta.en_cuarentena()
+                if not bot.logged_in or cuarentena:
+                    if ahora - sesion.ultimo_intento_login < self.reintento_login:
+                        continue
+                    with self._lock:
+                        sesion.componentes.clear()
+                    self.stats['relogins'] += 1
+                    if self._login(sesion):
+                        with self._lock:
+                            self._programar_reposicion(sesion)
+                elif ahora - sesion.ultimo_ping > self.intervalo_keepalive:
+                    sesion.ultimo_ping = ahora
+                    if not self._ping(sesion):
+                        print(f"⚠️ Sesión {sesion.indice} expiró; se volverá a loguear")
+                        bot.logged_in = False
+                        with self._lock:
+                            sesion.componentes.clear()
+            with self._lock:
+                self._descartar_viejos()
+
+    def metricas(self):
+        with self._lock:
+            esperas = sorted(self._esperas)
+            return dict(
+                self.stats,
+                sesiones_activas=sum(1 for s in self.sesiones if s.bot.logged_in),
+                componentes_listos=sum(len(s.componentes) for s in self.sesiones),
+                reponiendo=sum(s.reponiendo for s in self.sesiones),
+                # Segundos desde las credenciales hasta el componente listo, último login de cada sesión
+                calentamiento=[s.bot.calentamiento.get('total') for s in self.sesiones],
+                espera_p50=esperas[len(esperas) // 2] if esperas else None,
+                espera_p99=esperas[int(len(esperas) * 0.99)] if esperas else None,
+            )
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+SICA Resiliencia - Protección del bot frente a degradaciones del servidor SICA
+Circuit breakers por clase de endpoint y timeouts adaptativos por operación
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class CircuitoAbierto(Exception):
+    """El circuito sigue abierto tras agotar el tiempo máximo de espera"""
+
+
+class CircuitBreaker:
+    """Circuit breaker con estados cerrado/abierto/semiabierto y requests de sondeo.
+
+    Mientras el circuito está abierto, los requests se estacionan (esperan) en lugar
+    de fallar; al vencer el tiempo de apertura se deja pasar un sondeo y, si es sano,
+    el circuito se cierra y se libera el trabajo estacionado.
+    """
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, nombre, umbral_fallos=5, tiempo_apertura=30.0, tiempo_apertura_maximo=300.0,
+                 max_sondeos=1, max_estacionamiento=None):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura_inicial = tiempo_apertura
+        self.tiempo_apertura_maximo = tiempo_apertura_maximo
+        self.max_sondeos = max_sondeos
+        # Tiempo máximo que un request espera estacionado (None = sin límite)
+        self.max_estacionamiento = max_estacionamiento
+
+        self._cond = threading.Condition()
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.tiempo_apertura = tiempo_apertura
+        self.abierto_desde = None
+        self.sondeos_en_vuelo = 0
+        self.estacionados = 0
+        self.stats = {'aperturas': 0, 'sondeos': 0, 'estacionados_total': 0, 'rechazados': 0}
+
+    def _actualizar_estado(self):
+        if self.estado == self.ABIERTO and time.monotonic() - self.abierto_desde >= self.tiempo_apertura:
+            self.estado = self.SEMIABIERTO
+            self.sondeos_en_vuelo = 0
+            print(f"🟡 Circuito '{self.nombre}' semiabierto: enviando sondeo")
+
+    def _puede_pasar(self):
+        self._actualizar_estado()
+        if self.estado == self.CERRADO:
+            return True
+        if self.estado == self.SEMIABIERTO and self.sondeos_en_vuelo < self.max_sondeos:
+            return True
+        return False
+
+    def antes_de_request(self):
+        """Esperar (estacionado) hasta que el circuito permita el request.
+
+        Retorna True si el request pasa como sondeo del estado semiabierto.
+        """
+        limite = None if self.max_estacionamiento is None else time.monotonic() + self.max_estacionamiento
+        with self._cond:
+            if not self._puede_pasar():
+                self.estacionados += 1
+                self.stats['estacionados_total'] += 1
+                print(f"⏸️ Circuito '{self.nombre}' abierto: trabajo estacionado hasta que SICA se recupere")
+                try:
+                    while not self._puede_pasar():
+                        espera = 1.0
+                        if self.estado == self.ABIERTO:
+                            espera = max(0.05, self.tiempo_apertura - (time.monotonic() - self.abierto_desde))
+                        if limite is not None:
+                            restante = limite - time.monotonic()
+                            if restante <= 0:
+                                self.stats['rechazados'] += 1
+                                raise CircuitoAbierto(f"Circuito '{self.nombre}' abierto")
+                            espera = min(espera, restante)
+                        # Espera acotada para que Ctrl-C siga funcionando
+                        self._cond.wait(min(espera, 1.0))
+                finally:
+                    self.estacionados -= 1
+
+            if self.estado == self.SEMIABIERTO:
+                self.sondeos_en_vuelo += 1
+                self.stats['sondeos'] += 1
+                return True
+            return False
+
+    def registrar_exito(self, sondeo=False):
+        """Registrar un request sano; un sondeo sano cierra el circuito"""
+        with self._cond:
+            self.fallos_consecutivos = 0
+            if sondeo:
+                self.sondeos_en_vuelo = max(0, self.sondeos_en_vuelo - 1)
+            if self.estado == self.SEMIABIERTO:
+                self.estado = self.CERRADO
+                self.tiempo_apertura = self.tiempo_apertura_inicial
+                print(f"🟢 Circuito '{self.nombre}' cerrado: SICA respondió al sondeo")
+                self._cond.notify_all()
+
+    def registrar_fallo(self, sondeo=False):
+        """Registrar un fallo; abre el circuito al superar el umbral o si falla un sondeo"""
+        with self._cond:
+            self.fallos_consecutivos += 1
+            if sondeo:
+                self.sondeos_en_vuelo = max(0, self.sondeos_en_vuelo - 1)
+            if self.estado == self.SEMIABIERTO:
+                # El sondeo falló: reabrir con tiempo de apertura creciente
+                self.tiempo_apertura = min(self.tiempo_apertura * 2, self.tiempo_apertura_maximo)
+                self._abrir()
+            elif self.estado == self.CERRADO and self.fallos_consecutivos >= self.umbral_fallos:
+                self._abrir()
+
+    def _abrir(self):
+        self.estado = self.ABIERTO
+        self.abierto_desde = time.monotonic()
+        self.stats['aperturas'] += 1
+        print(f"🔴 Circuito '{self.nombre}' abierto por {self.tiempo_apertura:.0f}s "
+              f"({self.fallos_consecutivos} fallos consecutivos)")
+
+    def metricas(self):
+        """Estado y contadores del circuito"""
+        with self._cond:
+            self._actualizar_estado()
+            return dict(self.stats, estado=self.estado, fallos_consecutivos=self.fallos_consecutivos,
+                        estacionados=self.estacionados, tiempo_apertura=self.tiempo_apertura)
+
+
+class GrupoCircuitos:
+    """Un CircuitBreaker por clase de endpoint (login, registrar, livewire)"""
+
+    def __init__(self, **opciones):
+        self._opciones = opciones
+        self._lock = threading.Lock()
+        self._circuitos = {}
+
+    def circuito(self, clase):
+        with self._lock:
+            circuito = self._circuitos.get(clase)
+            if circuito is None:
+                circuito = CircuitBreaker(clase, **self._opciones)
+                self._circuitos[clase] = circuito
+            return circuito
+
+    def metricas(self):
+        with self._lock:
+            circuitos = dict(self._circuitos)
+        return {clase: circuito.metricas() for clase, circuito in circuitos.items()}
+
+
+_circuitos_compartidos = None
+_circuitos_lock = threading.Lock()
+
+
+def circuitos_compartidos():
+    """Grupo de circuitos único del proceso, compartido por todas las instancias de SICABot"""
+    global _circuitos_compartidos
+    with _circuitos_lock:
+        if _circuitos_compartidos is None:
+            _circuitos_compartidos = GrupoCircuitos()
+        return _circuitos_compartidos
+
+
+# Piso, techo y valor inicial (s) del timeout de lectura por clase de endpoint
+LIMITES_TIMEOUT = {
+    'login': {'piso': 5.0, 'techo': 60.0, 'inicial': 30.0},
+    'registrar': {'piso': 5.0, 'techo': 90.0, 'inicial': 45.0},
+    'livewire': {'piso': 3.0, 'techo': 60.0, 'inicial': 30.0},
+    None: {'piso': 3.0, 'techo': 30.0, 'inicial': 15.0},
+}
+
+
+class _LatenciasOperacion:
+    """Ventana deslizante de latencias de una operación"""
+
+    def __init__(self, ventana):
+        self.latencias = deque(maxlen=ventana)
+        self.requests = 0
+        self.expirados = 0
+
+    def percentil(self, p):
+        valores = sorted(self.latencias)
+        return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else None
+
+
+class TimeoutsAdaptativos:
+    """Timeout de lectura por operación = multiplo × p99 observado, acotado entre piso y techo.
+
+    Los requests que expiran entran a la ventana con el timeout que tenían: si una
+    operación se vuelve legítimamente lenta, su p99 sube y el timeout se relaja hasta
+    el techo en lugar de seguir cortándola. Hasta reunir min_muestras se usa el valor
+    inicial de la clase de endpoint.
+    """
+
+    def __init__(self, multiplo=3.0, ventana=200, min_muestras=20, timeout_conexion=10.0, limites=None):
+        self.multiplo = multiplo
+        self.ventana = ventana
+        self.min_muestras = min_muestras
+        self.timeout_conexion = timeout_conexion
+        self.limites = limites or LIMITES_TIMEOUT
+        self._lock = threading.Lock()
+        self._operaciones = {}
+        self._clases = {}
+
+    def _estado(self, operacion):
+        estado = self._operaciones.get(operacion)
+        if estado is None:
+            estado = _LatenciasOperacion(self.ventana)
+            self._operaciones[operacion] = estado
+        return estado
+
+    def _limites(self, operacion):
+        return self.limites.get(self._clases.get(operacion), self.limites[None])
+
+    def _lectura(self, operacion):
+        estado = self._estado(operacion)
+        limites = self._limites(operacion)
+        if len(estado.latencias) < self.min_muestras:
+            return limites['inicial']
+        return min(limites['techo'], max(limites['piso'], self.multiplo * estado.percentil(0.99)))
+
+    def timeout(self, operacion, clase=None):
+        """(timeout de conexión, timeout de lectura) para pasar a requests"""
+        with self._lock:
+            self._clases.setdefault(operacion, clase)
+            return (self.timeout_conexion, self._lectura(operacion))
+
+    def percentil(self, operacion, p):
+        """Percentil p de la latencia observada; None mientras no haya min_muestras"""
+        with self._lock:
+            estado = self._operaciones.get(operacion)
+            if estado is None or len(estado.latencias) < self.min_muestras:
+                return None
+            return estado.percentil(p)
+
+    def registrar(self, operacion, latencia, expirado=False, timeout=None):
+        """Registrar la latencia de un request terminado (o el timeout con el que expiró)"""
+        with self._lock:
+            estado = self._estado(operacion)
+            estado.requests += 1
+            if expirado:
+                estado.expirados += 1
+                latencia = max(latencia, timeout or 0.0)
+            estado.latencias.append(latencia)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                operacion: {
+                    'requests': estado.requests,
+                    'expirados': estado.expirados,
+                    'p50': estado.percentil(0.50),
+                    'p99': estado.percentil(0.99),
+                    'timeout': self._lectura(operacion),
+                }
+                for operacion, estado in self._operaciones.items()
+            }
+
+
+_timeouts_compartidos = None
+_timeouts_lock = threading.Lock()
+
+
+def timeouts_compartidos():
+    """Timeouts adaptativos únicos del proceso, compartidos por todas las instancias de SICABot"""
+    global _timeouts_compartidos
+    with _timeouts_lock:
+        if _timeouts_compartidos is None:
+            _timeouts_compartidos = TimeoutsAdaptativos()
+        return _timeouts_compartidos
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+SICA Transporte - Adaptador HTTP de la sesión requests del bot
+Negocia Accept-Encoding solo con los codecs instalados, mide bytes comprimidos y
+descomprimidos y el tiempo de decodificación de cada respuesta, y opcionalmente
+multiplexa los requests de una sesión sobre una conexión HTTP/2 (httpx con h2)
+"""
+
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import timedelta
+from http.client import HTTPMessage
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import ReadTimeoutError
+
+# Orden de preferencia: mejor compresión primero (las respuestas Livewire son de 40-70 KB)
+ORDEN_CODECS = ('zstd', 'br', 'gzip', 'deflate')
+
+# Políticas con nombre; también se acepta una lista explícita ('br,gzip')
+POLITICAS_CODEC = {
+    'auto': ORDEN_CODECS,
+    'gzip': ('gzip', 'deflate'),
+    'ninguna': (),
+}
+
+
+def http2_disponible():
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _modulo_disponible(*nombres):
+    for nombre in nombres:
+        try:
+            __import__(nombre)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+def codecs_disponibles():
+    """Codecs que este proceso puede decodificar (br y zstd dependen de paquetes opcionales)"""
+    disponibles = {'gzip', 'deflate'}
+    if _modulo_disponible('brotli', 'brotlicffi'):
+        disponibles.add('br')
+    if _modulo_disponible('zstandard'):
+        disponibles.add('zstd')
+    return [codec for codec in ORDEN_CODECS if codec in disponibles]
+
+
+def resolver_politica(politica='auto'):
+    """Codecs a anunciar para una política, limitados a los instalados"""
+    if politica in POLITICAS_CODEC:
+        pedidos = POLITICAS_CODEC[politica]
+    else:
+        pedidos = tuple(c.strip() for c in str(politica).split(',') if c.strip())
+        desconocidos = [c for c in pedidos if c not in ORDEN_CODECS]
+        if desconocidos:
+            raise ValueError(f"Codecs desconocidos: {', '.join(desconocidos)} "
+                             f"(use {', '.join(POLITICAS_CODEC)} o una lista de {', '.join(ORDEN_CODECS)})")
+    disponibles = codecs_disponibles()
+    faltantes = [c for c in pedidos if c not in disponibles]
+    if faltantes and politica not in POLITICAS_CODEC:
+        print(f"⚠️ Codecs no instalados, no se anunciarán: {', '.join(faltantes)}")
+    return [c for c in pedidos if c in disponibles]
+
+
+def accept_encoding(politica='auto'):
+    """Valor del header Accept-Encoding para una política"""
+    return ', '.join(resolver_politica(politica)) or 'identity'
+
+
+def _decodificar_uno(datos, codec):
+    if codec == 'gzip' or codec == 'x-gzip':
+        return zlib.decompress(datos, 16 + zlib.MAX_WBITS)
+    if codec == 'deflate':
+        try:
+            return zlib.decompress(datos)
+        except zlib.error:
+            # Algunos servidores envían deflate sin cabecera zlib
+            return zlib.decompress(datos, -zlib.MAX_WBITS)
+    if codec == 'br':
+        try:
+            import brotli
+        except ImportError:
+            import brotlicffi as brotli
+        return brotli.decompress(datos)
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(datos)
+    raise ValueError(f"Content-Encoding no soportado: {codec}")
+
+
+def decodificar(datos, content_encoding):
+    """Decodificar un cuerpo según su Content-Encoding (codecs encadenados en orden inverso)"""
+    codecs = [c.strip().lower() for c in (content_encoding or '').split(',') if c.strip()]
+    for codec in reversed(codecs):
+        if codec != 'identity':
+            datos = _decodificar_uno(datos, codec)
+    return datos
+
+
+class _RawHTTP2:
+    """Sustituto mínimo de urllib3.HTTPResponse: lo justo para que requests lea las cookies"""
+
+    def __init__(self, headers):
+        self._original_response = self
+        self.msg = HTTPMessage()
+        for nombre, valor in headers.multi_items():
+            self.msg.add_header(nombre, valor)
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class AdaptadorTransporte(HTTPAdapter):
+    """HTTPAdapter que mide la compresión de cada respuesta y opcionalmente usa HTTP/2.
+
+    Cookies, headers, redirecciones y hooks siguen a cargo de requests.Session, así que
+    el bot (y el broker, que exporta el cookie jar) no notan la diferencia. Con http2=True
+    envía por un cliente httpx; sin httpx/h2 instalados, o si el servidor no negocia h2,
+    se usa HTTP/1.1.
+    """
+
+    def __init__(self, http2=False, max_conexiones=10, **kwargs):
+        super().__init__(**kwargs)
+        self.http2 = http2 and http2_disponible()
+        if http2 and not self.http2:
+            print("⚠️ httpx[http2] no está instalado: se usa HTTP/1.1")
+        self._cliente = None
+        self._max_conexiones = max_conexiones
+        self._lock = threading.Lock()
+        self.versiones = Counter()
+        self.por_codec = {}
+
+    # --- Envío ---
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if stream:
+            # Las descargas en streaming no se miden: el llamador decide cuándo leer
+            return super().send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        inicio = time.monotonic()
+        if self.http2:
+            response, crudo = self._enviar_http2(request, timeout, verify)
+        else:
+            response = super().send(request, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            try:
+                crudo = response.raw.read(decode_content=False)
+            except ReadTimeoutError as e:
+                # Igual que HTTPAdapter: un timeout de lectura es ReadTimeout (cuenta para los
+                # timeouts adaptativos y los reintentos), no un error de conexión
+                raise requests.ReadTimeout(e, request=request)
+            except Exception as e:
+                raise requests.ConnectionError(e, request=request)
+            response.http_version = 'HTTP/1.1'
+        self.versiones[response.http_version] += 1
+        self._decodificar_respuesta(request, response, crudo)
+        response.elapsed = timedelta(seconds=time.monotonic() - inicio)
+        return response
+
+    def _decodificar_respuesta(self, request, response, crudo):
+        codec = response.headers.get('Content-Encoding', '').strip().lower() or 'identity'
+        inicio = time.perf_counter()
+        try:
+            contenido = decodificar(crudo, codec)
+        except Exception as e:
+            raise requests.exceptions.ContentDecodingError(
+                f"No se pudo decodificar la respuesta ({codec}): {e}", request=request)
+        segundos = time.perf_counter() - inicio
+        response._content = contenido
+        response._content_consumed = True
+        response.content_encoding = codec
+        response.bytes_comprimidos = len(crudo)
+        response.segundos_decodificacion = segundos
+        with self._lock:
+            stats = self.por_codec.setdefault(codec, {'respuestas': 0, 'bytes_comprimidos': 0,
+                                                      'bytes_descomprimidos': 0, 'segundos_decodificacion': 0.0})
+            stats['respuestas'] += 1
+            stats['bytes_comprimidos'] += len(crudo)
+            stats['bytes_descomprimidos'] += len(contenido)
+            stats['segundos_decodificacion'] += segundos
+
+    # --- HTTP/2 ---
+
+    def _obtener_cliente(self, verify):
+        with self._lock:
+            if self._cliente is None:
+                import httpx
+                self._cliente = httpx.Client(
+                    http2=True,
+                    verify=verify,
+                    follow_redirects=False,
+                    limits=httpx.Limits(max_connections=self._max_conexiones),
+                )
+            return self._cliente
+
+    @staticmethod
+    def _timeout(timeout):
+        import httpx
+        if isinstance(timeout, tuple):
+            conexion, lectura = timeout
+            return httpx.Timeout(lectura, connect=conexion)
+        return httpx.Timeout(timeout)
+
+    def _enviar_http2(self, request, timeout, verify):
+        import httpx
+        cliente = self._obtener_cliente(verify)
+        solicitud = httpx.Request(request.method, request.url, headers=dict(request.headers),
+                                  content=request.body,
+                                  extensions={'timeout': self._timeout(timeout).as_dict()})
+        try:
+            respuesta = cliente.send(solicitud, stream=True)
+            try:
+                # Bytes tal como llegaron: la decodificación se hace (y se mide) aparte
+                crudo = b''.join(respuesta.iter_raw())
+            finally:
+                respuesta.close()
+        except httpx.ConnectTimeout as e:
+            raise requests.ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.ReadTimeout(e, request=request)
+        except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError) as e:
+            raise requests.ConnectionError(e, request=request)
+
+        response = Response()
+        response.status_code = respuesta.status_code
+        response.reason = respuesta.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.encoding = respuesta.charset_encoding
+        response.headers = CaseInsensitiveDict({k: v for k, v in respuesta.headers.items()
+                                                if k.lower() != 'transfer-encoding'})
+        response.raw = _RawHTTP2(respuesta.headers)
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        response.connection = self
+        response.http_version = respuesta.http_version
+        return response, crudo
+
+    # --- Precalentamiento ---
+
+    def precalentar(self, url, conexiones=1, verify=True):
+        """Abrir conexiones TCP/TLS al host de url antes de necesitarlas; retorna cuántas abrió.
+
+        Con HTTP/2 no hace nada: la única conexión multiplexada la abre el primer request.
+        """
+        if self.http2:
+            return 0
+        try:
+            if hasattr(self, 'get_connection_with_tls_context'):
+                # requests >= 2.32: el pool depende también de verify/cert
+                pool = self.get_connection_with_tls_context(requests.Request('GET', url).prepare(), verify)
+            else:
+                pool = self.get_connection(url)
+                self.cert_verify(pool, url, verify, None)
+            tomadas = [pool._get_conn() for _ in range(conexiones)]
+        except Exception as e:
+            print(f"⚠️ No se pudieron precalentar conexiones a {url}: {e}")
+            return 0
+        abiertas = 0
+        try:
+            for conexion in tomadas:
+                if not conexion.is_connected:
+                    conexion.connect()
+                    abiertas += 1
+        except Exception as e:
+            print(f"⚠️ No se pudieron precalentar conexiones a {url}: {e}")
+        finally:
+            # De vuelta al pool: el próximo request la reutiliza sin handshake
+            for conexion in tomadas:
+                pool._put_conn(conexion)
+        return abiertas
+
+    def conexiones_abiertas(self):
+        """Conexiones vivas en el pool HTTP/2 (normalmente 1 por host)"""
+        if self._cliente is None:
+            return 0
+        pool = getattr(self._cliente._transport, '_pool', None)
+        return len(getattr(pool, 'connections', []))
+
+    # --- Métricas ---
+
+    def metricas(self):
+        with self._lock:
+            por_codec = {codec: dict(s) for codec, s in self.por_codec.items()}
+        for s in por_codec.values():
+            s['ratio'] = round(s['bytes_descomprimidos'] / s['bytes_comprimidos'], 2) if s['bytes_comprimidos'] else None
+        return {
+            'http2': self.http2,
+            'versiones': dict(self.versiones),
+            'conexiones_abiertas': self.conexiones_abiertas(),
+            'por_codec': por_codec,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._cliente is not None:
+                self._cliente.close()
+                self._cliente = None
+        super().close()
+
+
+def montar_transporte(session, http2=False, codecs='auto', max_conexiones=10):
+    """Montar el adaptador en una sesión requests y fijar su Accept-Encoding; retorna el adaptador"""
+    adaptador = AdaptadorTransporte(http2=http2, max_conexiones=max_conexiones)
+    session.mount('https://', adaptador)
+    session.mount('http://', adaptador)
+    session.headers['Accept-Encoding'] = accept_encoding(codecs)
+    return adaptador
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Pruebas del apagado ordenado: drenaje, checkpoint de lotes y reanudación del daemon
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from sica_apagado import Apagado, CheckpointLote, DrenajeVencido
+from sica_daemon import DaemonSICA
+
+DESPACHO = {'codigo_empresa': '1234', 'cedula': 'V-1', 'placa': 'A22AK2C'}
+COMPONENTE = {'fingerprint': {'id': 'comp1', 'name': 'registro1'}, 'serverMemo': {'checksum': 'c7'}}
+
+
+def _lineas(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+# --- Drenaje ---
+
+def test_plazo_de_drenaje():
+    apagado = Apagado(plazo=0.1)
+    assert apagado.restante() is None and not apagado.vencido()
+    assert apagado.solicitar('prueba') is True
+    assert apagado.solicitar('otra vez') is False
+    assert apagado.solicitado and not apagado.vencido()
+    time.sleep(0.15)
+    assert apagado.vencido() and apagado.restante() == 0.0
+
+
+def test_apagado_forzado_vence_de_inmediato():
+    apagado = Apagado(plazo=60)
+    apagado.solicitar('prueba')
+    apagado.forzado = True
+    assert apagado.vencido() and apagado.restante() == 0.0
+
+
+def test_drenaje_vencido_corta_los_requests_salvo_el_logout(crear_bot, sesion_falsa):
+    bot = crear_bot(apagado=Apagado(plazo=0))
+    bot.apagado.solicitar('prueba')
+    time.sleep(0.01)
+    enviados = sesion_falsa(bot, [])
+    with pytest.raises(DrenajeVencido):
+        bot._request('GET', 'despachos', f"{bot.base_url}/despachos")
+    assert enviados == []
+
+
+def test_al_solicitar_ejecuta_los_callbacks():
+    apagado = Apagado()
+    llamado = threading.Event()
+    apagado.al_solicitar(llamado.set)
+    apagado.solicitar('prueba')
+    assert llamado.wait(1)
+
+
+# --- Checkpoint ---
+
+def test_checkpoint_agrega_una_linea_por_cambio(tmp_path):
+    ruta = str(tmp_path / 'lote.checkpoint.json')
+    checkpoint = CheckpointLote(ruta)
+    for i in range(50):
+        checkpoint.registrar(f'c{i}', DESPACHO, {'estado': 'COMPLETADO'})
+    checkpoint.registrar('c0', DESPACHO, {'estado': 'INTERRUMPIDO', 'component_data': COMPONENTE})
+    assert len(_lineas(ruta)) == 51
+
+    reabierto = CheckpointLote(ruta)
+    assert reabierto.pendientes() == ['c0']
+    assert reabierto.previo('c0')['component_data'] == COMPONENTE
+    # Al abrir se compacta: una línea por despacho
+    assert len(_lineas(ruta)) == 50
+
+
+def test_checkpoint_tolera_una_linea_truncada(tmp_path):
+    ruta = str(tmp_path / 'lote.checkpoint.json')
+    checkpoint = CheckpointLote(ruta)
+    checkpoint.registrar('a', DESPACHO, {'estado': 'COMPLETADO'})
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write('{"clave": "b", "trab')
+
+    reabierto = CheckpointLote(ruta)
+    assert list(reabierto.trabajos) == ['a']
+    reabierto.registrar('c', DESPACHO, {'estado': 'TIMEOUT'})
+    assert set(CheckpointLote(ruta).trabajos) == {'a', 'c'}
+
+
+def test_checkpoint_descartar(tmp_path):
+    ruta = str(tmp_path / 'daemon.checkpoint.json')
+    checkpoint = CheckpointLote(ruta)
+    checkpoint.registrar('a', DESPACHO, {'estado': 'EN_COLA'})
+    checkpoint.descartar('a')
+    checkpoint.descartar('inexistente')
+    assert len(_lineas(ruta)) == 2
+    assert CheckpointLote(ruta).trabajos == {}
+
+
+# --- Reanudación del daemon ---
+
+class _Componente:
+    def __init__(self, bot):
+        self.bot = bot
+        self.component_data = {'fingerprint': {'id': 'reserva'}, 'serverMemo': {}}
+
+
+class _BotFalso:
+    def __init__(self, estados):
+        self.estados = list(estados)
+        self.recibidos = []
+
+    def ejecutar_despacho(self, component_data, codigo_empresa, cedula, placa):
+        self.recibidos.append(component_data['fingerprint']['id'])
+        return {'estado': self.estados.pop(0), 'component_data': component_data}
+
+
+class _ReservaFalsa:
+    def __init__(self, bot):
+        self.bot = bot
+
+    def tomar(self):
+        return _Componente(self.bot)
+
+
+@pytest.fixture
+def crear_daemon(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ruta = str(tmp_path / 'daemon.checkpoint.json')
+
+    def crear(bot):
+        daemon = DaemonSICA('usuario', 'clave', checkpoint=ruta, apagado=Apagado(plazo=1))
+        daemon.reserva = _ReservaFalsa(bot)
+        return daemon
+
+    crear.ruta = ruta
+    return crear
+
+
+def _procesar(daemon, trabajo_id):
+    worker = threading.Thread(target=daemon._worker, daemon=True)
+    worker.start()
+    limite = time.monotonic() + 5
+    while daemon.consultar(trabajo_id)['estado'] in ('EN_COLA', 'EN_PROCESO') and time.monotonic() < limite:
+        time.sleep(0.01)
+    daemon._detener.set()
+    worker.join()
+
+
+def test_daemon_guarda_el_server_memo_y_lo_retoma(crear_daemon):
+    checkpoint = CheckpointLote(crear_daemon.ruta)
+    checkpoint.registrar('t1', dict(DESPACHO, id='t1'), {'estado': 'INTERRUMPIDO', 'component_data': COMPONENTE})
+
+    bot = _BotFalso(['COMPLETADO'])
+    daemon = crear_daemon(bot)
+    daemon._reanudar()
+    # Reencolado pero sin terminar: sigue en el checkpoint
+    assert CheckpointLote(crear_daemon.ruta).pendientes() == ['t1']
+
+    _procesar(daemon, 't1')
+    assert bot.recibidos == ['comp1']
+    assert daemon.consultar('t1')['estado'] == 'COMPLETADO'
+    assert CheckpointLote(crear_daemon.ruta).trabajos == {}
+
+
+def test_daemon_reanudado_que_no_termina_queda_en_el_checkpoint(crear_daemon):
+    checkpoint = CheckpointLote(crear_daemon.ruta)
+    checkpoint.registrar('t1', dict(DESPACHO, id='t1'), {'estado': 'INTERRUMPIDO', 'component_data': COMPONENTE})
+
+    daemon = crear_daemon(_BotFalso(['TIMEOUT', 'TIMEOUT']))
+    daemon._reanudar()
+    _procesar(daemon, 't1')
+    daemon._guardar_pendientes()
+    assert CheckpointLote(crear_daemon.ruta).previo('t1')['estado'] == 'TIMEOUT'
+
+
+def test_daemon_reanudado_no_encontrado_no_se_repite(crear_daemon):
+    checkpoint = CheckpointLote(crear_daemon.ruta)
+    checkpoint.registrar('t1', dict(DESPACHO, id='t1'), {'estado': 'INTERRUMPIDO', 'component_data': COMPONENTE})
+
+    bot = _BotFalso(['VEHICULO_NO_ENCONTRADO'])
+    daemon = crear_daemon(bot)
+    daemon._reanudar()
+    _procesar(daemon, 't1')
+    # Definitivo con el componente guardado: no se repite en el de la reserva
+    assert bot.recibidos == ['comp1']
+    assert daemon.consultar('t1')['estado'] == 'VEHICULO_NO_ENCONTRADO'
+    assert CheckpointLote(crear_daemon.ruta).trabajos == {}
+
+
+def test_daemon_interrumpido_guarda_su_component_data(crear_daemon):
+    daemon = crear_daemon(_BotFalso(['INTERRUMPIDO']))
+    trabajo = daemon.enviar(DESPACHO)
+    _procesar(daemon, trabajo['id'])
+    daemon.enviar(dict(DESPACHO, placa='B33'))
+    daemon._guardar_pendientes()
+
+    checkpoint = CheckpointLote(crear_daemon.ruta)
+    assert len(checkpoint.pendientes()) == 2
+    assert checkpoint.previo(trabajo['id'])['component_data']['fingerprint']['id'] == 'reserva'
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Pruebas del almacén de artefactos: instantánea al guardar, lectura temprana y estadísticas
+"""
+
+import threading
+
+import pytest
+
+from sica_artefactos import AlmacenArtefactos
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path / 'artefactos'), compresion='gzip')
+    yield almacen
+    almacen.cerrar()
+
+
+def test_leer_antes_del_primer_guardado(almacen):
+    assert almacen.leer('empresa_seleccionada.json', clave='comp1') is None
+
+
+def test_guardar_toma_una_instantanea_del_contenido(almacen):
+    component_data = {'serverMemo': {'checksum': 'original'}}
+    almacen.guardar('componente.json', component_data, clave='comp1')
+    # El bot sigue usando (y mutando) el mismo dict antes de que escriba el hilo de fondo
+    component_data['serverMemo']['checksum'] = 'modificado'
+    almacen.vaciar()
+    assert almacen.leer('componente.json', clave='comp1') == {'serverMemo': {'checksum': 'original'}}
+
+
+def test_tipos_y_deduplicacion(almacen):
+    almacen.guardar('respuesta.html', '<p>ñandú</p>', clave='a')
+    almacen.guardar('crudo.bin', b'\x00\x01', clave='a')
+    almacen.guardar('respuesta.html', '<p>ñandú</p>', clave='b')
+    almacen.vaciar()
+    assert almacen.leer('respuesta.html', clave='a') == '<p>ñandú</p>'
+    assert almacen.leer('crudo.bin') == b'\x00\x01'
+    estadisticas = almacen.estadisticas()
+    assert estadisticas['guardados'] == 3
+    assert estadisticas['deduplicados'] == 1
+    assert estadisticas['blobs'] == 2
+
+
+def test_no_serializable_se_descarta_sin_fallar(almacen):
+    circular = {}
+    circular['yo'] = circular
+    almacen.guardar('circular.json', circular)
+    assert almacen.estadisticas()['descartados'] == 1
+
+
+def test_estadisticas_consistentes_con_varios_hilos(tmp_path):
+    almacen = AlmacenArtefactos(str(tmp_path / 'artefactos'), compresion='ninguna', max_pendientes=5)
+    hilos = [threading.Thread(target=lambda n=n: [almacen.guardar(f'a{n}-{i}.json', {'n': n, 'i': i})
+                                                 for i in range(50)]) for n in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    almacen.cerrar()
+    estadisticas = almacen.estadisticas()
+    assert estadisticas['guardados'] + estadisticas['descartados'] == 400
+    assert estadisticas['guardados'] == estadisticas['blobs']
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Pruebas del bot sin red: clasificación de fallos de un despacho y timeouts del transporte
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from requests.models import Response
+
+from conftest import componente_registro as componente, respuesta_livewire as respuesta
+from sica_transporte import montar_transporte
+
+
+def test_timeout_en_busqueda_no_es_empresa_no_encontrada(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    sesion_falsa(bot, [requests.ReadTimeout('lectura vencida')])
+    resultado = bot.ejecutar_despacho(componente(), '1234', 'V-1', 'A22AK2C')
+    assert resultado['estado'] == 'TIMEOUT'
+    assert 'lectura vencida' in resultado['error']
+
+
+def test_5xx_en_busqueda_es_error_reintentable(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    sesion_falsa(bot, [respuesta(502)])
+    resultado = bot.ejecutar_despacho(componente(), '1234', 'V-1', 'A22AK2C')
+    assert resultado['estado'] == 'ERROR'
+
+
+def test_error_de_conexion_en_seleccion_es_error(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    empresa = {'id': 7, 'codigo': 1234}
+    sesion_falsa(bot, [
+        respuesta(200, {'serverMemo': {'data': {'empresas': [empresa]}, 'checksum': 'c2', 'htmlHash': 'h2'}}),
+        requests.ConnectionError('conexión reiniciada'),
+    ])
+    resultado = bot.ejecutar_despacho(componente(), '1234', 'V-1', 'A22AK2C')
+    assert resultado['estado'] == 'ERROR'
+    assert resultado['empresa'] == empresa
+
+
+def test_respuesta_sin_registros_si_es_no_encontrada(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    sesion_falsa(bot, [respuesta(200, {'serverMemo': {'data': {'empresas': []}}})])
+    resultado = bot.ejecutar_despacho(componente(), '1234', 'V-1', 'A22AK2C')
+    assert resultado['estado'] == 'EMPRESA_NO_ENCONTRADA'
+
+
+def test_timeout_en_llenar_formulario(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    sesion_falsa(bot, [requests.ReadTimeout('lectura vencida')])
+    resultado = bot.llenar_formulario(componente(), {'codigo_empresa': '1234', 'cedula': '1', 'placa': 'A22AK2C'})
+    assert resultado['estado'] == 'TIMEOUT'
+
+
+def test_drenaje_vencido_interrumpe(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    bot.apagado.solicitar('prueba')
+    bot.apagado.forzado = True
+    sesion_falsa(bot, [])
+    resultado = bot.ejecutar_despacho(componente(), '1234', 'V-1', 'A22AK2C')
+    assert resultado['estado'] == 'INTERRUMPIDO'
+
+
+class _CuerpoLento(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '100')
+        self.end_headers()
+        self.wfile.write(b'x' * 10)
+        self.wfile.flush()
+        time.sleep(1)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor_lento():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _CuerpoLento)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}/"
+    servidor.shutdown()
+
+
+def test_timeout_leyendo_el_cuerpo_es_read_timeout(servidor_lento):
+    session = requests.Session()
+    montar_transporte(session)
+    with pytest.raises(requests.ReadTimeout):
+        session.get(servidor_lento, timeout=(2, 0.2))
+
+
+def test_timeout_del_cuerpo_alimenta_los_timeouts_adaptativos(crear_bot, servidor_lento):
+    bot = crear_bot()
+    with pytest.raises(requests.ReadTimeout):
+        bot._request('GET', 'despachos', servidor_lento, timeout=(2, 0.2))
+    assert bot.timeouts.metricas()['despachos']['expirados'] == 1
+
+
+def test_main_sin_cuentas_no_usa_credenciales_por_defecto(monkeypatch, tmp_path, capsys):
+    import sica_bot
+    for variable in ('SICA_CUENTAS_ARCHIVO', 'SICA_CUENTAS', 'SICA_USUARIO', 'SICA_PASSWORD',
+                     'SICA_REPRODUCIR', 'SICA_GRABAR'):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.chdir(tmp_path)
+    logins = []
+    monkeypatch.setattr(sica_bot.SICABot, 'full_login_process', lambda self, *args: logins.append(args))
+    sica_bot.main()
+    salida = capsys.readouterr().out
+    assert logins == []
+    assert '❌ Defina SICA_CUENTAS' in salida
+    assert 'Contraseña' not in salida
+
+
+def test_main_no_muestra_la_contraseña(monkeypatch, tmp_path, capsys):
+    import sica_bot
+    monkeypatch.delenv('SICA_CUENTAS_ARCHIVO', raising=False)
+    monkeypatch.delenv('SICA_CUENTAS', raising=False)
+    monkeypatch.setenv('SICA_USUARIO', 'operador')
+    monkeypatch.setenv('SICA_PASSWORD', 'clave-secreta')
+    monkeypatch.chdir(tmp_path)
+    logins = []
+    monkeypatch.setattr(sica_bot.SICABot, 'full_login_process', lambda self, *args: logins.append(args))
+    sica_bot.main()
+    assert logins == [('operador', 'clave-secreta')]
+    assert 'clave-secreta' not in capsys.readouterr().out
+
+
+def test_seleccion_de_conductor_usa_el_componente_del_llamador(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    enviados = sesion_falsa(bot, [respuesta(200, {'serverMemo': {'checksum': 'c2'}})])
+    bot.select_conductor(9, componente(3))
+    payload = enviados[0]['json']
+    assert enviados[0]['url'] == f"{bot.base_url}/api/app/registro3"
+    assert payload['fingerprint'] == {'id': 'comp3', 'name': 'registro3'}
+    assert payload['serverMemo']['checksum'] == 'checksum3'
+    assert payload['serverMemo']['htmlHash'] == 'h1'
+
+
+def test_busqueda_de_vehiculo_usa_y_actualiza_el_componente_del_llamador(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    component_data = componente(4)
+    enviados = sesion_falsa(bot, [respuesta(200, {'serverMemo': {
+        'data': {'vehiculos': [{'id': 5, 'placa': 'A22AK2C'}]}, 'checksum': 'c2', 'htmlHash': 'h2'}})])
+    resultado = bot.search_vehiculo_por_placa('A22AK2C', component_data)
+    assert resultado['vehiculo']['id'] == 5
+    payload = enviados[0]['json']
+    assert enviados[0]['url'] == f"{bot.base_url}/api/app/registro4"
+    assert payload['fingerprint'] == {'id': 'comp4', 'name': 'registro4'}
+    assert payload['serverMemo']['checksum'] == 'checksum4'
+    # El siguiente paso parte del serverMemo devuelto, sin perder las propiedades no modificadas
+    assert component_data['serverMemo']['checksum'] == 'c2'
+    assert component_data['serverMemo']['data']['vehiculos'] == [{'id': 5, 'placa': 'A22AK2C'}]
+    assert 'data' in component_data['serverMemo']['data']
+
+
+# --- Formulario en tres POST ---
+
+def _memo(data, **seleccion):
+    return {'serverMemo': {'data': dict(data, data=seleccion), 'checksum': 'c2', 'htmlHash': 'h2'}}
+
+
+def test_llenar_formulario_en_tres_posts(crear_bot, sesion_falsa):
+    from sica_bot import (CAMPO_CONDUCTOR_SELECCIONADO, CAMPO_EMPRESA_SELECCIONADA, CAMPO_RUBRO, CAMPOS_REGISTRO,
+                          METODO_AGREGAR_RUBRO)
+
+    bot = crear_bot()
+    bot.catalogo.actualizar({'rubros_': [{'id': 31, 'nombre': 'ARROZ BLANCO'}, {'id': 32, 'nombre': 'Café molido'}]})
+    enviados = sesion_falsa(bot, [
+        respuesta(200, _memo({'empresas': [{'id': 7, 'codigo': 1234}]})),
+        respuesta(200, _memo({'conductores': [{'id': 9, 'cedula': 'V-1'}]}, **{CAMPO_EMPRESA_SELECCIONADA: 7})),
+        respuesta(200, _memo({'vehiculos': [{'id': 5, 'placa': 'A22AK2C'}]}, **{CAMPO_EMPRESA_SELECCIONADA: 7,
+                                                                                 CAMPO_CONDUCTOR_SELECCIONADO: 9})),
+    ])
+    resultado = bot.llenar_formulario(componente(), {
+        'codigo_empresa': '1234', 'cedula': '1', 'placa': 'a22ak2c', 'facturas': 'F-1',
+        'rubros': ['arroz b', 'CAFE MOLIDO'], 'mes_cuspal': 'Enero', 'anio_cuspal': '2025',
+        'campos_cuspal': {'mes_cuspal': 'data.mes', 'anio_cuspal': 'data.anio'},
+    })
+    assert resultado['estado'] == 'COMPLETADO'
+    assert (resultado['empresa']['id'], resultado['conductor']['id'], resultado['vehiculo']['id']) == (7, 9, 5)
+
+    assert len(enviados) == 3
+    updates = [[(u['type'], u['payload'].get('name') or u['payload']['method'], u['payload'].get('value'))
+                for u in e['json']['updates']] for e in enviados]
+    assert updates[0][-1] == ('callMethod', 'searchEmpresaCodigo', None)
+    assert [u[1] for u in updates[1]] == ['__method', CAMPOS_REGISTRO['cedula'], 'searchConductorCedula']
+    # Último POST: selección del conductor, campos libres, rubros, CUSPAL y la búsqueda del vehículo
+    assert updates[2] == [
+        ('callMethod', '__method', None),
+        ('syncInput', CAMPOS_REGISTRO['facturas'], 'F-1'),
+        ('syncInput', CAMPO_RUBRO, '31'), ('callMethod', '__method', None),
+        ('syncInput', CAMPO_RUBRO, '32'), ('callMethod', '__method', None),
+        ('syncInput', 'data.mes', 'Enero'), ('syncInput', 'data.anio', '2025'),
+        ('syncInput', CAMPOS_REGISTRO['placa'], 'A22AK2C'), ('callMethod', 'searchVehiculoPlaca', None),
+    ]
+    assert enviados[2]['json']['updates'][3]['payload']['params'] == [METODO_AGREGAR_RUBRO]
+    # Cada POST viaja con el serverMemo que dejó el anterior
+    assert enviados[2]['json']['serverMemo']['data']['data'][CAMPO_EMPRESA_SELECCIONADA] == 7
+
+    comparacion = resultado['comparacion']
+    assert comparacion['agrupado']['requests'] == 3
+    # Un POST por paso: búsqueda de empresa, selección, búsqueda de conductor, selección,
+    # facturas, 2 rubros, mes, año y búsqueda de vehículo
+    assert comparacion['por_pasos']['requests'] == 10
+    # ... y cada uno vuelve a subir el serverMemo completo
+    assert comparacion['por_pasos']['bytes_enviados'] > sum(len(json.dumps(e['json'])) for e in enviados)
+
+
+def test_llenar_formulario_con_datos_invalidos_no_envia_nada(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    enviados = sesion_falsa(bot, [])
+    despacho = {'codigo_empresa': '1234', 'cedula': '1', 'placa': 'A22AK2C'}
+    for extra in ({'rubros': ['inexistente']}, {'mes_cuspal': 'Brumario', 'campos_cuspal': {'mes_cuspal': 'data.mes'}},
+                  {'anio_cuspal': '2025'}):
+        resultado = bot.llenar_formulario(componente(), dict(despacho, **extra))
+        assert resultado['estado'] == 'DATOS_INVALIDOS'
+    assert enviados == []
+
+
+def _pagina(html):
+    response = Response()
+    response.status_code = 200
+    response._content = html.encode('utf-8')
+    response.encoding = 'utf-8'
+    response.url = 'https://sica.test/'
+    return response
+
+
+def test_login_carga_tokens_y_registrar_en_paralelo(crear_bot, monkeypatch):
+    bot = crear_bot(precargar_registrar=True)
+    for paso in ('step1_get_login_page', 'step2_login', 'step3_get_verification_code', 'step4_verify_device'):
+        monkeypatch.setattr(bot, paso, lambda *args: True)
+    monkeypatch.setattr(bot, '_precalentar_conexiones', lambda: 0)
+    memo = {'fingerprint': {'id': 'reg1', 'name': 'registro'},
+            'serverMemo': {'checksum': 'c1', 'data': {'data': {'cWFjL1BPYjFSMHBuMWkxbi9PZ0dxdz09': ''},
+                                                      'rubros_': [{'id': 3, 'nombre': 'Arroz'}]}}}
+    paginas = {
+        '/despachos': (0.2, '<meta name="csrf-token" content="token-despachos">'
+                            '<input name="_token" value="token-despachos">'),
+        # La página de registro trae otro _token y responde después: no debe pisar el del paso 5
+        '/despachos/registrar': (0.3, '<input name="_token" value="token-registrar">'
+                                      f'<div wire:id="reg1" wire:initial-data=\'{json.dumps(memo)}\'></div>'),
+    }
+    pedidos = []
+
+    def request(method, url, **kwargs):
+        pedidos.append(url)
+        demora, html = paginas[url.replace(bot.base_url, '')]
+        time.sleep(demora)
+        return _pagina(html)
+
+    bot.session.request = request
+    inicio = time.monotonic()
+    tokens = bot.full_login_process('usuario', 'clave')
+    assert time.monotonic() - inicio < 0.45
+    assert tokens['csrf_token'] == bot.csrf_token == 'token-despachos'
+    assert bot.logged_in and bot.calentamiento['registrar'] >= 0.3 and bot.calentamiento['tokens'] >= 0.2
+    assert bot.catalogo.mapear(['arroz']) == {'arroz': 3}
+
+    # El primer navigate usa el componente precargado sin otro request
+    assert bot.navigate_to_despachos_registrar()['fingerprint']['id'] == 'reg1'
+    assert len(pedidos) == 2
+    # Sin logout real al salir del proceso
+    bot.logged_in = False
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Pruebas del broker de sesiones: cupo de logins, protocolo JSON y clave obligatoria
+"""
+
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+import requests
+
+import sica_broker
+from sica_broker import BrokerSesiones, ClienteBroker, _SesionBroker
+
+
+class _BotFalso:
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.cookies.set('sica_session', 'abc', domain='sica.test', path='/')
+        self.csrf_token = 'csrf'
+        self.base_url = 'https://sica.test'
+
+    def logout(self):
+        pass
+
+
+def _broker(max_sesiones=2, max_referencias=1, demora=0.05):
+    broker = BrokerSesiones('usuario', 'clave', max_sesiones=max_sesiones, max_referencias=max_referencias)
+
+    def login():
+        with broker._login_lock:
+            broker.stats['logins'] += 1
+        time.sleep(demora)
+        return _SesionBroker(_BotFalso())
+
+    broker._login = login
+    return broker
+
+
+def test_arrendar_no_supera_max_sesiones_con_logins_concurrentes():
+    broker = _broker(max_sesiones=2, max_referencias=1)
+    resultados = []
+
+    def worker(n):
+        resultados.append(broker.arrendar(n, timeout=0.3))
+
+    hilos = [threading.Thread(target=worker, args=(n,)) for n in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert broker.stats['logins'] == 2
+    assert len(broker.sesiones) == 2
+    assert broker.logins_pendientes == 0
+    assert sum(1 for r in resultados if 'lease_id' in r) == 2
+    assert sum(1 for r in resultados if r.get('error') == 'sin_sesiones') == 4
+
+
+def test_liberar_despierta_a_quien_espera():
+    broker = _broker(max_sesiones=1, max_referencias=1)
+    primero = broker.arrendar('a')
+    threading.Timer(0.1, broker.liberar, args=(primero['lease_id'],)).start()
+    segundo = broker.arrendar('b', timeout=2)
+    assert segundo['sesion_id'] == primero['sesion_id']
+    assert broker.stats['logins'] == 1
+
+
+def test_clave_obligatoria(monkeypatch, tmp_path):
+    monkeypatch.delenv('SICA_BROKER_KEY', raising=False)
+    with pytest.raises(RuntimeError):
+        ClienteBroker(direccion=str(tmp_path / 'broker.sock'))
+
+
+def test_directorio_socket_privado(monkeypatch, tmp_path):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    directorio = sica_broker.directorio_socket()
+    assert os.stat(directorio).st_mode & 0o777 == 0o700
+    assert sica_broker.direccion_por_defecto().startswith(directorio)
+
+    os.chmod(directorio, 0o755)
+    with pytest.raises(PermissionError):
+        sica_broker.directorio_socket()
+
+
+@pytest.fixture
+def broker_servido(tmp_path):
+    broker = _broker(max_sesiones=1, max_referencias=2, demora=0)
+    direccion = str(tmp_path / 'broker.sock')
+    threading.Thread(target=broker.servir, args=(direccion, b'clave-test'), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(direccion):
+            break
+        time.sleep(0.01)
+    yield broker, direccion
+    broker._detener.set()
+
+
+def test_protocolo_json_entre_broker_y_worker(broker_servido):
+    broker, direccion = broker_servido
+    cliente = ClienteBroker(direccion, authkey=b'clave-test')
+    try:
+        with cliente.arrendar(duracion=30) as arrendamiento:
+            assert arrendamiento.bot.session.cookies.get('sica_session') == 'abc'
+            assert arrendamiento.bot.csrf_token == 'csrf'
+            assert cliente.estado()['arrendamientos'] == 1
+        assert cliente.estado()['arrendamientos'] == 0
+    finally:
+        cliente.cerrar()
+
+
+def test_worker_con_clave_incorrecta_es_rechazado(broker_servido):
+    broker, direccion = broker_servido
+    with pytest.raises(AuthenticationError):
+        ClienteBroker(direccion, authkey=b'otra').estado()
+    # El broker sigue atendiendo a los workers con la clave correcta
+    cliente = ClienteBroker(direccion, authkey=b'clave-test')
+    assert 'sesiones' in cliente.estado()
+    cliente.cerrar()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los cassettes: grabar contra un servidor local, redactar y reproducir en orden
+"""
+
+import base64
+import json
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from sica_cassette import REDACTADO, CassetteNoCoincide, grabar, reproducir
+
+PAGINA_LOGIN = (
+    '<meta content="meta-secreto" name="csrf-token">'
+    '<form><input value="form-secreto" type="hidden" name="_token">'
+    '<input name="_token" value="form-secreto-2"><input name="usuario" value="visible"></form>'
+    "<script>window.livewire_token = 'lw-secreto';</script>"
+)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    contador = 0
+
+    def _responder(self, cuerpo, tipo='text/html'):
+        datos = cuerpo.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(datos)))
+        self.send_header('Set-Cookie', 'sica_session=cookie-secreta')
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == '/login':
+            return self._responder(PAGINA_LOGIN)
+        type(self).contador += 1
+        self._responder(json.dumps({'pagina': type(self).contador}), 'application/json')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._responder('ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    _Manejador.contador = 0
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manejador)
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def cassette(servidor, tmp_path):
+    """Cassette con login (GET + POST de formulario) y dos lecturas de la misma URL"""
+    ruta = str(tmp_path / 'trafico.zip')
+    session = requests.Session()
+    adaptador = grabar(session, ruta)
+    session.get(f"{servidor}/login")
+    session.post(f"{servidor}/login", data={'usuario': 'operador', 'password': 'clave-secreta',
+                                             '_token': 'form-secreto'},
+                 headers={'X-CSRF-TOKEN': 'header-secreto'})
+    session.get(f"{servidor}/despachos")
+    session.get(f"{servidor}/despachos")
+    adaptador.close()
+    return ruta
+
+
+def _intercambios(ruta):
+    with zipfile.ZipFile(ruta) as z:
+        return [json.loads(z.read(e['archivo'])) for e in json.loads(z.read('indice.json'))]
+
+
+def test_grabacion_redacta_headers_formularios_y_tokens_del_html(cassette):
+    intercambios = _intercambios(cassette)
+    # Headers y metadatos en el JSON de cada intercambio; los cuerpos van en base64
+    grabado = json.dumps(intercambios).encode('utf-8') + b''.join(
+        base64.b64decode(i[lado]['body'] or '') for i in intercambios for lado in ('request', 'response'))
+    for secreto in (b'meta-secreto', b'form-secreto', b'lw-secreto', b'clave-secreta', b'cookie-secreta',
+                    b'header-secreto'):
+        assert secreto not in grabado
+
+    login, post = intercambios[0], intercambios[1]
+    html = base64.b64decode(login['response']['body']).decode('utf-8')
+    assert html.count(REDACTADO) == 4 and 'value="visible"' in html
+    assert login['response']['headers']['Set-Cookie'] == REDACTADO
+    assert post['request']['headers']['X-CSRF-TOKEN'] == REDACTADO
+    assert 'usuario=operador' in base64.b64decode(post['request']['body']).decode('utf-8')
+
+
+def test_reproduccion_en_orden_por_method_y_url(cassette, servidor):
+    session = requests.Session()
+    adaptador = reproducir(session, cassette)
+    # Las dos lecturas de /despachos salen en el orden grabado, aunque se pidan intercaladas
+    assert session.get(f"{servidor}/despachos").json() == {'pagina': 1}
+    assert REDACTADO in session.get(f"{servidor}/login").text
+    assert session.get(f"{servidor}/despachos").json() == {'pagina': 2}
+    assert adaptador.restantes() == 1
+    with pytest.raises(CassetteNoCoincide):
+        session.get(f"{servidor}/despachos")
+    assert session.post(f"{servidor}/login", data={}).text == 'ok'
+    assert adaptador.restantes() == 0
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Pruebas del catálogo de rubros: carga versionada, búsqueda sin acentos, por prefijo y mapeo por lote
+"""
+
+from conftest import componente_registro, respuesta_livewire
+from sica_catalogo import ANIOS_CUSPAL_POR_DEFECTO, CatalogoRubros, normalizar_nombre
+from sica_livewire import LivewireResponse
+
+DATA = {
+    'rubros_': [
+        {'id': 1, 'nombre': 'Café molido'},
+        {'id': 2, 'nombre': 'Harina de maíz'},
+        {'id': 3, 'descripcion': 'Arroz blanco'},
+        {'id': 4, 'nombre': 'Arroz integral'},
+        {'id': 5, 'nombre': 'Azúcar'},
+    ],
+    'anios_cuspal': ['2024', '2025'],
+    'meses_cuspal': ['Enero', 'Febrero'],
+}
+
+
+def _catalogo():
+    catalogo = CatalogoRubros()
+    catalogo.actualizar(DATA)
+    return catalogo
+
+
+def test_normalizar_nombre():
+    assert normalizar_nombre('  Café   molido ') == 'CAFE MOLIDO'
+    assert normalizar_nombre('AZÚCAR') == normalizar_nombre('azucar') == 'AZUCAR'
+    assert normalizar_nombre(None) == ''
+
+
+def test_solo_reindexa_si_el_contenido_cambia():
+    catalogo = CatalogoRubros()
+    assert not catalogo.cargado and catalogo.anios_cuspal == ANIOS_CUSPAL_POR_DEFECTO
+    assert catalogo.actualizar({'otra_clave': 1}) is False
+    assert catalogo.actualizar(DATA) is True
+    assert catalogo.actualizar(dict(DATA)) is False
+    assert catalogo.actualizar(dict(DATA, meses_cuspal=['Marzo'])) is True
+    assert catalogo.stats['cargas'] == 2 and catalogo.stats['sin_cambios'] == 1
+    assert catalogo.meses_cuspal == ['Marzo'] and catalogo.anios_cuspal == ['2024', '2025']
+
+
+def test_busqueda_sin_acentos_ni_mayusculas():
+    catalogo = _catalogo()
+    assert catalogo.buscar('Café molido')['id'] == 1
+    assert catalogo.buscar('CAFE  MOLIDO')['id'] == 1
+    assert catalogo.buscar('harina de maiz')['id'] == 2
+    assert catalogo.buscar('arroz BLANCO')['id'] == 3
+
+
+def test_busqueda_por_prefijo_unico():
+    catalogo = _catalogo()
+    assert catalogo.buscar('harina')['id'] == 2
+    assert catalogo.buscar('arroz b')['id'] == 3
+    # Ambiguo o sin coincidencia: None
+    assert catalogo.buscar('arroz') is None
+    assert catalogo.buscar('frijol') is None
+    assert catalogo.stats['consultas'] == 4 and catalogo.stats['aciertos'] == 2
+
+
+def test_candidatos_por_prefijo():
+    catalogo = _catalogo()
+    assert [r['id'] for r in catalogo.candidatos('árroz')] == [3, 4]
+    assert [r['id'] for r in catalogo.candidatos('a', limite=2)] == [3, 4]
+    assert catalogo.candidatos('zz') == []
+
+
+def test_mapear_un_lote_de_nombres():
+    catalogo = _catalogo()
+    assert catalogo.mapear(['Café molido', 'HARINA DE MAIZ', 'arroz b', 'arroz', 'frijol']) == {
+        'Café molido': 1, 'HARINA DE MAIZ': 2, 'arroz b': 3, 'arroz': None, 'frijol': None,
+    }
+
+
+def test_completar_solo_agrega_las_claves_que_faltan():
+    catalogo = _catalogo()
+    data = catalogo.completar({'meses_cuspal': ['Julio']})
+    assert data['meses_cuspal'] == ['Julio']
+    assert data['anios_cuspal'] == ['2024', '2025']
+    assert [r['id'] for r in data['rubros_']] == [1, 2, 3, 4, 5]
+    data['rubros_'].clear()
+    assert len(catalogo.rubros) == 5
+
+
+def test_bot_carga_el_catalogo_desde_una_respuesta_parcial(crear_bot):
+    bot = crear_bot()
+    component_data = componente_registro()
+    # Livewire devuelve solo las propiedades modificadas: el catálogo se indexa desde el memo fusionado
+    bot._fusionar_server_memo(component_data, LivewireResponse(respuesta_livewire(200, {'serverMemo': {'data': DATA}})))
+    assert bot.catalogo.mapear(['cafe molido']) == {'cafe molido': 1}
+    bot._fusionar_server_memo(component_data, LivewireResponse(respuesta_livewire(200, {'serverMemo': {'checksum': 'c3'}})))
+    assert bot.catalogo.stats['cargas'] == 1
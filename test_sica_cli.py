@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la CLI: validación de argumentos antes de loguear
+"""
+
+import pytest
+
+import sica_cli
+
+
+@pytest.mark.parametrize('tipo,valor', [('cedula', '25526479'), ('placa', 'A22AK2C')])
+def test_lookup_de_cedula_o_placa_exige_empresa(tipo, valor, monkeypatch, capsys):
+    logins = []
+    monkeypatch.setattr(sica_cli, '_bot_logueado', lambda *a, **k: logins.append(1))
+    with pytest.raises(SystemExit) as salida:
+        sica_cli.main(['lookup', tipo, valor])
+    assert salida.value.code == 2
+    assert f"lookup {tipo} requiere --empresa" in capsys.readouterr().err
+    assert logins == []
+
+
+def test_lookup_de_empresa_no_exige_empresa():
+    args = sica_cli.construir_parser().parse_args(['lookup', 'empresa', '1234'])
+    assert args.funcion is sica_cli.cmd_lookup and args.empresa is None
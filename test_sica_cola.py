@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la cola de despachos: arrendamientos, vencimiento, latido, drenaje y coordinador
+"""
+
+import time
+import urllib.error
+
+import pytest
+
+from sica_apagado import Apagado
+from sica_cola import ColaDespachos, ColaRed, ColaSQLite, ServidorCola, ejecutar_worker, mantener_arrendamiento
+
+DESPACHO = {'codigo_empresa': '1234', 'cedula': 'V-1', 'placa': 'A22AK2C'}
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / 'cola.db')
+
+
+class _BotFalso:
+    """Bot mínimo para ejecutar_worker: cada despacho tarda 'demora' y termina en 'estado'"""
+
+    def __init__(self, estado='COMPLETADO', demora=0.0, durante=None):
+        self.apagado = Apagado(plazo=1)
+        self.estado = estado
+        self.demora = demora
+        self.durante = durante
+        self.despachos = []
+
+    def navigate_to_despachos_registrar(self):
+        return {'fingerprint': {'id': 'comp'}}
+
+    def ejecutar_despacho(self, component_data, codigo_empresa, cedula, placa):
+        self.despachos.append(placa)
+        if self.durante:
+            time.sleep(self.demora / 2)
+            self.durante()
+            time.sleep(self.demora / 2)
+        else:
+            time.sleep(self.demora)
+        return {'estado': self.estado, 'component_data': component_data}
+
+
+def test_interfaz_exige_todos_los_metodos():
+    with pytest.raises(TypeError):
+        ColaDespachos()
+
+    class ColaIncompleta(ColaDespachos):
+        def encolar(self, despacho, job_id=None, max_intentos=5, prioridad='normal', plazo=None):
+            return job_id
+
+    # Un backend al que le falta un método falla al instanciarse, no en el primer uso
+    with pytest.raises(TypeError, match='arrendar'):
+        ColaIncompleta()
+
+
+def test_arrendamiento_vencido_vuelve_a_estar_visible(ruta):
+    cola = ColaSQLite(ruta)
+    job_id = cola.encolar(DESPACHO)
+    primero = cola.arrendar('a', visibilidad=0.1)
+    assert cola.arrendar('b', visibilidad=0.1) is None
+
+    time.sleep(0.2)
+    segundo = cola.arrendar('b', visibilidad=30)
+    assert segundo['id'] == job_id and segundo['intentos'] == 2
+    # El primer worker perdió el arrendamiento: ya no puede extenderlo ni fallarlo
+    assert cola.extender(job_id, primero['lease_token']) is False
+    assert cola.fallar(job_id, primero['lease_token'], 'tarde') is None
+
+    # La completación se registra una sola vez, aunque la informen los dos
+    assert cola.completar(job_id, primero['lease_token'], {'estado': 'COMPLETADO'}) is True
+    assert cola.completar(job_id, segundo['lease_token'], {'estado': 'COMPLETADO'}) is False
+    assert cola.estadisticas() == {'completado': 1}
+
+
+def test_vencido_en_el_ultimo_intento_pasa_a_muertos(ruta):
+    cola = ColaSQLite(ruta)
+    cola.encolar(DESPACHO, max_intentos=1)
+    cola.arrendar('a', visibilidad=0.05)
+    time.sleep(0.1)
+    assert cola.arrendar('b') is None
+    assert [m['ultimo_error'] for m in cola.muertos()] == ['arrendamiento vencido']
+
+
+def test_fallar_aplica_backoff(ruta):
+    cola = ColaSQLite(ruta, backoff_base=0.2)
+    cola.encolar(DESPACHO)
+    trabajo = cola.arrendar('a')
+    assert cola.fallar(trabajo['id'], trabajo['lease_token'], 'TIMEOUT') == 'pendiente'
+    assert cola.arrendar('a') is None
+    time.sleep(0.25)
+    assert cola.arrendar('a')['intentos'] == 2
+
+
+def test_latido_mantiene_el_arrendamiento(ruta):
+    cola = ColaSQLite(ruta)
+    cola.encolar(DESPACHO)
+    trabajo = cola.arrendar('a', visibilidad=0.3)
+    with mantener_arrendamiento(cola, trabajo, visibilidad=0.3):
+        time.sleep(0.7)
+        assert ColaSQLite(ruta).arrendar('b', visibilidad=0.3) is None
+    time.sleep(0.4)
+    assert ColaSQLite(ruta).arrendar('b')['intentos'] == 2
+
+
+def test_worker_extiende_el_trabajo_mientras_lo_procesa(ruta):
+    cola = ColaSQLite(ruta)
+    job_id = cola.encolar(DESPACHO)
+    robados = []
+    bot = _BotFalso(demora=0.8, durante=lambda: robados.append(ColaSQLite(ruta).arrendar('otro', 0.3)))
+    ejecutar_worker(cola, bot, visibilidad=0.3)
+    assert robados == [None]
+    assert cola.estadisticas() == {'completado': 1}
+    assert cola.resultado(job_id)['resultado'] == {'estado': 'COMPLETADO'}
+
+
+def test_resultado_reintentable_vuelve_a_la_cola(ruta):
+    cola = ColaSQLite(ruta, backoff_base=60)
+    cola.encolar(DESPACHO)
+    ejecutar_worker(cola, _BotFalso(estado='TIMEOUT'))
+    assert cola.estadisticas() == {'pendiente': 1}
+
+
+def test_worker_con_apagado_solicitado_no_arrienda(ruta):
+    cola = ColaSQLite(ruta)
+    cola.encolar(DESPACHO)
+    bot = _BotFalso()
+    bot.apagado.solicitar('prueba')
+    ejecutar_worker(cola, bot)
+    assert bot.despachos == []
+    assert cola.estadisticas() == {'pendiente': 1}
+
+
+def test_servidor_fuera_de_localhost_exige_token(ruta):
+    with pytest.raises(ValueError):
+        ServidorCola(ColaSQLite(ruta), host='0.0.0.0')
+    assert ServidorCola(ColaSQLite(ruta)).host == '127.0.0.1'
+
+
+def test_coordinador_con_token(ruta, monkeypatch):
+    monkeypatch.delenv('SICA_COLA_TOKEN', raising=False)
+    servidor = ServidorCola(ColaSQLite(ruta), port=0, token='secreto')
+    host, port = servidor.iniciar()
+    try:
+        url = f"http://{host}:{port}"
+        with pytest.raises(urllib.error.HTTPError) as error:
+            ColaRed(url).estadisticas()
+        assert error.value.code == 401
+
+        cola = ColaRed(url, token='secreto')
+        job_id = cola.encolar(DESPACHO, prioridad='urgente')
+        trabajo = cola.arrendar('remoto', visibilidad=30)
+        assert trabajo['id'] == job_id
+        assert cola.extender(job_id, trabajo['lease_token'], 30) is True
+        assert cola.completar(job_id, trabajo['lease_token'], {'estado': 'COMPLETADO'}) is True
+        assert cola.estadisticas() == {'completado': 1}
+    finally:
+        servidor.detener()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Pruebas de las primitivas de concurrencia: SingleFlight, limitador AIMD, hedging y su uso en el bot
+"""
+
+import threading
+import time
+
+import pytest
+
+from conftest import componente_registro, respuesta_livewire
+from sica_concurrencia import LimitadorAdaptativo, PoliticaHedge, SingleFlight
+
+
+def _en_paralelo(*funciones):
+    resultados = [None] * len(funciones)
+
+    def correr(indice, funcion):
+        resultados[indice] = funcion()
+
+    hilos = [threading.Thread(target=correr, args=(i, f)) for i, f in enumerate(funciones)]
+    for hilo in hilos:
+        hilo.start()
+        time.sleep(0.02)
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+
+# --- SingleFlight ---
+
+def test_singleflight_ejecuta_una_vez_y_copia_el_resultado():
+    singleflight = SingleFlight()
+    ejecuciones = []
+
+    def buscar():
+        ejecuciones.append(1)
+        time.sleep(0.2)
+        return {'registro': {'id': 7}}
+
+    resultados = _en_paralelo(*[lambda: singleflight.do('clave', buscar) for _ in range(4)])
+    assert len(ejecuciones) == 1
+    assert sorted(compartido for _, compartido in resultados) == [False, True, True, True]
+    valores = [valor for valor, _ in resultados]
+    assert all(v == {'registro': {'id': 7}} for v in valores)
+    # Cada llamador coalescido tiene su propia copia
+    assert len({id(v) for v in valores}) == 4
+    assert singleflight.estadisticas()['coalescidas'] == 3
+    assert singleflight.en_vuelo() == 0
+
+
+def test_singleflight_propaga_el_error_a_todos():
+    singleflight = SingleFlight()
+
+    def fallar():
+        time.sleep(0.1)
+        raise TimeoutError('lento')
+
+    errores = []
+
+    def llamar():
+        try:
+            singleflight.do('clave', fallar)
+        except TimeoutError as e:
+            errores.append(e)
+
+    _en_paralelo(llamar, llamar)
+    assert len(errores) == 2
+    assert singleflight.estadisticas()['errores'] == 1
+
+
+def test_singleflight_claves_distintas_no_se_coalescen():
+    singleflight = SingleFlight()
+    resultados = _en_paralelo(lambda: singleflight.do('a', lambda: 1), lambda: singleflight.do('b', lambda: 2))
+    assert resultados == [(1, False), (2, False)]
+
+
+# --- Búsquedas del bot ---
+
+@pytest.fixture
+def bots_compartidos(crear_bot):
+    """Dos bots con un SingleFlight compartido; cada request tarda 0.2 s"""
+    singleflight = SingleFlight()
+    bots = [crear_bot(singleflight=singleflight) for _ in range(2)]
+    for bot in bots:
+        bot.enviados = []
+
+        def request(method, url, _bot=bot, **kwargs):
+            _bot.enviados.append(kwargs['json']['fingerprint']['id'])
+            time.sleep(0.2)
+            return respuesta_livewire(200, {'serverMemo': {
+                'data': {'conductores': [{'id': 9, 'cedula': 'V-1'}]},
+                'checksum': f"nuevo-{kwargs['json']['fingerprint']['id']}", 'htmlHash': 'h2'}})
+
+        bot.session.request = request
+    return bots
+
+
+def _componente_con_empresa(numero):
+    componente = componente_registro(numero)
+    componente['serverMemo']['data']['data']['THd2VHJ1QzNOWDVoUjlBRGZaSzIrZz09'] = 7
+    return componente
+
+
+def test_busqueda_de_solo_lectura_se_coalesce(bots_compartidos):
+    a, b = bots_compartidos
+    componentes = [_componente_con_empresa(1), _componente_con_empresa(2)]
+    resultados = _en_paralelo(
+        lambda: a.search_conductor_by_cedula('V-1', componentes[0], solo_lectura=True),
+        lambda: b.search_conductor_by_cedula('V-1', componentes[1], solo_lectura=True),
+    )
+    assert resultados[0]['id'] == resultados[1]['id'] == 9
+    assert len(a.enviados) + len(b.enviados) == 1
+
+
+def test_busqueda_de_un_despacho_no_se_coalesce(bots_compartidos):
+    a, b = bots_compartidos
+    componentes = [_componente_con_empresa(1), _componente_con_empresa(2)]
+    _en_paralelo(
+        lambda: a.search_conductor_by_cedula('V-1', componentes[0]),
+        lambda: b.search_conductor_by_cedula('V-1', componentes[1]),
+    )
+    assert a.enviados == ['comp1'] and b.enviados == ['comp2']
+    # Cada componente queda con el serverMemo de su propia búsqueda
+    assert componentes[0]['serverMemo']['checksum'] == 'nuevo-comp1'
+    assert componentes[1]['serverMemo']['checksum'] == 'nuevo-comp2'
+
+
+# --- Limitador AIMD ---
+
+def test_limitador_bloquea_sobre_el_limite():
+    limitador = LimitadorAdaptativo(limite_inicial=2)
+    permisos = [limitador.adquirir('buscar'), limitador.adquirir('buscar')]
+    with pytest.raises(TimeoutError):
+        limitador.adquirir('buscar', timeout=0.05)
+    # Otra operación tiene su propio límite
+    limitador.adquirir('otra', timeout=0.05).liberar(0.01)
+
+    liberado = threading.Timer(0.05, lambda: permisos[0].liberar(0.01))
+    liberado.start()
+    limitador.adquirir('buscar', timeout=1)
+    assert limitador.metricas()['buscar']['en_vuelo'] == 2
+
+
+def test_limitador_sube_aditivo_y_recorta_multiplicativo():
+    limitador = LimitadorAdaptativo(limite_inicial=4, enfriamiento=60)
+    for _ in range(8):
+        limitador.adquirir('buscar').liberar(0.1)
+    assert limitador.limite('buscar') == 5
+
+    limitador.adquirir('buscar').liberar(0.1, fallo='http_5xx')
+    assert limitador.limite('buscar') == 2
+    # La misma ráfaga de fallos no vuelve a recortar durante el enfriamiento
+    limitador.adquirir('buscar').liberar(0.1, fallo='timeout')
+    metricas = limitador.metricas()['buscar']
+    assert metricas['limite'] == 2 and metricas['recortes'] == 1
+    assert metricas['fallos_por_motivo'] == {'http_5xx': 1, 'timeout': 1}
+
+
+def test_limitador_no_sube_con_respuestas_lentas():
+    limitador = LimitadorAdaptativo(limite_inicial=4, factor_latencia=3.0)
+    limitador.adquirir('buscar').liberar(0.1)
+    for _ in range(20):
+        limitador.adquirir('buscar').liberar(1.0)
+    assert limitador.limite('buscar') == 4
+
+
+def test_limitador_nunca_baja_del_minimo():
+    limitador = LimitadorAdaptativo(limite_inicial=2, limite_minimo=1, enfriamiento=0)
+    for _ in range(5):
+        limitador.adquirir('buscar').liberar(0.1, fallo='loading')
+    assert limitador.limite('buscar') == 1
+
+
+def test_5xx_del_bot_recorta_el_limite_de_la_operacion(crear_bot, sesion_falsa):
+    bot = crear_bot()
+    sesion_falsa(bot, [respuesta_livewire(503)])
+    bot._request('GET', 'despachos', f"{bot.base_url}/despachos")
+    metricas = bot.limitador.metricas()['despachos']
+    assert metricas['fallos_por_motivo'] == {'http_5xx': 1}
+    assert metricas['limite'] == 2 and metricas['en_vuelo'] == 0
+
+
+# --- Hedging ---
+
+def test_hedge_duplica_lo_lento_y_usa_la_primera_respuesta():
+    hedge = PoliticaHedge()
+    llamadas = []
+
+    def leer():
+        llamadas.append(1)
+        time.sleep(0.3 if len(llamadas) == 1 else 0.01)
+        return len(llamadas)
+
+    assert hedge.ejecutar(leer, retraso=0.05) == 2
+    assert hedge.metricas()['ganados_por_hedge'] == 1
+
+
+def test_hedge_sin_presupuesto_espera_al_primario():
+    hedge = PoliticaHedge(rafaga=1)
+    hedge._fichas = 0.0
+    llamadas = []
+    assert hedge.ejecutar(lambda: llamadas.append(1) or time.sleep(0.1) or 'ok', retraso=0.01) == 'ok'
+    assert len(llamadas) == 1
+    assert hedge.metricas()['sin_presupuesto'] == 1
+
+
+@pytest.fixture
+def bot_con_hedge(crear_bot):
+    """Bot con hedging (p95 de 0.05 s): comp1 tarda 0.3 s en responder, el resto 0.01 s"""
+    bot = crear_bot(hedge=PoliticaHedge())
+    bot.timeouts.percentil = lambda operacion, q: 0.05
+    bot.enviados = []
+
+    def request(method, url, **kwargs):
+        componente = kwargs['json']['fingerprint']['id'] if 'json' in kwargs else None
+        bot.enviados.append((method, componente))
+        time.sleep(0.3 if componente in (None, 'comp1') else 0.01)
+        return respuesta_livewire(200, {'serverMemo': {
+            'data': {'conductores': [{'id': 9, 'cedula': 'V-1'}]},
+            'checksum': f"nuevo-{componente}", 'htmlHash': 'h2'}})
+
+    bot.session.request = request
+    return bot
+
+
+def test_lectura_del_listado_se_duplica(bot_con_hedge):
+    bot_con_hedge._request('GET', 'despachos', f"{bot_con_hedge.base_url}/despachos")
+    assert bot_con_hedge.enviados == [('GET', None), ('GET', None)]
+
+
+def test_tabla_del_listado_se_duplica(bot_con_hedge):
+    bot_con_hedge._request('POST', 'despachos_tabla', f"{bot_con_hedge.base_url}/api/app/tabla",
+                           json={'fingerprint': {'id': 'comp1'}})
+    assert bot_con_hedge.enviados == [('POST', 'comp1'), ('POST', 'comp1')]
+
+
+def test_busqueda_sin_reserva_no_se_duplica(bot_con_hedge):
+    # Dos POST en vuelo sobre el mismo componente desincronizarían su serverMemo
+    bot_con_hedge.search_conductor_by_cedula('V-1', _componente_con_empresa(1))
+    assert bot_con_hedge.enviados == [('POST', 'comp1')]
+
+
+def test_busqueda_lenta_se_duplica_sobre_un_componente_de_repuesto(bot_con_hedge):
+    repuestos = [_componente_con_empresa(2)]
+    bot_con_hedge.componente_repuesto = lambda: repuestos.pop() if repuestos else None
+    componente = _componente_con_empresa(1)
+    conductor = bot_con_hedge.search_conductor_by_cedula('V-1', componente)
+    assert conductor['id'] == 9
+    assert bot_con_hedge.enviados == [('POST', 'comp1'), ('POST', 'comp2')]
+    assert bot_con_hedge.hedge.metricas()['ganados_por_hedge'] == 1
+    # El componente del despacho adopta el estado del intento ganador, y el primario
+    # (que responde después) no lo vuelve a tocar
+    time.sleep(0.4)
+    assert componente['fingerprint']['id'] == 'comp2'
+    assert componente['serverMemo']['checksum'] == 'nuevo-comp2'
+
+
+def test_sin_componente_de_repuesto_espera_al_primario(bot_con_hedge):
+    bot_con_hedge.componente_repuesto = lambda: None
+    componente = _componente_con_empresa(1)
+    bot_con_hedge.search_conductor_by_cedula('V-1', componente)
+    assert bot_con_hedge.enviados == [('POST', 'comp1')]
+    assert componente['serverMemo']['checksum'] == 'nuevo-comp1'
+    metricas = bot_con_hedge.hedge.metricas()
+    assert metricas['hedges'] == 0 and metricas['sin_duplicado'] == 1
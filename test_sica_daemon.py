@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la API local del daemon: validación de POST /despachos
+"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from sica_apagado import Apagado
+from sica_daemon import DaemonSICA, _ManejadorAPI
+
+DESPACHO = {'codigo_empresa': '1234', 'cedula': 'V-1', 'placa': 'A22AK2C'}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """URL de la API de un daemon sin workers (los trabajos quedan en cola)"""
+    monkeypatch.chdir(tmp_path)
+    daemon = DaemonSICA('usuario', 'clave', checkpoint=str(tmp_path / 'daemon.checkpoint.json'),
+                        apagado=Apagado(plazo=1))
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), type('ManejadorAPI', (_ManejadorAPI,), {'daemon': daemon}))
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _post(url, cuerpo):
+    datos = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode('utf-8')
+    request = urllib.request.Request(f"{url}/despachos", data=datos, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_despacho_valido_se_encola(api):
+    status, trabajo = _post(api, dict(DESPACHO, prioridad='urgente', plazo_minutos='30'))
+    assert status == 202
+    assert trabajo['estado'] == 'EN_COLA' and trabajo['prioridad'] == 'urgente'
+    assert isinstance(trabajo['plazo'], float)
+
+
+@pytest.mark.parametrize('extra', [
+    {'plazo_minutos': 'pronto'},
+    {'plazo': [1]},
+    {'plazo': 'nan'},
+    {'prioridad': ['urgente']},
+    {'prioridad': {'clase': 'urgente'}},
+    {'prioridad': 'altisima'},
+])
+def test_plazo_o_prioridad_invalidos_responden_400(api, extra):
+    status, respuesta = _post(api, dict(DESPACHO, **extra))
+    assert status == 400
+    assert respuesta['error']
+
+
+def test_cuerpo_que_no_es_objeto_responde_400(api):
+    assert _post(api, [DESPACHO])[0] == 400
+    assert _post(api, b'{no es json')[0] == 400
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Pruebas del escaneo de flota: lectura del CSV, normalización, reporte y empresa obligatoria
+"""
+
+import csv
+
+import pytest
+
+import sica_flota
+from sica_bot import normalizar_cedula, normalizar_placa
+from sica_flota import EscanerFlota, escribir_reporte, leer_entradas, preparar
+
+
+def _csv(tmp_path, texto, nombre='flota.csv'):
+    ruta = tmp_path / nombre
+    ruta.write_text(texto, encoding='utf-8-sig')
+    return str(ruta)
+
+
+def test_leer_entradas_tolera_bom_mayusculas_y_celdas_vacias(tmp_path):
+    ruta = _csv(tmp_path, " Cedula ,PLACA\n25526479 , a22ak2c\n,B33BB3B\nV-1,\n")
+    assert leer_entradas(ruta) == (['25526479', 'V-1'], ['a22ak2c', 'B33BB3B'])
+
+
+def test_leer_entradas_solo_placas(tmp_path):
+    assert leer_entradas(_csv(tmp_path, "placa\nA22AK2C\n")) == ([], ['A22AK2C'])
+
+
+def test_preparar_normaliza_deduplica_y_separa_invalidos():
+    validos, invalidos = preparar(['25526479', 'v25526479', 'V-25526479', 'X-1', '', 'E-811'], normalizar_cedula)
+    assert validos == [('25526479', 'V-25526479'), ('E-811', 'E-811')]
+    assert invalidos == ['X-1', '']
+
+    validos, invalidos = preparar([' a22ak2c', 'A22AK2C', 'A2', 'A22-AK2C'], normalizar_placa)
+    assert validos == [(' a22ak2c', 'A22AK2C')]
+    assert invalidos == ['A2', 'A22-AK2C']
+
+
+def test_escribir_reporte(tmp_path):
+    ruta = str(tmp_path / 'reporte.csv')
+    resultados = [
+        {'tipo': 'placa', 'entrada': 'a22ak2c', 'valor': 'A22AK2C', 'estado': 'ENCONTRADO',
+         'registro': {'id': 5, 'placa': 'A22AK2C', 'marca': 'ÑANDÚ'}},
+        {'tipo': 'cedula', 'entrada': '1', 'valor': 'V-1', 'estado': 'NO_ENCONTRADO', 'registro': None},
+        {'tipo': 'cedula', 'entrada': '2', 'valor': 'V-2', 'estado': 'ERROR', 'error': 'HTTP 503'},
+    ]
+    escribir_reporte(resultados, [('placa', 'A2')], ruta)
+    with open(ruta, 'r', encoding='utf-8', newline='') as f:
+        filas = list(csv.reader(f))
+    assert filas == [
+        ['tipo', 'entrada', 'valor', 'estado', 'id', 'detalle'],
+        ['placa', 'a22ak2c', 'A22AK2C', 'ENCONTRADO', '5', '{"id":5,"placa":"A22AK2C","marca":"ÑANDÚ"}'],
+        ['cedula', '1', 'V-1', 'NO_ENCONTRADO', '', ''],
+        ['cedula', '2', 'V-2', 'ERROR', '', 'HTTP 503'],
+        ['placa', 'A2', '', 'INVALIDO', '', ''],
+    ]
+
+
+def test_escanear_cedulas_sin_empresa_falla_antes_de_abrir_componentes():
+    class _Bot:
+        def abrir_componentes_registrar(self, n):
+            raise AssertionError("no debería abrir componentes")
+
+    with pytest.raises(ValueError):
+        EscanerFlota(_Bot()).escanear(cedulas=[('1', 'V-1')])
+
+
+def test_main_con_cedulas_exige_empresa(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sica_flota.PoolCuentas, 'desde_entorno', lambda: pytest.fail("no debería loguear"))
+    with pytest.raises(SystemExit) as salida:
+        sica_flota.main([_csv(tmp_path, "cedula,placa\n25526479,A22AK2C\n")])
+    assert salida.value.code == 2
+    assert '--empresa' in capsys.readouterr().err
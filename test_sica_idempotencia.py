@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la guardia de idempotencia: fallos ambiguos verificados contra el listado
+"""
+
+from datetime import datetime
+
+import pytest
+import requests
+
+from conftest import respuesta_livewire
+from sica_apagado import Apagado
+from sica_cola import ColaSQLite, ejecutar_worker
+from sica_idempotencia import ESCRITURA_INICIADA, GuardiaIdempotencia, clave_idempotencia
+
+
+def tabla_despachos(*filas):
+    """HTML del listado de despachos con filas (nro, facturas, destino) emitidas ahora"""
+    emision = datetime.now().strftime('%d/%m/%Y %I:%M:%S %p')
+    cuerpo = ''.join(
+        f"<tr><td>EMITIDA</td><td>{nro}</td><td>{facturas}</td><td>ORIGEN</td><td>{destino}</td>"
+        f"<td>{emision}</td><td>31/12/2099</td></tr>"
+        for nro, facturas, destino in filas
+    )
+    return f'<table id="tabla-component"><tbody>{cuerpo}</tbody></table>'
+
+
+class _Listado:
+    def __init__(self, html):
+        self.html = html
+
+
+class _BotListado:
+    """Bot mínimo: solo responde el listado de despachos"""
+
+    def __init__(self, html=None):
+        self.html = html
+        self.pedidos = []
+
+    def get_despachos_data(self, conservar_html=None):
+        self.pedidos.append(conservar_html)
+        return _Listado(self.html) if self.html else None
+
+
+class _BotCola:
+    """Bot mínimo para ejecutar_worker: cada despacho termina en el siguiente estado de la lista"""
+
+    def __init__(self, estados):
+        self.apagado = Apagado(plazo=1)
+        self.estados = list(estados)
+        self.despachos = []
+        self.pedidos_listado = 0
+
+    def navigate_to_despachos_registrar(self):
+        return {'fingerprint': {'id': 'comp'}}
+
+    def ejecutar_despacho(self, component_data, codigo_empresa, cedula, placa):
+        self.despachos.append(placa)
+        return {'estado': self.estados.pop(0), 'component_data': component_data}
+
+    def get_despachos_data(self, conservar_html=None):
+        self.pedidos_listado += 1
+        return None
+
+
+@pytest.fixture
+def guardia(tmp_path):
+    return GuardiaIdempotencia(str(tmp_path / 'idempotencia.db'))
+
+
+DESPACHO = {'id': 't1', 'codigo_empresa': '1234', 'cedula': 'V-1', 'placa': 'A22AK2C', 'facturas': 'F-991',
+            'destino': 'MARACAY'}
+
+
+@pytest.mark.parametrize('estado', ['TIMEOUT', 'ERROR', 'INTERRUMPIDO'])
+def test_fallo_tras_escritura_verificado_en_el_listado_no_se_reenvia(guardia, estado):
+    bot = _BotListado(tabla_despachos(('55501', 'F-990, F-991', 'MARACAY')))
+    envios = []
+
+    def enviar():
+        envios.append(1)
+        return {'estado': estado, ESCRITURA_INICIADA: True}
+
+    resultado = guardia.ejecutar(DESPACHO, enviar, bot)
+    assert resultado['estado'] == 'COMPLETADO'
+    assert resultado['verificado_en_listado']['nro_despacho'] == '55501'
+    assert bot.pedidos == [True]
+
+    # Reintento de la cola: confirmado, enviar() no se vuelve a llamar
+    assert guardia.ejecutar(DESPACHO, enviar, bot)['estado'] == 'COMPLETADO'
+    assert len(envios) == 1
+
+
+@pytest.mark.parametrize('estado', ['TIMEOUT', 'ERROR', 'INTERRUMPIDO'])
+def test_fallo_sin_escritura_no_es_ambiguo(guardia, estado):
+    bot = _BotListado(tabla_despachos(('55501', 'F-991', 'MARACAY')))
+    despacho = dict(DESPACHO, facturas='')
+    resultado = guardia.ejecutar(despacho, lambda: {'estado': estado}, bot)
+    assert resultado['estado'] == estado
+    assert bot.pedidos == []
+    assert guardia.consultar('t1')['estado'] == GuardiaIdempotencia.FALLIDO
+
+    # El reintento se envía normalmente, sin pasar a REQUIERE_REVISION
+    assert guardia.ejecutar(despacho, lambda: {'estado': 'COMPLETADO'}, bot)['estado'] == 'COMPLETADO'
+
+
+def test_timeout_tras_escritura_sin_guia_queda_ambiguo_y_se_reintenta(guardia):
+    bot = _BotListado(tabla_despachos(('55501', 'OTRA', 'MARACAY')))
+    resultado = guardia.ejecutar(DESPACHO, lambda: {'estado': 'TIMEOUT', ESCRITURA_INICIADA: True}, bot)
+    assert resultado['estado'] == 'TIMEOUT'
+    assert guardia.consultar('t1')['estado'] == GuardiaIdempotencia.AMBIGUO
+
+    # Segundo intento: verifica de nuevo y, sin guía, reenvía
+    resultado = guardia.ejecutar(DESPACHO, lambda: {'estado': 'COMPLETADO', 'nro_despacho': '55600'}, bot)
+    assert resultado['estado'] == 'COMPLETADO'
+    registro = guardia.consultar('t1')
+    assert registro['estado'] == GuardiaIdempotencia.CONFIRMADO
+    assert registro['intentos'] == 2
+
+
+def test_ambiguo_sin_facturas_requiere_revision(guardia):
+    despacho = dict(DESPACHO, facturas='')
+    bot = _BotListado(tabla_despachos())
+    guardia.ejecutar(despacho, lambda: {'estado': 'TIMEOUT', ESCRITURA_INICIADA: True}, bot)
+
+    envios = []
+    resultado = guardia.ejecutar(despacho, lambda: envios.append(1) or {'estado': 'COMPLETADO'}, bot)
+    assert resultado['estado'] == 'REQUIERE_REVISION'
+    assert envios == []
+
+
+def test_excepcion_de_red_solo_es_ambigua_tras_escritura(guardia):
+    bot = _BotListado(tabla_despachos())
+
+    def enviar(escritura):
+        error = requests.ReadTimeout('lectura vencida')
+        if escritura:
+            setattr(error, ESCRITURA_INICIADA, True)
+        raise error
+
+    with pytest.raises(requests.ReadTimeout):
+        guardia.ejecutar(DESPACHO, lambda: enviar(False), bot)
+    assert guardia.consultar('t1')['estado'] == GuardiaIdempotencia.FALLIDO
+    assert bot.pedidos == []
+
+    with pytest.raises(requests.ReadTimeout):
+        guardia.ejecutar(DESPACHO, lambda: enviar(True), bot)
+    assert guardia.consultar('t1')['estado'] == GuardiaIdempotencia.AMBIGUO
+    assert bot.pedidos == [True]
+
+
+def test_no_encontrado_es_definitivo_y_no_se_verifica(guardia):
+    bot = _BotListado(tabla_despachos())
+    resultado = guardia.ejecutar(DESPACHO, lambda: {'estado': 'EMPRESA_NO_ENCONTRADA'}, bot)
+    assert resultado['estado'] == 'EMPRESA_NO_ENCONTRADA'
+    assert bot.pedidos == []
+    assert guardia.consultar('t1')['estado'] == GuardiaIdempotencia.FALLIDO
+
+
+def test_clave_es_la_del_trabajo_y_no_el_contenido(guardia):
+    bot = _BotListado(tabla_despachos())
+    guardia.ejecutar(DESPACHO, lambda: {'estado': 'COMPLETADO', 'nro_despacho': '1'}, bot)
+    # Mismo contenido en otro trabajo: es otro viaje y se envía
+    envios = []
+    guardia.ejecutar(dict(DESPACHO, id='t2'), lambda: envios.append(1) or {'estado': 'COMPLETADO'}, bot)
+    assert envios == [1]
+    assert clave_idempotencia({'id': 't3', 'clave_idempotencia': 'propia'}) == 'propia'
+    with pytest.raises(ValueError):
+        clave_idempotencia({'placa': 'A22AK2C'})
+
+
+def test_buscar_despacho_compara_valores_exactos(guardia):
+    guardia.indexar_despachos([
+        {'nro_despacho': '1', 'estatus': 'EMITIDA', 'facturas': '1234', 'origen': 'O', 'destino': 'MARACAY NORTE',
+         'emision': None, 'vencimiento': ''},
+        {'nro_despacho': '2', 'estatus': 'EMITIDA', 'facturas': '12 / 99', 'origen': 'O', 'destino': 'maracay',
+         'emision': None, 'vencimiento': ''},
+    ])
+    assert guardia.buscar_despacho({'facturas': '12', 'destino': 'MARACAY'}, 0)['nro_despacho'] == '2'
+    assert guardia.buscar_despacho({'facturas': '123'}, 0) is None
+    assert guardia.buscar_despacho({'facturas': '1234', 'destino': 'MARACAY'}, 0) is None
+
+
+def test_sincronizar_pide_el_html_aunque_el_bot_lo_descarte(guardia, crear_bot, sesion_falsa):
+    bot = crear_bot(conservar_html=False)
+    html = tabla_despachos(('55501', 'F-991', 'MARACAY'), ('55502', 'F-992', 'VALENCIA'))
+    sesion_falsa(bot, [respuesta_livewire(200, {'effects': {'html': html}, 'serverMemo': {}})])
+    assert guardia.sincronizar(bot) == 2
+    assert guardia.buscar_despacho(DESPACHO, 0)['nro_despacho'] == '55501'
+
+
+def test_worker_con_guardia_reintenta_un_timeout_de_busqueda(guardia, tmp_path):
+    cola = ColaSQLite(str(tmp_path / 'cola.db'), backoff_base=0)
+    primero = cola.encolar(dict(DESPACHO, facturas=''))
+    segundo = cola.encolar(dict(DESPACHO, facturas=''))
+    bot = _BotCola(['TIMEOUT', 'COMPLETADO', 'COMPLETADO'])
+    ejecutar_worker(cola, bot, guardia=guardia)
+    ejecutar_worker(cola, bot, guardia=guardia)
+    # El timeout no llega a REQUIERE_REVISION ni a la cola de muertos, y el mismo contenido
+    # en dos trabajos son dos guías
+    assert cola.estadisticas() == {'completado': 2}
+    assert len(bot.despachos) == 3 and bot.pedidos_listado == 0
+    assert guardia.consultar(primero)['estado'] == GuardiaIdempotencia.CONFIRMADO
+    assert guardia.consultar(segundo)['estado'] == GuardiaIdempotencia.CONFIRMADO
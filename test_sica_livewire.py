@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Pruebas de LivewireResponse: una sola decodificación, sin cuerpo crudo ni HTML descartado
+"""
+
+import json
+
+import pytest
+
+from conftest import componente_registro, respuesta_livewire
+from sica_livewire import LivewireResponse
+
+PAYLOAD = {
+    'effects': {
+        'html': '<div wire:id="x">{"no": "es json"} \\ "comillas" ñandú</div>',
+        'dirty': ['data'],
+        'emits': [{'event': 'alert', 'params': ['success', 'Empresa seleccionada']}],
+    },
+    'serverMemo': {
+        'checksum': 'abc123',
+        'htmlHash': 'h2',
+        'data': {'empresas': [{'id': 7, 'razon_social': 'A, B [y] {C}'}], 'data': {}},
+    },
+}
+
+
+def _respuesta(cuerpo):
+    response = respuesta_livewire(200)
+    response._content = cuerpo.encode('utf-8')
+    return response
+
+
+def test_json_invalido_falla_al_recibirlo():
+    with pytest.raises(json.JSONDecodeError):
+        LivewireResponse(_respuesta('<html>loading...</html>'))
+
+
+def test_equivale_a_response_json():
+    lw = LivewireResponse(respuesta_livewire(200, PAYLOAD))
+    assert lw.checksum == 'abc123'
+    assert lw.data == PAYLOAD['serverMemo']['data']
+    assert lw.emits == PAYLOAD['effects']['emits']
+    assert lw.html == PAYLOAD['effects']['html']
+    assert lw.effects == {'dirty': ['data'], 'emits': PAYLOAD['effects']['emits']}
+    assert lw.alerta('success')['params'][1] == 'Empresa seleccionada'
+    assert lw.to_dict() == PAYLOAD
+    assert lw.resumen().startswith("checksum=abc123... data_keys=['empresas', 'data'] emits=1")
+
+
+def test_no_retiene_el_cuerpo_crudo():
+    lw = LivewireResponse(respuesta_livewire(200, PAYLOAD))
+    assert lw.bytes_recibidos == len(json.dumps(PAYLOAD).encode('utf-8'))
+    assert not any(isinstance(v, bytes) for v in vars(lw).values())
+    assert lw._html_tree is None
+    assert lw.html_tree.get_text().startswith('{"no": "es json"}')
+
+
+def test_sin_conservar_html_lo_descarta():
+    lw = LivewireResponse(respuesta_livewire(200, PAYLOAD), conservar_html=False)
+    assert lw.html is None and lw.html_tree is None
+    assert lw.effects == {'dirty': ['data'], 'emits': PAYLOAD['effects']['emits']}
+    assert PAYLOAD['effects']['html'] not in repr(vars(lw))
+
+
+def test_cuerpo_truncado_es_error_de_json():
+    cuerpo = json.dumps(PAYLOAD)[:-20]
+    with pytest.raises(json.JSONDecodeError):
+        LivewireResponse(_respuesta(cuerpo))
+
+
+def test_compatibilidad_con_dict():
+    lw = LivewireResponse(respuesta_livewire(200, PAYLOAD), conservar_html=False)
+    assert 'serverMemo' in lw and 'fingerprint' not in lw
+    assert lw['serverMemo']['htmlHash'] == 'h2'
+    assert lw.get('fingerprint', 'nada') == 'nada'
+    with pytest.raises(KeyError):
+        lw['fingerprint']
+    # El dict completo no incluye el HTML descartado
+    assert 'html' not in lw.to_dict()['effects']
+    assert lw.server_memo == PAYLOAD['serverMemo']
+
+
+def test_busqueda_sin_conservar_html_no_lo_deja_en_last_search_result(crear_bot, sesion_falsa):
+    bot = crear_bot(conservar_html=False)
+    payload = {'effects': {'html': '<div>empresa 1234</div>'},
+               'serverMemo': {'checksum': 'c2', 'data': {'empresas': [{'id': 7}]}}}
+    sesion_falsa(bot, [respuesta_livewire(200, payload)])
+    bot.search_empresa_by_codigo('1234', componente_registro())
+    assert bot.last_search_result.html is None
+    assert '<div>' not in repr(vars(bot.last_search_result))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Pruebas del perfilado por operación: modos, anidamiento, muestreo, memoria y reportes del bot
+"""
+
+import time
+import tracemalloc
+
+import pytest
+
+from conftest import componente_registro, respuesta_livewire
+from sica_perfil import MODOS, Perfilador, parsear_modos, perfilado
+
+
+def _trabajo(n=20000):
+    return sum(i * i for i in range(n))
+
+
+def test_parsear_modos():
+    assert parsear_modos(None) == () and parsear_modos('0') == ()
+    assert parsear_modos('todo') == MODOS and parsear_modos('1') == MODOS
+    assert parsear_modos(' cprofile , memoria ') == ('cprofile', 'memoria')
+    with pytest.raises(ValueError, match='pyinstrument'):
+        parsear_modos('cprofile,pyinstrument')
+
+
+def test_anidada_queda_dentro_del_perfil_externo():
+    perfilador = Perfilador(('cprofile',))
+
+    def externa():
+        return perfilador.ejecutar('interna', _trabajo) + perfilador.ejecutar('interna', _trabajo)
+
+    assert perfilador.ejecutar('externa', externa) == 2 * _trabajo()
+    resumen = perfilador.resumen()
+    assert resumen['externa']['llamadas'] == 1 and resumen['interna']['llamadas'] == 2
+    # La interna solo acumula tiempo; su cProfile está en el de la externa
+    assert perfilador._operaciones['interna'].stats is None
+    reporte = perfilador._reporte('externa', perfilador._operaciones['externa'])
+    assert '=== cProfile' in reporte and '_trabajo' in reporte
+
+
+def test_excepcion_igual_se_acumula():
+    perfilador = Perfilador(('cprofile',))
+
+    def falla():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        perfilador.ejecutar('falla', falla)
+    assert perfilador.resumen()['falla']['llamadas'] == 1
+    # El hilo no queda marcado como dentro de una operación
+    assert perfilador._activos == {} and perfilador._local.profundidad == 0
+
+
+def test_muestreo_registra_la_pila_de_la_operacion():
+    perfilador = Perfilador(('muestreo',), intervalo_muestreo=0.001)
+    try:
+        perfilador.ejecutar('dormir', time.sleep, 0.1)
+    finally:
+        perfilador._detener.set()
+    pilas = perfilador._operaciones['dormir'].pilas
+    assert pilas and all(pila.endswith('test_sica_perfil.py:test_muestreo_registra_la_pila_de_la_operacion'
+                                       ';sica_perfil.py:ejecutar') for pila in pilas)
+
+
+def test_memoria_registra_lo_retenido():
+    ya_activo = tracemalloc.is_tracing()
+    perfilador = Perfilador(('memoria',))
+    retenido = []
+    try:
+        perfilador.ejecutar('retener', lambda: retenido.append(bytearray(2_000_000)))
+    finally:
+        if not ya_activo:
+            tracemalloc.stop()
+    perfil = perfilador._operaciones['retener']
+    assert perfil.bytes_netos >= 2_000_000
+    linea, tamano = perfil.asignaciones.most_common(1)[0]
+    assert 'test_sica_perfil.py:' in linea
+    assert tamano >= 2_000_000
+
+
+def test_decorador_sin_perfilador_no_envuelve_nada():
+    class Bot:
+        perfilador = None
+
+        @perfilado
+        def operar(self, x):
+            return x + 1
+
+    bot = Bot()
+    assert bot.operar(1) == 2 and Bot.operar.__name__ == 'operar'
+    bot.perfilador = Perfilador(('cprofile',))
+    assert bot.operar(2) == 3
+    assert bot.perfilador.resumen()['operar']['llamadas'] == 1
+
+
+def test_bot_perfila_sus_operaciones_y_vuelca_reportes(crear_bot, sesion_falsa):
+    bot = crear_bot(perfilador=Perfilador(('cprofile',)))
+    payload = {'serverMemo': {'checksum': 'c2', 'data': {'empresas': [{'id': 7}]}}}
+    sesion_falsa(bot, [respuesta_livewire(200, payload)])
+    bot.search_empresa_by_codigo('1234', componente_registro())
+    assert bot.perfilador.resumen()['search_empresa_by_codigo']['llamadas'] == 1
+
+    bot.perfilador.volcar(bot.artefactos)
+    bot.artefactos.vaciar()
+    reporte = bot.artefactos.leer('perfil_search_empresa_by_codigo.txt', clave='perfil')
+    assert reporte.startswith('Operación: search_empresa_by_codigo\nLlamadas: 1')
+    assert '=== cProfile' in reporte
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Pruebas del planificador de despachos: prioridad, EDF, reserva urgente y plazos
+"""
+
+import queue
+import threading
+import time
+
+import pytest
+
+from sica_planificador import PlanificadorDespachos, clase_prioridad
+
+
+def _vaciar(planificador):
+    items = []
+    while True:
+        try:
+            item = planificador.get(timeout=0)
+        except queue.Empty:
+            return items
+        items.append(item)
+        planificador.terminar(item)
+
+
+def test_clase_prioridad():
+    assert clase_prioridad(None) == 'normal'
+    assert clase_prioridad(0) == 'urgente'
+    assert clase_prioridad('masivo') == 'masivo'
+    with pytest.raises(ValueError):
+        clase_prioridad('altisima')
+    # Un valor no hashable (p. ej. una lista en el JSON de la API) también es ValueError
+    with pytest.raises(ValueError):
+        clase_prioridad(['urgente'])
+
+
+def test_orden_por_clase_y_plazo_mas_proximo():
+    planificador = PlanificadorDespachos(capacidad=4, reserva_urgente=0)
+    ahora = time.time()
+    planificador.put('masivo', 'masivo', plazo=ahora + 1)
+    planificador.put('normal-sin-plazo', 'normal')
+    planificador.put('normal-tarde', 'normal', plazo=ahora + 600)
+    planificador.put('normal-pronto', 'normal', plazo=ahora + 60)
+    planificador.put('urgente', 'urgente')
+    planificador.put('normal-sin-plazo-2', 'normal')
+    assert _vaciar(planificador) == ['urgente', 'normal-pronto', 'normal-tarde', 'normal-sin-plazo',
+                                     'normal-sin-plazo-2', 'masivo']
+
+
+def test_reserva_urgente_bajo_carga():
+    planificador = PlanificadorDespachos(capacidad=2, reserva_urgente=1)
+    for i in range(3):
+        planificador.put(f'masivo-{i}', 'masivo')
+    assert planificador.get(timeout=0) == 'masivo-0'
+    # El último worker queda reservado: ningún no urgente lo ocupa
+    with pytest.raises(queue.Empty):
+        planificador.get(timeout=0.05)
+
+    planificador.put('urgente', 'urgente')
+    assert planificador.get(timeout=0) == 'urgente'
+    assert planificador.metricas()['en_proceso'] == {'urgente': 1, 'normal': 0, 'masivo': 1}
+
+    # Al terminar el no urgente, el siguiente masivo vuelve a ser elegible
+    planificador.terminar('masivo-0')
+    assert planificador.get(timeout=0) == 'masivo-1'
+
+
+def test_worker_en_espera_despierta_al_liberarse_capacidad():
+    planificador = PlanificadorDespachos(capacidad=2, reserva_urgente=1)
+    planificador.put('a', 'normal')
+    planificador.put('b', 'normal')
+    planificador.get()
+    obtenidos = []
+    worker = threading.Thread(target=lambda: obtenidos.append(planificador.get(timeout=2)))
+    worker.start()
+    time.sleep(0.05)
+    assert obtenidos == []
+    planificador.terminar('a')
+    worker.join(2)
+    assert obtenidos == ['b']
+
+
+def test_plazos_cumplidos_y_vencidos():
+    planificador = PlanificadorDespachos(capacidad=2, reserva_urgente=0)
+    ahora = time.time()
+    planificador.put('vencido', 'normal', plazo=ahora - 5)
+    planificador.put('a-tiempo', 'normal', plazo=ahora + 60)
+    planificador.put('sin-plazo', 'masivo')
+    assert planificador.metricas()['vencidos_en_cola'] == 1
+
+    resultados = {}
+    for _ in range(3):
+        item = planificador.get(timeout=0)
+        resultados[item] = planificador.terminar(item)
+    assert resultados == {'vencido': False, 'a-tiempo': True, 'sin-plazo': None}
+    metricas = planificador.metricas()
+    assert metricas['por_clase']['normal'] == {'encolados': 2, 'terminados': 2, 'en_plazo': 1, 'vencidos': 1}
+    assert [v['item'] for v in metricas['vencidos_recientes']] == ['vencido']
+    assert planificador.terminar('inexistente') is None
+
+
+def test_join_espera_a_que_terminen_todos():
+    planificador = PlanificadorDespachos(capacidad=2)
+    planificador.put('a')
+    planificador.put('b')
+    worker = threading.Thread(target=lambda: _vaciar(planificador))
+    worker.start()
+    planificador.join()
+    worker.join(2)
+    assert planificador.qsize() == 0
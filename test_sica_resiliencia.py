@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Pruebas de resiliencia: circuit breaker (apertura, estacionamiento y sondeos) y timeouts adaptativos
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from conftest import componente_registro, respuesta_livewire
+from sica_resiliencia import CircuitBreaker, CircuitoAbierto, GrupoCircuitos, TimeoutsAdaptativos
+
+
+def _abrir(circuito):
+    for _ in range(circuito.umbral_fallos):
+        circuito.antes_de_request()
+        circuito.registrar_fallo()
+
+
+def test_abre_al_llegar_al_umbral_de_fallos_consecutivos():
+    circuito = CircuitBreaker('livewire', umbral_fallos=3, tiempo_apertura=30)
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    circuito.registrar_exito()
+    circuito.registrar_fallo()
+    assert circuito.metricas()['estado'] == CircuitBreaker.CERRADO
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    assert circuito.metricas()['estado'] == CircuitBreaker.ABIERTO
+
+
+def test_abierto_estaciona_y_rechaza_al_vencer_la_espera():
+    circuito = CircuitBreaker('livewire', umbral_fallos=2, tiempo_apertura=30, max_estacionamiento=0.1)
+    _abrir(circuito)
+    inicio = time.monotonic()
+    with pytest.raises(CircuitoAbierto):
+        circuito.antes_de_request()
+    assert time.monotonic() - inicio >= 0.1
+    metricas = circuito.metricas()
+    assert metricas['rechazados'] == 1 and metricas['estacionados'] == 0
+
+
+def test_sondeo_sano_cierra_y_libera_a_los_estacionados():
+    circuito = CircuitBreaker('livewire', umbral_fallos=1, tiempo_apertura=0.1)
+    _abrir(circuito)
+    pasaron = []
+
+    def estacionado():
+        pasaron.append(circuito.antes_de_request())
+
+    hilos = [threading.Thread(target=estacionado) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.05)
+    assert pasaron == []
+
+    # Vencida la apertura pasa uno solo, como sondeo del estado semiabierto
+    time.sleep(0.3)
+    assert pasaron == [True]
+    circuito.registrar_exito(sondeo=True)
+    for hilo in hilos:
+        hilo.join(2)
+    assert pasaron == [True, False, False]
+    assert circuito.metricas()['estado'] == CircuitBreaker.CERRADO
+
+
+def test_sondeo_fallido_reabre_con_tiempo_creciente():
+    circuito = CircuitBreaker('livewire', umbral_fallos=1, tiempo_apertura=0.05, tiempo_apertura_maximo=0.15)
+    _abrir(circuito)
+    for esperado in (0.1, 0.15, 0.15):
+        time.sleep(circuito.tiempo_apertura + 0.02)
+        assert circuito.antes_de_request() is True
+        circuito.registrar_fallo(sondeo=True)
+        assert circuito.metricas()['estado'] == CircuitBreaker.ABIERTO
+        assert circuito.tiempo_apertura == pytest.approx(esperado)
+
+
+def test_grupo_tiene_un_circuito_por_clase():
+    grupo = GrupoCircuitos(umbral_fallos=1)
+    assert grupo.circuito('login') is grupo.circuito('login')
+    grupo.circuito('login').registrar_fallo()
+    metricas = grupo.metricas()
+    assert metricas['login']['estado'] == CircuitBreaker.ABIERTO
+    assert grupo.circuito('livewire').metricas()['estado'] == CircuitBreaker.CERRADO
+
+
+def test_circuito_abierto_deja_el_despacho_reintentable(crear_bot, sesion_falsa):
+    bot = crear_bot(circuitos=GrupoCircuitos(umbral_fallos=2, tiempo_apertura=30, max_estacionamiento=0.05))
+    enviados = sesion_falsa(bot, [respuesta_livewire(503), respuesta_livewire(503)])
+    for _ in range(2):
+        assert bot.ejecutar_despacho(componente_registro(), '1234', 'V-1', 'A22AK2C')['estado'] == 'ERROR'
+    # Con el circuito abierto no sale ningún request y el despacho no es "no encontrado"
+    resultado = bot.ejecutar_despacho(componente_registro(), '1234', 'V-1', 'A22AK2C')
+    assert resultado['estado'] == 'ERROR'
+    assert len(enviados) == 2
+
+
+# --- Timeouts adaptativos ---
+
+def test_timeout_inicial_de_la_clase_hasta_reunir_muestras():
+    timeouts = TimeoutsAdaptativos(min_muestras=5)
+    assert timeouts.timeout('searchEmpresaCodigo', 'livewire') == (10.0, 30.0)
+    assert timeouts.timeout('login_post', 'login')[1] == 30.0
+    assert timeouts.timeout('despachos', 'registrar')[1] == 45.0
+    for _ in range(4):
+        timeouts.registrar('searchEmpresaCodigo', 0.5)
+    assert timeouts.percentil('searchEmpresaCodigo', 0.95) is None
+    assert timeouts.timeout('searchEmpresaCodigo', 'livewire')[1] == 30.0
+
+
+def test_timeout_sigue_al_p99_acotado_entre_piso_y_techo():
+    timeouts = TimeoutsAdaptativos(multiplo=3.0, min_muestras=5)
+    timeouts.timeout('searchEmpresaCodigo', 'livewire')
+    for _ in range(10):
+        timeouts.registrar('searchEmpresaCodigo', 2.0)
+    assert timeouts.timeout('searchEmpresaCodigo')[1] == pytest.approx(6.0)
+    assert timeouts.percentil('searchEmpresaCodigo', 0.95) == 2.0
+
+    for _ in range(10):
+        timeouts.registrar('rapida', 0.1)
+    assert timeouts.timeout('rapida', 'livewire')[1] == 3.0  # piso de livewire
+    for _ in range(10):
+        timeouts.registrar('lenta', 50.0)
+    assert timeouts.timeout('lenta', 'livewire')[1] == 60.0  # techo de livewire
+
+
+def test_expirados_relajan_el_timeout_de_una_operacion_lenta():
+    timeouts = TimeoutsAdaptativos(multiplo=2.0, ventana=10, min_muestras=5)
+    timeouts.timeout('despachos', 'registrar')
+    for _ in range(10):
+        timeouts.registrar('despachos', 3.0)
+    assert timeouts.timeout('despachos')[1] == 6.0
+    # Expiran con el timeout vigente: entran a la ventana como latencia de 6 s y el timeout sube
+    for _ in range(10):
+        timeouts.registrar('despachos', 6.0, expirado=True, timeout=6.0)
+    assert timeouts.timeout('despachos')[1] == 12.0
+    assert timeouts.metricas()['despachos']['expirados'] == 10
+
+
+def test_bot_usa_el_timeout_adaptativo_y_registra_la_latencia(crear_bot, sesion_falsa):
+    bot = crear_bot(timeouts=TimeoutsAdaptativos(min_muestras=1))
+    enviados = sesion_falsa(bot, [respuesta_livewire(200), requests.ReadTimeout('lectura vencida')])
+    bot._request('GET', 'despachos', f"{bot.base_url}/despachos")
+    assert enviados[0]['timeout'] == (10.0, 45.0)
+    with pytest.raises(requests.ReadTimeout):
+        bot._request('GET', 'despachos', f"{bot.base_url}/despachos")
+    # El timeout adaptativo cae al piso de la clase tras una respuesta rápida
+    assert enviados[1]['timeout'] == (10.0, 5.0)
+    metricas = bot.timeouts.metricas()['despachos']
+    assert metricas['requests'] == 2 and metricas['expirados'] == 1
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Pruebas del transporte: negociación de codecs, medición de la compresión y HTTP/2 con caída a HTTP/1.1
+"""
+
+import gzip
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import sica_transporte
+from sica_transporte import AdaptadorTransporte, accept_encoding, decodificar, montar_transporte, resolver_politica
+
+CUERPO = ('{"serverMemo": {"data": {"empresas": []}}, "effects": {"html": "' + 'x' * 4000 + '"}}').encode('utf-8')
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        codec = self.path.strip('/')
+        if codec == 'gzip':
+            datos = gzip.compress(CUERPO)
+        elif codec == 'deflate':
+            datos = zlib.compress(CUERPO)
+        elif codec == 'roto':
+            datos = b'no es gzip'
+        else:
+            datos = CUERPO
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        if codec in ('gzip', 'deflate'):
+            self.send_header('Content-Encoding', codec)
+        elif codec == 'roto':
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Set-Cookie', 'sica_session=abc')
+        self.end_headers()
+        self.wfile.write(datos)
+        type(self).encodings.append(self.headers.get('Accept-Encoding'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    _Manejador.encodings = []
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manejador)
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def solo_gzip(monkeypatch):
+    """Proceso sin brotli ni zstandard"""
+    monkeypatch.setattr(sica_transporte, 'codecs_disponibles', lambda: ['gzip', 'deflate'])
+
+
+# --- Negociación de codecs ---
+
+def test_solo_anuncia_codecs_instalados(solo_gzip):
+    assert accept_encoding('auto') == 'gzip, deflate'
+    assert accept_encoding('gzip') == 'gzip, deflate'
+    assert accept_encoding('ninguna') == 'identity'
+
+
+def test_lista_explicita_avisa_de_los_no_instalados(solo_gzip, capsys):
+    assert resolver_politica('br,gzip') == ['gzip']
+    assert 'Codecs no instalados, no se anunciarán: br' in capsys.readouterr().out
+    assert accept_encoding('br') == 'identity'
+
+
+def test_codec_desconocido_es_error():
+    with pytest.raises(ValueError, match='lzma'):
+        resolver_politica('gzip,lzma')
+
+
+def test_auto_prefiere_la_mejor_compresion(monkeypatch):
+    monkeypatch.setattr(sica_transporte, 'codecs_disponibles', lambda: ['zstd', 'br', 'gzip', 'deflate'])
+    assert accept_encoding('auto') == 'zstd, br, gzip, deflate'
+    assert accept_encoding('gzip,br') == 'gzip, br'
+
+
+def test_decodificar_codecs_encadenados_y_deflate_sin_cabecera():
+    assert decodificar(gzip.compress(zlib.compress(CUERPO)), 'deflate, gzip') == CUERPO
+    crudo = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    assert decodificar(crudo.compress(CUERPO) + crudo.flush(), 'deflate') == CUERPO
+    assert decodificar(CUERPO, 'identity') == CUERPO
+    with pytest.raises(ValueError, match='no soportado'):
+        decodificar(CUERPO, 'compress')
+
+
+# --- Medición por respuesta ---
+
+def test_mide_bytes_comprimidos_y_descomprimidos(servidor, solo_gzip):
+    session = requests.Session()
+    adaptador = montar_transporte(session, codecs='auto')
+    response = session.get(f"{servidor}/gzip")
+    assert response.content == CUERPO
+    assert response.json()['serverMemo']['data'] == {'empresas': []}
+    assert response.content_encoding == 'gzip'
+    assert response.bytes_comprimidos < len(CUERPO)
+    assert session.cookies.get('sica_session') == 'abc'
+    session.get(f"{servidor}/deflate")
+    session.get(f"{servidor}/plano")
+    assert _Manejador.encodings == ['gzip, deflate'] * 3
+
+    metricas = adaptador.metricas()
+    assert metricas['http2'] is False and metricas['versiones'] == {'HTTP/1.1': 3}
+    assert set(metricas['por_codec']) == {'gzip', 'deflate', 'identity'}
+    gzip_stats = metricas['por_codec']['gzip']
+    assert gzip_stats['respuestas'] == 1 and gzip_stats['bytes_descomprimidos'] == len(CUERPO)
+    assert gzip_stats['ratio'] > 10
+    assert metricas['por_codec']['identity']['ratio'] == 1.0
+
+
+def test_cuerpo_corrupto_es_error_de_decodificacion(servidor):
+    session = requests.Session()
+    montar_transporte(session)
+    with pytest.raises(requests.exceptions.ContentDecodingError, match='gzip'):
+        session.get(f"{servidor}/roto")
+
+
+def test_precalentar_abre_conexiones_que_se_reutilizan(servidor):
+    session = requests.Session()
+    adaptador = montar_transporte(session)
+    assert adaptador.precalentar(servidor, conexiones=2) == 2
+    # Ya abiertas: una segunda vez no abre nada nuevo
+    assert adaptador.precalentar(servidor, conexiones=2) == 0
+    assert session.get(f"{servidor}/plano").status_code == 200
+
+
+# --- HTTP/2 ---
+
+def test_http2_sin_httpx_cae_a_http11(servidor, monkeypatch, capsys):
+    monkeypatch.setattr(sica_transporte, 'http2_disponible', lambda: False)
+    session = requests.Session()
+    adaptador = montar_transporte(session, http2=True)
+    assert adaptador.http2 is False
+    assert 'se usa HTTP/1.1' in capsys.readouterr().out
+    assert session.get(f"{servidor}/gzip").content == CUERPO
+    assert adaptador.metricas()['versiones'] == {'HTTP/1.1': 1}
+    assert adaptador.precalentar(servidor) == 1
+
+
+def test_http2_contra_un_servidor_http11(servidor):
+    pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    session = requests.Session()
+    adaptador = montar_transporte(session, http2=True)
+    assert adaptador.http2 is True
+    # Sin TLS el servidor no negocia h2: la respuesta llega por HTTP/1.1 con cookies y medición
+    response = session.get(f"{servidor}/gzip")
+    assert response.content == CUERPO and response.http_version == 'HTTP/1.1'
+    assert session.cookies.get('sica_session') == 'abc'
+    assert adaptador.metricas()['por_codec']['gzip']['respuestas'] == 1
+    # Con HTTP/2 no se precalienta: la conexión multiplexada la abre el primer request
+    assert adaptador.precalentar(servidor) == 0
+    adaptador.close()
+    assert adaptador.conexiones_abiertas() == 0
+
+
+def test_adaptador_nuevo_sin_metricas():
+    assert AdaptadorTransporte().metricas() == {'http2': False, 'versiones': {}, 'conexiones_abiertas': 0,
+                                                'por_codec': {}}